@@ -4,14 +4,15 @@ A command line interface for py_register_machine2.
 
 Used to compile and execute assembly code.
 
-**Note**: The binary object code is divided into sections.
+**Note**: The object code is divided into sections.
 There are the following two sections:
 
 - ``ROM`` will be programmed into the ROM
 - ``FLASH`` will be programmed into the Flash
 
-The sections are splitted by a newline character in the binary
-file::
+``assemble`` and ``link`` write binary object files
+(see ``py_register_machine2.tools.objectfile``), ``assemble --text`` writes
+the old text format, one line per section::
 
 	<sectionname>:<code>
 
@@ -20,6 +21,32 @@ Eg::
 	ROM:[22, 0, 4, 22, 1, 1]
 	FLASH:[22, 0, 4, 22, 1, 1]
 
+``execute``, ``link`` and ``batch`` read both formats.
+
+``execute`` exits with an error if the program reads or writes an offset outside
+of the memory or device BUS (see ``BUSError`` in ``py_register_machine2.core.parts``).
+
+``assemble`` can cache the object code in a directory shared by several processes
+(see ``--cache`` and ``py_register_machine2.tools.assembler.cache``).
+
+``assemble --source-map`` writes the source map (word address to line, see
+``py_register_machine2.tools.sourcemap``), ``execute --profile`` prints the
+hottest lines (if a source map is given), basic blocks and addresses
+(see ``py_register_machine2.engine_tools.profiler``).
+``execute --stats`` prints the executions of every command as JSON
+(see ``py_register_machine2.engine_tools.stats``).
+``execute --heatmap`` prints the accesses of the memory and device BUS
+(see ``BUS.enable_heatmap`` in ``py_register_machine2.core.parts``).
+``execute --trace`` writes a binary trace of the executed instructions
+(see ``py_register_machine2.engine_tools.tracer``).
+Only one of ``--profile``, ``--stats`` and ``--trace`` can be used.
+``execute --clock`` runs the processor at the given frequency and prints the
+achieved frequency (see ``py_register_machine2.engine_tools.clock``).
+
+The ``batch`` command runs the jobs of a manifest (one JSON object per line)
+in a process pool and writes the results as JSON lines,
+see ``py_register_machine2.app.cli.batch``.
+
 
 ::
 
@@ -27,15 +54,26 @@ Eg::
 		cli assemble (<infile> | --string <string>) [options]
 		cli execute (<infile> | --string <string>) [options]
 		cli link <outfile> <linkfiles> ...
+		cli batch <manifest> [options]
 
 	Options:
 		-c <commandmodule> --commands=<commandmodule>    use the given commands [default: py_register_machine2.commands.basic_commands]
 		-m <machinemodule> --machine=<machinemodule>     use the given register machine [default: py_register_machine2.machines.small]
 		-r --register-commands                           actually register the commands specified by -c
-		-s <steps> --steps=<steps>                       run <steps> processor cycles, if <steps> is negative the processor will just execute all steps [default: -1]
+		-j <workers> --jobs=<workers>                    run ``batch`` in <workers> processes, 0 uses one process per CPU [default: 0]
+		-s <steps> --steps=<steps>                       run at most <steps> processor cycles, if <steps> is negative the processor will just execute all steps [default: -1]
 		--commentstart=<commentstart>                    use commentstart to start comments [default: [';']]
 		--string=<string>                                use the given string instead of an input file
 		-o <outfile> --output=<outfile>                  write output to the given file (if unspecified write to sys.stdout)
+		-t --text                                        write the object code in the text format
+		--cache=<cachedir>                               cache the object code of ``assemble`` in the given directory (if unspecified use the environment variable PRM2_CACHE, if set)
+		--cache-size=<bytes>                             the maximal size of the cache [default: 67108864]
+		--source-map=<mapfile>                           ``assemble``: write the source map to the given file (JSON), ``execute``: use the source map for the profile
+		-p --profile                                     ``execute``: print a profile of the execution
+		--stats                                          ``execute``: print the execution statistics of the commands (JSON)
+		--heatmap=<pagesize>                             ``execute``: print the accesses of the devices and pages of <pagesize> words (JSON)
+		--trace=<tracefile>                              ``execute``: write a binary trace of the execution to the given file
+		--clock=<f_cpu>                                  ``execute``: run at <f_cpu> cycles per second and print the achieved frequency (JSON)
 		-S <section> --section=<section>                 the assembly code is for the given section [default: ROM]
 		-v --verbose                                     add more output
 		-d <debug> --debug=<debug>                       set debugging verbosity [default: 0]
@@ -4,14 +4,15 @@ A command line interface for py_register_machine2.
 
 Used to compile and execute assembly code.
 
-**Note**: The binary object code is divided into sections.
+**Note**: The object code is divided into sections.
 There are the following two sections:
 
 - ``ROM`` will be programmed into the ROM
 - ``FLASH`` will be programmed into the Flash
 
-The sections are splitted by a newline character in the binary
-file::
+``assemble`` and ``link`` write binary object files
+(see ``py_register_machine2.tools.objectfile``), ``assemble --text`` writes
+the old text format, one line per section::
 
 	<sectionname>:<code>
 
@@ -20,20 +21,59 @@ Eg::
 	ROM:[22, 0, 4, 22, 1, 1]
 	FLASH:[22, 0, 4, 22, 1, 1]
 
+``execute``, ``link`` and ``batch`` read both formats.
+
+``execute`` exits with an error if the program reads or writes an offset outside
+of the memory or device BUS (see ``BUSError`` in ``py_register_machine2.core.parts``).
+
+``assemble --source-map`` writes the source map (word address to line, see
+``py_register_machine2.tools.sourcemap``), ``execute --profile`` prints the
+hottest lines (if a source map is given), basic blocks and addresses
+(see ``py_register_machine2.engine_tools.profiler``).
+``execute --stats`` prints the executions of every command as JSON
+(see ``py_register_machine2.engine_tools.stats``).
+``execute --heatmap`` prints the accesses of the memory and device BUS
+(see ``BUS.enable_heatmap`` in ``py_register_machine2.core.parts``).
+``execute --trace`` writes a binary trace of the executed instructions
+(see ``py_register_machine2.engine_tools.tracer``).
+Only one of ``--profile``, ``--stats`` and ``--trace`` can be used.
+``execute --clock`` runs the processor at the given frequency and prints the
+achieved frequency (see ``py_register_machine2.engine_tools.clock``).
+
+``assemble`` can cache the object code in a directory shared by several processes
+(see ``--cache`` and ``py_register_machine2.tools.assembler.cache``).
+
+The ``batch`` command runs the jobs of a manifest (one JSON object per line)
+in a process pool and writes the results as JSON lines,
+see ``py_register_machine2.app.cli.batch``.
+
 Usage:
 	cli assemble (<infile> | --string <string>) [options]
 	cli execute (<infile> | --string <string>) [options]
 	cli link <outfile> <linkfiles> ...
+	cli batch <manifest> [options]
 
 Options:
         -c <commandmodule> --commands=<commandmodule>    use the given commands [default: py_register_machine2.commands.basic_commands]
         -m <machinemodule> --machine=<machinemodule>     use the given register machine [default: py_register_machine2.machines.small]
         -r --register-commands                           actually register the commands specified by -c
-        -s <steps> --steps=<steps>                       run <steps> processor cycles, if <steps> is negative the processor
+        -j <workers> --jobs=<workers>                    run ``batch`` in <workers> processes, 0 uses one process per CPU [default: 0]
+        -s <steps> --steps=<steps>                       run at most <steps> processor cycles, if <steps> is negative the processor
 	                                                 will just execute all steps [default: -1]
         --commentstart=<commentstart>                    use commentstart to start comments [default: [';']]
         --string=<string>                                use the given string instead of an input file
         -o <outfile> --output=<outfile>                  write output to the given file (if unspecified write to sys.stdout)
+        -t --text                                        write the object code in the text format
+        --cache=<cachedir>                               cache the object code of ``assemble`` in the given directory
+                                                         (if unspecified use the environment variable PRM2_CACHE, if set)
+        --cache-size=<bytes>                             the maximal size of the cache [default: 67108864]
+        --source-map=<mapfile>                           ``assemble``: write the source map to the given file (JSON),
+                                                         ``execute``: use the source map for the profile
+        -p --profile                                     ``execute``: print a profile of the execution
+        --stats                                          ``execute``: print the execution statistics of the commands (JSON)
+        --heatmap=<pagesize>                             ``execute``: print the accesses of the devices and pages of <pagesize> words (JSON)
+        --trace=<tracefile>                              ``execute``: write a binary trace of the execution to the given file
+        --clock=<f_cpu>                                  ``execute``: run at <f_cpu> cycles per second and print the achieved frequency (JSON)
         -S <section> --section=<section>                 the assembly code is for the given section [default: ROM]
         -v --verbose                                     add more output
         -d <debug> --debug=<debug>                       set debugging verbosity [default: 0]
@@ -42,8 +82,17 @@ Options:
                                                          NOTE: all directives must be named ``directives.<Directive>``.
 """
 
-import docopt, sys
+import docopt, sys, os, json
 from ...tools.assembler.assembler import Assembler
+from ...core.parts import BUSError
+from ...tools.assembler.cache import AssemblyCache, source_key
+from ...tools import objectfile
+from ...tools.sourcemap import SourceMap
+from ...engine_tools.profiler import Profiler
+from ...engine_tools.stats import ExecutionStats
+from ...engine_tools.tracer import Tracer
+from ...engine_tools.clock import SoftwareClock
+from .batch import read_manifest, run_batch
 from io import StringIO
 from importlib import import_module
 
@@ -54,9 +103,9 @@ def assemble(arguments):
 	else:
 		infile = open(arguments["<infile>"])
 	if("--output" in arguments and arguments["--output"]):
-		outfile = open(arguments["--output"], "w")
+		outfile = open(arguments["--output"], "wb")
 	else:
-		outfile = sys.stdout
+		outfile = sys.stdout.buffer
 
 	commands = import_module(arguments["--commands"])
 	machine = import_module(arguments["--machine"])
@@ -71,13 +120,44 @@ def assemble(arguments):
 			commentstarts = eval(arguments["--commentstart"]),
 			directives = eval(arguments["--directives"]))
 	section = arguments["--section"]
-	print("{}:{}".format(section, assembler.assemble()), file = outfile) 
+	device = {"ROM": rom, "FLASH": flash}[section]
+	width = device.width if(device != None) else proc.memory_bus.width
+
+	cache_dir = arguments["--cache"] or os.environ.get("PRM2_CACHE")
+	sections = None
+	if(cache_dir):
+		cache = AssemblyCache(cache_dir, int(arguments["--cache-size"]))
+		key = source_key(assembler, iter(lambda: infile.read(1 << 16), ""), section, str(width))
+		infile.seek(0)
+		data = cache.get(key)
+		# a cache hit has no source map
+		if(data != None and not arguments["--source-map"]):
+			try:
+				sections = objectfile.loads(data)
+			except ValueError:
+				sections = None
+	if(sections == None):
+		sections = [objectfile.Section(section, assembler.assemble_stream(), width = width)]
+		if(cache_dir):
+			cache.put(key, objectfile.dumps(sections))
+	if(arguments["--source-map"]):
+		with open(arguments["--source-map"], "w") as fout:
+			assembler.source_map.dump(fout)
+	if(arguments["--text"]):
+		outfile.write(objectfile.dumps_text(sections).encode("ascii"))
+	else:
+		objectfile.dump(sections, outfile)
+	outfile.flush()
 
 def execute(arguments):
+	instruments = [option for option in ("--profile", "--stats", "--trace") if(arguments[option])]
+	if(len(instruments) > 1):
+		sys.exit("{} can not be used together".format(" and ".join(instruments)))
 	if(arguments["--string"]):
-		infile = StringIO(arguments["--string"])
+		sections = objectfile.loads_text(arguments["--string"])
 	else:
-		infile = open(arguments["<infile>"])
+		with open(arguments["<infile>"], "rb") as infile:
+			sections = objectfile.load(infile)
 
 	commands = import_module(arguments["--commands"])
 	machine = import_module(arguments["--machine"])
@@ -89,20 +169,51 @@ def execute(arguments):
 		for c in commands.get_commands():
 			proc.register_command(c)
 
-	sections = {"ROM": rom, "FLASH": flash}
-
-	code = infile.read().split("\n")
-	for line in code:
-		if(line == ""):
-			continue
-		sec, co = line.split(":")
-		sections[sec].program(eval(co))
-
-	if(int(arguments["--steps"]) < 0):
-		proc.run()
-	else:
-		for i in range(int(arguments["--steps"])):
-			proc.do_cycle()
+	devices = {"ROM": rom, "FLASH": flash}
+
+	for section in sections:
+		section.program(devices[section.name])
+
+	if(arguments["--profile"]):
+		source_map = None
+		if(arguments["--source-map"]):
+			with open(arguments["--source-map"]) as fin:
+				source_map = SourceMap.load(fin)
+		proc.profiler = Profiler(proc, source_map)
+	if(arguments["--stats"]):
+		proc.stats = ExecutionStats(proc)
+	if(arguments["--heatmap"]):
+		proc.memory_bus.enable_heatmap(int(arguments["--heatmap"]))
+		proc.device_bus.enable_heatmap(int(arguments["--heatmap"]))
+
+	if(arguments["--trace"]):
+		tracefile = open(arguments["--trace"], "wb")
+		proc.tracer = Tracer(proc, outfile = tracefile)
+	if(arguments["--clock"]):
+		proc.clock = SoftwareClock(float(arguments["--clock"]))
+
+	steps = int(arguments["--steps"])
+	if(steps < 0):
+		steps = None
+	try:
+		proc.run(max_cycles = steps)
+	except BUSError as e:
+		sys.exit("BUSError: {}".format(e))
+	finally:
+		if(arguments["--trace"]):
+			proc.tracer.close()
+			tracefile.close()
+
+	if(arguments["--profile"]):
+		print("== profile ==")
+		print(proc.profiler.report())
+	if(arguments["--stats"]):
+		print(proc.stats.to_json())
+	if(arguments["--clock"]):
+		print(json.dumps(proc.clock.to_dict()))
+	if(arguments["--heatmap"]):
+		print(json.dumps({"memory": proc.memory_bus.heatmap.to_dict(),
+				"devices": proc.device_bus.heatmap.to_dict()}))
 
 	if(arguments["--verbose"]):
 		print("== registers ==")
@@ -111,33 +222,45 @@ def execute(arguments):
 	
 
 def link(arguments):
-	fout = open(arguments["<outfile>"], "w")
-
+	sections = []
 	for fname in arguments["<linkfiles>"]:
 		if(arguments["--verbose"]):
 			print("linking", fname)
-		fin = open(fname)
-		data = fin.read()
-		fin.close()
-		if(data[-1] != '\n'):
-			print("WARNING: NOEOF line. The file might be corrupted", file = sys.stderr)
-			data += '\n'
-		fout.write(data)
-	fout.close()
-	
+		with open(fname, "rb") as fin:
+			sections.extend(objectfile.load(fin))
+	with open(arguments["<outfile>"], "wb") as fout:
+		objectfile.dump(sections, fout)
 
 
+def batch(arguments):
+	if("--output" in arguments and arguments["--output"]):
+		outfile = open(arguments["--output"], "w")
+	else:
+		outfile = sys.stdout
+	steps = int(arguments["--steps"])
+	workers = int(arguments["--jobs"])
+	if(workers <= 0):
+		workers = None
 
+	with open(arguments["<manifest>"]) as fin:
+		run_batch(read_manifest(fin), outfile, workers = workers,
+				commands = arguments["--commands"],
+				register_commands = arguments["--register-commands"],
+				default_machine = arguments["--machine"],
+				default_steps = steps)
 
-arguments = docopt.docopt(__doc__)
 
 commands = {
 	"assemble": assemble,
 	"execute": execute,
-	"link": link
+	"link": link,
+	"batch": batch
 }
 
 
-for k, v in commands.items():
-	if(arguments[k]):
-		v(arguments)
+# guarded: the worker processes of ``batch`` may import this module
+if(__name__ == "__main__"):
+	arguments = docopt.docopt(__doc__)
+	for k, v in commands.items():
+		if(arguments[k]):
+			v(arguments)
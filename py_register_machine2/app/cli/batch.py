@@ -0,0 +1,169 @@
+"""
+**py_register_machine2.app.cli.batch**: Run many jobs in a process pool
+
+Used by ``cli batch``. The manifest is a file with one JSON object per line,
+every object is one job::
+
+	{"id": "t1", "object": "prog.o", "registers": {"r0": 5}, "memory": {"60": 3}, "steps": 1000, "dump": [[60, 4]]}
+
+``object``
+	the object file (binary or text, see ``cli``), required
+``machine``
+	the machine module, defaults to the ``--machine`` option
+``registers``
+	initial Register contents by name
+``memory``
+	initial words on the memory BUS by offset
+``devices``
+	initial words on the device BUS by offset
+``steps``
+	run at most ``steps`` cycles, defaults to the ``--steps`` option (negative values: run until the engine stops)
+``dump``
+	a list of ``[offset, count]`` ranges of the memory BUS that are returned
+
+Every worker process constructs one machine and programs the object once,
+the following jobs using the same machine and object just reset it
+(see Worker_). The results are written as JSON lines in the order of the
+manifest::
+
+	{"id": "t1", "cycles": 12, "halted": true, "error": null, "registers": {...}, "output": "", "memory": [[60, [3, 0, 0, 0]]]}
+"""
+
+import json
+from io import StringIO
+from importlib import import_module
+from concurrent.futures import ProcessPoolExecutor
+from ...core import register
+from ...tools import objectfile
+
+
+class Worker(object):
+	"""
+	.. _Worker:
+
+	Holds one constructed machine and resets it for every job.
+
+	If a job uses another machine module the machine is constructed again
+	(the commands can be registered to one Processor only). If a job uses
+	another object file the devices are cleared and programmed again.
+
+	Reset means: restore the snapshot taken after programming the object
+	(see ``Processor.snapshot``).
+	"""
+	def __init__(self, commands = None, register_commands = False, default_machine = None, default_steps = None):
+		self.commands = commands
+		self.register_commands = register_commands
+		self.default_machine = default_machine
+		self.default_steps = default_steps
+		self.machine_name = None
+		self.object_name = None
+		self.objects = {}
+
+	def load_machine(self, machine_name):
+		machine = import_module(machine_name)
+		self.proc, self.rom, self.ram, self.flash = machine.get_machine()
+		if(self.register_commands):
+			for c in import_module(self.commands).get_commands():
+				self.proc.register_command(c)
+		self.blank = self.proc.snapshot()
+		self.outputs = [r for r in self.proc.register_interface.registers_by_index
+				if(isinstance(r, register.OutputRegister))]
+		self.machine_name = machine_name
+		self.object_name = None
+
+	def load_object(self, object_name):
+		if(not object_name in self.objects):
+			with open(object_name, "rb") as fin:
+				self.objects[object_name] = objectfile.load(fin)
+		self.object_name = None
+		self.proc.restore(self.blank)
+		devices = {"ROM": self.rom, "FLASH": self.flash}
+		for section in self.objects[object_name]:
+			section.program(devices[section.name])
+		self.proc.reset()
+		self.initial = self.proc.snapshot()
+		self.object_name = object_name
+
+	def reset(self):
+		self.proc.restore(self.initial)
+
+	def run(self, job):
+		"""
+		Run the job ``job`` (a ``dict``, see above) and return the result as a ``dict``.
+		"""
+		result = {"id": job.get("id"), "cycles": 0, "halted": False, "error": None}
+		machine_name = job.get("machine", self.default_machine)
+		try:
+			if(machine_name != self.machine_name):
+				self.machine_name = None
+				self.load_machine(machine_name)
+			if(job["object"] != self.object_name):
+				self.load_object(job["object"])
+			else:
+				self.reset()
+		except Exception as e:
+			result["error"] = "{}: {}".format(type(e).__name__, e)
+			return result
+
+		proc = self.proc
+		streams = []
+		for r in self.outputs:
+			r.open_stream = StringIO()
+			streams.append(r.open_stream)
+
+		try:
+			for name, value in job.get("registers", {}).items():
+				proc.register_interface.write(name, value)
+			for offset, value in job.get("memory", {}).items():
+				proc.memory_bus.write_word(int(offset), value)
+			for offset, value in job.get("devices", {}).items():
+				proc.device_bus.write_word(int(offset), value)
+			steps = job.get("steps", self.default_steps)
+			if(steps != None and steps < 0):
+				steps = None
+			proc.run(max_cycles = steps)
+		except Exception as e:
+			result["error"] = "{}: {}".format(type(e).__name__, e)
+		result["cycles"] = proc.cycles
+		result["halted"] = bool(proc.ecr & 1)
+		result["registers"] = {r.name: r.read() for r in proc.register_interface.registers_by_index}
+		result["output"] = "".join(stream.getvalue() for stream in streams)
+		if("dump" in job):
+			try:
+				result["memory"] = [[offset, [proc.memory_bus.read_word(i) for i in range(offset, offset + count)]]
+						for offset, count in job["dump"]]
+			except Exception as e:
+				result["error"] = result["error"] or "{}: {}".format(type(e).__name__, e)
+		return result
+
+_worker = None
+
+def _init_worker(*args):
+	global _worker
+	_worker = Worker(*args)
+
+def _run_job(job):
+	return _worker.run(job)
+
+def run_batch(jobs, outfile, workers = None, commands = None, register_commands = False,
+		default_machine = None, default_steps = None, chunksize = 16):
+	"""
+	Run the jobs ``jobs`` (an iterable of ``dict`` s) in a ``ProcessPoolExecutor``
+	with ``workers`` processes (default: ``os.cpu_count()``) and write the results as
+	JSON lines to ``outfile`` as soon as they are available.
+	"""
+	with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+			initargs = (commands, register_commands, default_machine, default_steps)) as executor:
+		for result in executor.map(_run_job, jobs, chunksize = chunksize):
+			print(json.dumps(result), file = outfile)
+			outfile.flush()
+
+def read_manifest(infile):
+	"""
+	Yields the jobs of the manifest ``infile``.
+	"""
+	for line in infile:
+		line = line.strip()
+		if(line == ""):
+			continue
+		yield json.loads(line)
@@ -14,15 +14,28 @@ This module uses py_register_machine2.app.web.model, cherrypy
 and a bunch of HTML/CSS/JS to provide a webinterface.
 
 All actions are performed by AJAX.
+
+``assemble_rom_code`` and ``assemble_flash_code`` return the formatted
+program or, if the parameter ``diff`` is ``1``, ``true``, ``yes`` or ``on``, the changes since the
+last request as a JSON list of ``[offset, words]``.
 """
 
-import cherrypy, os
+import cherrypy, os, json
 from .model import RMServer
 
 
 static_path = os.path.abspath(os.path.dirname(__file__)) + "/static"
 html_path = os.path.abspath(os.path.dirname(__file__)) + "/html"
 
+def isset(parameter):
+	"""
+	Returns ``True`` if the query parameter ``parameter`` (a ``str``) is set,
+	like ``diff=1`` or ``diff=true``.
+	"""
+	if(isinstance(parameter, str)):
+		return parameter.strip().lower() in ("1", "true", "yes", "on")
+	return bool(parameter)
+
 conf = {\
 	"/": {\
 		'tools.sessions.on': True
@@ -42,22 +55,26 @@ class Front(object):
 		return html.format(*["" for i in range(8)])
 	
 	@cherrypy.expose
-	def assemble_rom_code(self, code = "ldi 0b1 ECR"):
+	def assemble_rom_code(self, code = "ldi 0b1 ECR", diff = False):
 		self.__load_rm_unless_loaded()
 		cherrypy.session["err"] = False
-		exc, mc = cherrypy.session["rms"].assemble_rom_code(code)
+		exc, mc, changes = cherrypy.session["rms"].assemble_rom_code(code)
 		if(exc == None):
+			if(isset(diff)):
+				return json.dumps(changes)
 			return cherrypy.session["rms"]._format_mem(mc)
 		else:
 			cherrypy.session["err"] = True
 		cherrypy.session["lastexc"] = exc
 		return "error"
 	@cherrypy.expose
-	def assemble_flash_code(self, code = "ldi 0b1 ECR"):
+	def assemble_flash_code(self, code = "ldi 0b1 ECR", diff = False):
 		self.__load_rm_unless_loaded()
 		cherrypy.session["err"] = False
-		exc, mc = cherrypy.session["rms"].assemble_flash_code(code)
+		exc, mc, changes = cherrypy.session["rms"].assemble_flash_code(code)
 		if(exc == None):
+			if(isset(diff)):
+				return json.dumps(changes)
 			return cherrypy.session["rms"]._format_mem(mc)
 		else:
 			cherrypy.session["err"] = True
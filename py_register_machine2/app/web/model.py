@@ -14,10 +14,9 @@ from ...core.register import *
 from ...core.memory import *
 from ...core.processor import *
 from ...core.device import *
-from ...tools.assembler import assembler
+from ...tools.assembler.incremental import IncrementalAssembler
 from ...commands.basic_commands import basic_commands
 from ...engine_tools.conversions import chunks
-from io import StringIO
 
 
 defaults = {\
@@ -41,7 +40,8 @@ defaults = {\
 	"commands": basic_commands,
 	"flash_size": 2000,
 	"rom_size": 256,
-	"ram_size": 512
+	"ram_size": 512,
+	"max_cycles": 1000000
 }
 
 values = [\
@@ -55,7 +55,8 @@ values = [\
 	"rom_size",
 	"flash_enable",
 	"ram_enable",
-	"ram_size"
+	"ram_size",
+	"max_cycles"
 ]
 
 
@@ -97,6 +98,9 @@ class RMServer(object):
 		for command in get_cfg("commands"):
 			self.processor.register_command(command)
 		self.processor.setup_done()
+		self.max_cycles = get_cfg("max_cycles")
+		self.rom_assembler = IncrementalAssembler(self.processor)
+		self.flash_assembler = IncrementalAssembler(self.processor)
 
 	def get_register_contents(self):
 		for r in self.registers:
@@ -104,34 +108,32 @@ class RMServer(object):
 
 	def assemble_rom_code(self, asm):
 		"""
-			assemble the given code and program the ROM
+			assemble the given code and program the ROM.
+			Returns ``(exception, program, diff)``, see ``IncrementalAssembler``.
 		"""
-		stream = StringIO(asm)
-		worker = assembler.Assembler(self.processor, stream)
 		try:
-			result = worker.assemble()
+			result, diff = self.rom_assembler.assemble(asm)
 		except BaseException as e:
-			return e, None
+			return e, None, None
 		self.rom.program(result)
-		return None, result
+		return None, result, diff
 	def assemble_flash_code(self, asm):
 		"""
-			assemble the given code and program the Flash
+			assemble the given code and program the Flash.
+			Returns ``(exception, program, diff)``, see ``IncrementalAssembler``.
 		"""
-		stream = StringIO(asm)
-		worker = assembler.Assembler(self.processor, stream)
 		try:
-			result = worker.assemble()
+			result, diff = self.flash_assembler.assemble(asm)
 		except BaseException as e:
-			return e, None
+			return e, None, None
 		self.flash.program(result)
-		return None, result
+		return None, result, diff
 	def run(self):
 		"""
-			run the code. Returns an exception on failure.
+			run the code for at most ``max_cycles`` cycles. Returns an exception on failure.
 		"""
 		try:
-			self.processor.run()
+			self.processor.run(max_cycles = self.max_cycles)
 		except BaseException as e:
 			return e
 		return None
@@ -154,10 +156,8 @@ class RMServer(object):
 		"""
 			overwrite the complete memory with zeros	
 		"""
-		self.rom.program([0 for i in range(self.rom.size)])
-		self.flash.program([0 for i in range(self.flash.size)])
-		for i in range(self.ram.size):
-			self.ram.write(i, 0)
+		for device in self.processor.memory_bus.devices + self.processor.device_bus.devices:
+			device.store([0] * device.size)
 	def _format_mem(self, mem, format_ = "nl"):
 		res = ""
 		if(format_ in ("block", "blck")):
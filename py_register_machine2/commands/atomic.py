@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+
+
+"""
+**py_register_machine2.commands.atomic**: Atomic commands to synchronize Processors
+
++--------------+--------+---------------------------------------------------+
+| mnemonic     | opcode | Description 					    |
++==============+========+===================================================+
+| cas a b c    | 0x20   | old = *(a); if old == b: *(a) = c; b = old        |
++--------------+--------+---------------------------------------------------+
+
+``a`` holds the address of the word on the memory BUS, the swap succeeded if ``b``
+did not change. The command is atomic if the word is in a SharedRAM
+(see ``core.memory.SharedRAM``) or if the Processors run in one thread
+(see ``core.system.System``).
+
+*Example*: a spin lock (the lock word is at the address in ``r0``)::
+
+	ldi 1 r2
+	acquire:
+	ldi 0 r1
+	cas r0 r1 r2
+	jne r1 acquire
+	; ...
+	ldi 0 r1
+	pst r1 r0
+
+all atomic commands are available in the list ``atomic_commands``.
+"""
+
+from ..core.commands import *
+
+def cas_function(register_interface, memory_BUS, device_BUS, addr, expected, new):
+	old = memory_BUS.compare_and_swap(register_interface.read(addr),
+			register_interface.read(expected), register_interface.read(new))
+	register_interface.write(expected, old)
+
+cas = FunctionCommand("cas", 0x20, 3, cas_function, [registerargument(), registerargument(), registerargument()])
+
+atomic_commands = [cas]
+
+def get_commands():
+	return atomic_commands
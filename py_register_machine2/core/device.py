@@ -5,6 +5,7 @@
 """
 
 from ..core import parts
+import array, mmap, os
 
 class BUS(parts.BUS):
 	"""
@@ -39,18 +40,72 @@ class Flash(parts.WordDevice):
 		Write the content of the iterable ``prog`` starting with the optional offset ``offset``
 		to the device.
 
-		Invokes ``program_word``.
+		Invokes store_, the complete program is written in one step.
 		"""
-		for addr, word in enumerate(prog):
-			self.program_word(offset + addr, word)
+		self.store(prog, offset)
 	def program_word(self, offset, word):
 		"""
 		Program one word of the Flash device.
 		Might raise AddressError_.
 		"""
 		if(offset >= self.size):
-			raise AddressError("Offset({}) not in address space({})".format(offset, self.size))
-		self.repr_[offset].setvalue(word)
+			raise parts.AddressError("Offset({}) not in address space({})".format(offset, self.size))
+		self.repr_[offset] = self.truncate(word)
+		if(self.write_hooks):
+			self._written(offset, 1)
 
-	
-	
+
+class MappedFlash(Flash):
+	"""
+	.. _MappedFlash:
+
+	A Flash_ backed by the file ``filename`` using ``mmap``.
+
+	The words are read from and written to the mapped pages directly, so the
+	content of the Flash persists between runs and creating the device does not
+	depend on its size. If the file is too small it is extended with zeros.
+
+	The words are stored as signed integers of the itemsize of ``parts.word_typecode``
+	in the native byte order, so the width must not exceed ``64`` bits.
+
+	Use ``flush`` to write the changes to the file, ``close`` unmaps the file.
+	A fork (see ``WordDevice.fork``) of a MappedFlash keeps its words in the memory.
+	"""
+	def __init__(self, filename, size, width = 64, debug = 0):
+		typecode = parts.word_typecode(width)
+		if(typecode is None):
+			raise ValueError("MappedFlash supports widths up to 64 bits, not {}".format(width))
+		parts.WordDevice.__init__(self, 0, width = width, mode = 0b11, debug = debug)
+		self.size = size
+		self.filename = filename
+		length = size * array.array(typecode).itemsize
+
+		fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+		try:
+			if(os.fstat(fd).st_size < length):
+				os.ftruncate(fd, length)
+			self.mmap = mmap.mmap(fd, length) if(length) else None
+		finally:
+			os.close(fd)
+		self.repr_ = memoryview(self.mmap if(self.mmap != None) else b"").cast(typecode)
+
+	def flush(self):
+		"""
+		Write the changed pages to the file.
+		"""
+		if(self.mmap != None):
+			self.mmap.flush()
+
+	def close(self):
+		"""
+		Flush and unmap the file, the device is unusable afterwards.
+		"""
+		self.flush()
+		self.repr_.release()
+		if(self.mmap != None):
+			self.mmap.close()
+
+	def fork(self):
+		child = Flash(self.size, width = self.width, debug = self.debug)
+		child.repr_ = parts.PagedStorage(parts.copy_words(self.repr_))
+		return child
@@ -37,41 +37,41 @@ class Counter(Interrupt):
 
 	A Counter/Timer implementation.
 
-	The ``__init__`` method will inject an ``on_cycle_callback`` into the Processor.
-	This callback will increment the internal counter variable by one.
-	If the internal counter reaches a predefined value the ``interrupt`` method will be invoked.
-
+	The Counter schedules an event (see ``Processor.schedule``) for the cycle the
+	internal counter reaches the predefined value ``overflow_size``: the ``interrupt`` method will be invoked
+	and the next event is scheduled. The Processor does not spend time on the Counter
+	between two events.
 
+	``counter`` is the number of cycles since the last overflow,
+	it can be changed.
 	"""
 
 	def __init__(self, address, name, processor, overflow_size):
-		Interrupt.__init__(self, address, processor)
-		self.processor.on_cycle_callbacks.append(self.increment_counter)
-		self.counter = 0
+		Interrupt.__init__(self, address, name, processor)
 		self.overflow = overflow_size
+		self.due = None
+		self.counter = 0
 
-	def increment_counter(self):
-		self.counter += 1
-		if(self.counter >= self.overflow):
-			self.counter = 0
-			self.interrupt()
+	@property
+	def counter(self):
+		return max(0, self.overflow - (self.due - self.processor.cycles))
+	@counter.setter
+	def counter(self, counter):
+		self.processor.schedule(self, max(self.processor.cycles + 1,
+				self.processor.cycles + self.overflow - counter))
 
-class Autoreset(Interrupt):
+	def on_event(self):
+		self.processor.schedule(self, self.due + max(1, self.overflow))
+		self.interrupt()
+
+class Autoreset(Counter):
 	"""
 	.. _Autoreset:
 
 	A really rude form of the Watchdog.
-	This Interrupt will force the Processor to jump to offset ``0``.
+	This Interrupt will force the Processor to jump to offset ``0``
+	every ``overflow_size`` cycles (see Counter_).
 	"""
 
 	def __init__(self, name, processor, overflow_size):
-		Interrupt.__init__(self, 0, processor)
-		self.counter = 0
-		self.overflow = overflow_size
-		self.processor.on_cycle_callbacks.append(self.increment_counter)
-	def increment_counter(self):
-		self.counter += 1
-		if(self.counter >= self.overflow):
-			self.counter = 0
-			self.interrupt()
-		
+		Counter.__init__(self, 0, name, processor, overflow_size)
@@ -2,6 +2,8 @@
 
 
 from ..core import parts
+import array, multiprocessing
+from multiprocessing import shared_memory
 
 
 class BUS(parts.BUS):
@@ -46,8 +48,10 @@ class ROM(parts.WordDevice):
 
 		"""
 		if(offset >= self.size):
-			raise AddressError("Offset({}) not in address space({})".format(offset, self.size))
-		self.repr_[offset].setvalue(word)
+			raise parts.AddressError("Offset({}) not in address space({})".format(offset, self.size))
+		self.repr_[offset] = self.truncate(word)
+		if(self.write_hooks):
+			self._written(offset, 1)
 	def program(self, prog, offset = 0):
 		"""
 		.. _program:
@@ -55,10 +59,9 @@ class ROM(parts.WordDevice):
 		Write the content of the iterable ``prog`` starting with the optional offset ``offset``
 		to the device.
 
-		Invokes program_word_.
+		Invokes store_, the complete program is written in one step.
 		"""
-		for addr, word in enumerate(prog):
-			self.program_word(offset + addr, word)
+		self.store(prog, offset)
 		
 
 class RAM(parts.WordDevice):
@@ -75,3 +78,79 @@ class RAM(parts.WordDevice):
 	def __init__(self, size, width = 64, debug = 0):
 		parts.WordDevice.__init__(self, size, width = width, mode = 0b11, debug = debug)
 
+class SharedRAM(RAM):
+	"""
+	.. _SharedRAM:
+
+	A RAM_ whose words are stored in ``multiprocessing.shared_memory``, so
+	Processors in several processes that attach the SharedRAM to their memory BUS_
+	see the writes of each other.
+
+	If ``name`` is ``None`` a new shared memory block is created, else the block ``name``
+	of another SharedRAM (see ``name``) is attached. Passing a SharedRAM to a
+	``multiprocessing.Process`` attaches the block in the new process.
+
+	The words are stored as signed integers of the itemsize of ``parts.word_typecode``,
+	so the width must not exceed ``64`` bits.
+
+	compare_and_swap_ is atomic for all SharedRAMs using the same ``lock``
+	(a ``multiprocessing.Lock``, created using the default context if it is ``None``), read_ and write_ are not
+	synchronized. So a word used to synchronize programs must be changed by ``compare_and_swap``
+	only (like the ``cas`` command of ``commands.atomic``), except for releasing a lock.
+	The instructions in a SharedRAM are not cached (see the decode cache of the Processor),
+	so code written by another process is executed, too.
+
+	Every SharedRAM must be closed (close_), the SharedRAM that created the block
+	must remove it using unlink_ once the other processes closed it.
+	A fork (see ``WordDevice.fork``) of a SharedRAM is a RAM_ holding a copy of the words.
+	"""
+	def __init__(self, size, width = 64, name = None, lock = None, debug = 0):
+		typecode = parts.word_typecode(width)
+		if(typecode is None):
+			raise ValueError("SharedRAM supports widths up to 64 bits, not {}".format(width))
+		parts.WordDevice.__init__(self, 0, width = width, mode = 0b11, debug = debug)
+		self.size = size
+		length = size * array.array(typecode).itemsize
+
+		self.owner = name == None
+		if(self.owner):
+			self.shm = shared_memory.SharedMemory(create = True, size = max(1, length))
+		else:
+			self.shm = shared_memory.SharedMemory(name = name)
+		self.name = self.shm.name
+		self.lock = lock if(lock != None) else multiprocessing.Lock()
+		self.repr_ = self.shm.buf[:length].cast(typecode)
+
+	def __reduce__(self):
+		return (SharedRAM, (self.size, self.width, self.name, self.lock, self.debug))
+
+	def __del__(self):
+		# the shared memory block can not be closed while the words are exported
+		if(isinstance(getattr(self, "repr_", None), memoryview)):
+			self.repr_.release()
+
+	def compare_and_swap(self, offset, expected, value):
+		with self.lock:
+			return RAM.compare_and_swap(self, offset, expected, value)
+
+	def close(self):
+		"""
+		.. _close:
+
+		Detach the shared memory block, the device is unusable afterwards.
+		"""
+		self.repr_.release()
+		self.shm.close()
+
+	def unlink(self):
+		"""
+		.. _unlink:
+
+		Remove the shared memory block, the attached SharedRAMs keep their words.
+		"""
+		self.shm.unlink()
+
+	def fork(self):
+		child = RAM(self.size, width = self.width, debug = self.debug)
+		child.repr_ = parts.PagedStorage(parts.copy_words(self.repr_))
+		return child
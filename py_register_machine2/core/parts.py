@@ -3,9 +3,17 @@
 """
 **py_register_machine2.core.parts**: Basic parts of the register machine
 
+**Accesses outside of the address space**
+
+read_word_ and write_word_ of a BUS_ raise a BUSError_ if the offset is negative
+or not below the end of the address space. Previous versions returned ``None``
+for these reads (and for the offset right after the last device) and dropped
+these writes silently; programs that relied on this raise a BUSError now,
+``cli execute`` exits with an error message then.
 """
 
-from ..engine_tools.operations import bitsetxor
+import array, copy, sys
+from bisect import bisect_right
 
 
 class BUS(object):
@@ -33,13 +41,17 @@ class BUS(object):
 		# (0, 4, 9)
 	
 	Once the BUS started working (a read/write operation has been used)
+	the BUS is locked (see lock_) and
 	BUS.register_device will raise a BUSSetupError.
 	If the addresspace of the BUS is too small do hold a new device,
 	BUS.register_device will raise a BUSSetupError.
 
 
 	The number of read/write actions can be observed by accessing the variables
-	``reads`` and ``writes``
+	``reads`` and ``writes``, use enable_heatmap_ to count the accesses of every
+	device and page.
+
+	Reading or writing an offset outside of the address space raises a BUSError_.
 	"""
 	def __init__(self, width = 64, debug = 0):
 		self.width = width
@@ -52,7 +64,10 @@ class BUS(object):
 		self._lock = False
 		self.reads = 0
 		self.writes = 0
-		self.truncate = Integer(width = width)
+		self.truncate = truncator(width)
+		self._decode_starts = ()
+		self._decode_devices = ()
+		self.heatmap = None
 
 	def register_device(self, word_device):
 		"""
@@ -77,6 +92,22 @@ class BUS(object):
 		self.devices.append(word_device)
 		return res
 
+	def lock(self):
+		"""
+		.. _lock:
+
+		Lock the BUS and build the address decoder: a sorted tuple of the
+		start addresses and a tuple of the devices, so every read_word_ and
+		write_word_ resolves the device using one ``bisect`` lookup.
+
+		Invoked on the first read/write operation.
+		"""
+		if(self._lock):
+			return
+		self._lock = True
+		self._decode_starts = tuple(self.start_addresses[device] for device in self.devices)
+		self._decode_devices = tuple(self.devices)
+
 	def read_word(self, offset):
 		"""
 		.. _read_word:
@@ -94,17 +125,17 @@ class BUS(object):
 		May raise BUSError_, if the offset exceeds the address space.
 
 		"""	
-		self._lock = True
-		if(offset > self.current_max_offset):
+		if(not self._lock):
+			self.lock()
+		if(offset >= self.current_max_offset or offset < 0):
 			raise BUSError("Offset({}) exceeds address space of BUS({})".format(offset, self.current_max_offset)) 
 		self.reads += 1
-		for addresspace, device in self.index.items():
-			if(offset in addresspace):
-				if(self.debug > 5):
-					print("BUS::read({}) | startaddress({})> {}".format(offset, self.start_addresses[device],
-								device.read(offset - self.start_addresses[device])))
-				self.truncate.setvalue( device.read(offset - self.start_addresses[device]))
-				return self.truncate.getvalue()
+		index = bisect_right(self._decode_starts, offset) - 1
+		start = self._decode_starts[index]
+		word = self._decode_devices[index].read(offset - start)
+		if(self.debug > 5):
+			print("BUS::read({}) | startaddress({})> {}".format(offset, start, word))
+		return self.truncate(word)
 
 
 	def write_word(self, offset, word):
@@ -114,18 +145,151 @@ class BUS(object):
 		Writes one word from a device,
 		see read_word_.
 		"""
-		self._lock = True
-		if(offset > self.current_max_offset):
+		if(not self._lock):
+			self.lock()
+		if(offset >= self.current_max_offset or offset < 0):
 			raise BUSError("Offset({}) exceeds address space of BUS({})".format(offset, self.current_max_offset)) 
 		self.writes += 1
-		
-		self.truncate.setvalue(word)
-		for addresspace, device in self.index.items():
-			if(offset in addresspace):
-				device.write(offset - self.start_addresses[device], self.truncate.getvalue()) 
+		index = bisect_right(self._decode_starts, offset) - 1
+		self._decode_devices[index].write(offset - self._decode_starts[index], self.truncate(word))
+
+	def compare_and_swap(self, offset, expected, word):
+		"""
+		.. _BUS.compare_and_swap:
+
+		Writes ``word`` to the device at ``offset`` if the word there equals ``expected``
+		and returns the old word (truncated), see ``WordDevice.compare_and_swap``.
+
+		May raise BUSError_, if the offset exceeds the address space.
+		"""
+		if(not self._lock):
+			self.lock()
+		if(offset >= self.current_max_offset or offset < 0):
+			raise BUSError("Offset({}) exceeds address space of BUS({})".format(offset, self.current_max_offset)) 
+		self.reads += 1
+		expected = self.truncate(expected)
+		index = bisect_right(self._decode_starts, offset) - 1
+		old = self.truncate(self._decode_devices[index].compare_and_swap(offset - self._decode_starts[index],
+				expected, self.truncate(word)))
+		if(old == expected):
+			self.writes += 1
+		return old
 	def device_count(self):
 		return len(self.start_addresses)
 
+	def enable_heatmap(self, page_size = 256):
+		"""
+		.. _enable_heatmap:
+
+		Count the reads and writes of every device and every page of ``page_size`` words
+		in a new BusHeatmap_ (``heatmap``), which is returned.
+
+		read_word_ and write_word_ are replaced by counting versions, the BUS is not slowed
+		down if there is no heatmap. Locks the BUS (see lock_).
+		"""
+		self.lock()
+		self.heatmap = BusHeatmap(self, page_size)
+		self.read_word = self._read_word_counted
+		self.write_word = self._write_word_counted
+		return self.heatmap
+
+	def disable_heatmap(self):
+		"""
+		Stop counting (see enable_heatmap_) and return the ``heatmap``.
+		"""
+		heatmap = self.heatmap
+		self.heatmap = None
+		self.__dict__.pop("read_word", None)
+		self.__dict__.pop("write_word", None)
+		return heatmap
+
+	def _read_word_counted(self, offset):
+		if(offset >= self.current_max_offset or offset < 0):
+			raise BUSError("Offset({}) exceeds address space of BUS({})".format(offset, self.current_max_offset))
+		self.reads += 1
+		index = bisect_right(self._decode_starts, offset) - 1
+		heatmap = self.heatmap
+		heatmap.device_reads[index] += 1
+		heatmap.reads[offset // heatmap.page_size] += 1
+		start = self._decode_starts[index]
+		word = self._decode_devices[index].read(offset - start)
+		if(self.debug > 5):
+			print("BUS::read({}) | startaddress({})> {}".format(offset, start, word))
+		return self.truncate(word)
+
+	def _write_word_counted(self, offset, word):
+		if(offset >= self.current_max_offset or offset < 0):
+			raise BUSError("Offset({}) exceeds address space of BUS({})".format(offset, self.current_max_offset))
+		self.writes += 1
+		index = bisect_right(self._decode_starts, offset) - 1
+		heatmap = self.heatmap
+		heatmap.device_writes[index] += 1
+		heatmap.writes[offset // heatmap.page_size] += 1
+		self._decode_devices[index].write(offset - self._decode_starts[index], self.truncate(word))
+
+	def fork(self):
+		"""
+		Returns a copy of the BUS with copies of all devices (see ``WordDevice.fork``).
+		"""
+		bus = copy.copy(self)
+		bus.devices = [device.fork() for device in self.devices]
+		bus.start_addresses = {}
+		bus.index = {}
+		for old, new in zip(self.devices, bus.devices):
+			start = self.start_addresses[old]
+			bus.start_addresses[new] = start
+			bus.index[range(start, start + new.size)] = new
+		if(self._lock):
+			bus._decode_devices = tuple(bus.devices)
+		# the counting methods are bound to this BUS
+		bus.disable_heatmap()
+		return bus
+
+
+class BusHeatmap(object):
+	"""
+	.. _BusHeatmap:
+
+	The accesses of a BUS_ (see enable_heatmap_), counted in ``array.array`` s:
+
+	``device_reads``, ``device_writes``
+		the reads and writes of every device (in the order of ``BUS.devices``)
+	``reads``, ``writes``
+		the reads and writes of every page: ``reads[address // page_size]``
+
+	The instructions fetched from the `decode cache`_ of the Processor_ are not counted.
+	"""
+	def __init__(self, bus, page_size = 256):
+		self.bus = bus
+		self.page_size = page_size
+		pages = (bus.current_max_offset + page_size - 1) // page_size
+		self.device_reads = array.array("Q", bytes(8 * len(bus.devices)))
+		self.device_writes = array.array("Q", bytes(8 * len(bus.devices)))
+		self.reads = array.array("Q", bytes(8 * pages))
+		self.writes = array.array("Q", bytes(8 * pages))
+
+	def reset(self):
+		"""
+		Set all counters to ``0``.
+		"""
+		for counters in (self.device_reads, self.device_writes, self.reads, self.writes):
+			counters[:] = array.array("Q", bytes(8 * len(counters)))
+
+	def to_dict(self):
+		"""
+		Returns the counters as ``dict``::
+
+			{"page_size": 256,
+			"devices": [{"device": "ROM", "start": 0, "size": 50, "reads": 10, "writes": 0}, ...],
+			"reads": [...], "writes": [...]}
+		"""
+		return {"page_size": self.page_size,
+				"devices": [{"device": type(device).__name__, "start": self.bus.start_addresses[device],
+						"size": device.size, "reads": reads, "writes": writes}
+					for device, reads, writes in zip(self.bus.devices, self.device_reads, self.device_writes)],
+				"reads": self.reads.tolist(),
+				"writes": self.writes.tolist()}
+
 class Integer(object):
 	"""
 	.. _Integer:
@@ -137,11 +301,12 @@ class Integer(object):
 
 	Use setvalue_ and getvalue_ or setuvalue_ and getuvalue_ to access the value.
 
-	Uses a bitset internally.
+	Uses mask and sign bit arithmetic with the constants
+	from integer_constants_.
 	"""
 	def __init__(self, value = 0, width = 64):
 		self.width = width
-		self.mask = 2 ** width - 1
+		self.mask, self.sign_bit, self.low_mask = integer_constants(width)
 		self._value = 0
 		self._sign = 0
 		self.setvalue(value)
@@ -162,24 +327,15 @@ class Integer(object):
 		.. _getvalue:
 
 		Get the signed value of the Integer, truncate it and handle Overflows.
+
+		If the sign bit (the highest bit) of the truncated value is set, the
+		remaining bits are inverted and the result is negative.
 		"""
-		bitset = [0] * self.width
-		zero = [1] * self.width
-
-		for shift in range(self.width):
-			bitset[shift] = (self._value & (1 << shift)) >> shift
-		sign = 0
-		if((not bitset[-1]) and self._sign):
-			bitset[-1] = 1
-			sign = 1
-		elif(bitset[-1]):
-			bitset = bitsetxor(bitset, zero)
-			sign = 1
-		
-		value = [ bitset[shift] << shift for shift in range(self.width - 1)]
-		value = sum(value)
-		if(sign):
-			return -1 * value
+		value = self._value & self.mask
+		if(value & self.sign_bit):
+			return (value & self.low_mask) - self.low_mask
+		if(self._sign):
+			return -value
 		return value
 
 	def setuvalue(self, value):
@@ -196,16 +352,31 @@ class Integer(object):
 
 		Get the unsigned value of the Integer, truncate it and handle Overflows.
 		"""
-		bitset = [0] * self.width
-		zero = [1] * self.width
-		for shift in range(self.width):
-			bitset[shift] = (self._value & (1 << shift)) >> shift
+		value = self._value & self.mask
 		if(self._sign):
-			bitset = bitsetxor(zero, bitset)
+			return value ^ self.mask
+		return value
 
-		value = [ bitset[shift] << shift for shift in range(self.width)]
-		return sum(value)
 
+_integer_constants = {}
+
+def integer_constants(width):
+	"""
+	.. _integer_constants:
+
+	Returns the tuple ``(mask, sign_bit, low_mask)`` used by Integer_ to
+	truncate values to ``width`` bits::
+
+		mask = 2 ** width - 1
+		sign_bit = 1 << (width - 1)
+		low_mask = sign_bit - 1
+
+	The constants are computed once per width.
+	"""
+	if(not width in _integer_constants):
+		sign_bit = 1 << (width - 1)
+		_integer_constants[width] = (2 ** width - 1, sign_bit, sign_bit - 1)
+	return _integer_constants[width]
 
 
 
@@ -214,16 +385,36 @@ class WordDevice(object):
 	.. _WordDevice:
 
 	Base Device for the register machine.
-	The words have the width ``width`` and are stored in an
-	Integer_ object.
+	The words have the width ``width`` and are stored in one flat
+	buffer ``repr_`` (see word_storage_), truncated like an Integer_.
 
 	Values are accessed by read_ and write_
+
+	Functions registered by add_write_hook_ are notified about
+	changed words.
 	"""
 	def __init__(self, size, width = 64, mode = 0b11, debug = 0):
 		self.size = size
-		self.repr_ = [Integer(width = width) for i in range(size)]
+		self.width = width
+		self.truncate = truncator(width)
+		self.repr_ = word_storage(size, width)
 		self.mode = mode
 		self.debug = debug
+		self.write_hooks = []
+
+	def add_write_hook(self, hook):
+		"""
+		.. _add_write_hook:
+
+		Register the function ``hook(offset, count)``. It is invoked
+		after ``count`` words starting at ``offset`` have been changed
+		by write_, store_ or ``program_word``.
+		"""
+		self.write_hooks.append(hook)
+
+	def _written(self, offset, count):
+		for hook in self.write_hooks:
+			hook(offset, count)
 
 	def read(self, offset):
 		"""
@@ -238,7 +429,7 @@ class WordDevice(object):
 			raise WriteOnlyError("Device is Write-Only")
 		if(offset >= self.size):
 			raise AddressError("Offset({}) not in address space({})".format(offset, self.size))
-		return self.repr_[offset].getvalue()
+		return self.repr_[offset]
 
 	def write(self, offset, value):
 		"""
@@ -253,7 +444,277 @@ class WordDevice(object):
 			raise ReadOnlyError("Device is Read-Only")
 		if(offset >= self.size):
 			raise AddressError("Offset({}) not in address space({})".format(offset, self.size))
-		self.repr_[offset].setvalue(value)
+		self.repr_[offset] = self.truncate(value)
+		if(self.write_hooks):
+			self._written(offset, 1)
+
+	def compare_and_swap(self, offset, expected, value):
+		"""
+		.. _compare_and_swap:
+
+		Writes ``value`` to the memory word at ``offset`` if the word equals
+		``expected`` (truncated to the width) and returns the old word.
+
+		The WordDevice is used by one thread, so this is atomic,
+		devices shared by several processes (like ``memory.SharedRAM``) override it.
+
+		Might raise the Exceptions of read_ and write_.
+		"""
+		old = self.read(offset)
+		if(old == self.truncate(expected)):
+			self.write(offset, value)
+		return old
+
+	def store(self, words, offset = 0):
+		"""
+		.. _store:
+
+		Writes the content of the iterable ``words`` starting at ``offset``
+		into the buffer in one step, ignoring the ``mode`` of the device.
+		Used to program ROM_ and Flash_.
+
+		Might raise AddressError_, if the words exceed the size of the device,
+		nothing is written in this case.
+
+		An ``array.array`` with the typecode word_typecode_ is copied as it is, if its
+		words do not need to be truncated.
+		"""
+		typecode = word_typecode(self.width)
+		if(not (isinstance(words, array.array) and words.typecode == typecode
+				and words.itemsize * 8 == self.width
+				and not -(1 << (self.width - 1)) in words)):
+			words = [self.truncate(word) for word in words]
+		if(offset + len(words) > self.size):
+			raise AddressError("Offset({}) not in address space({})".format(offset + len(words) - 1, self.size))
+		if(typecode != None and not isinstance(words, array.array)):
+			words = array.array(typecode, words)
+		self.repr_[offset:offset + len(words)] = words
+		if(self.write_hooks):
+			self._written(offset, len(words))
+
+
+	def fork(self):
+		"""
+		Returns a copy of the device that shares the words with this device.
+		The buffer is converted to a PagedStorage_, a page is copied once
+		it is written by one of the devices.
+
+		The write hooks are not copied.
+		"""
+		if(not isinstance(self.repr_, PagedStorage)):
+			self.repr_ = PagedStorage(self.repr_)
+		child = copy.copy(self)
+		child.repr_ = self.repr_.fork()
+		child.write_hooks = []
+		return child
+
+
+class PagedStorage(object):
+	"""
+	.. _PagedStorage:
+
+	A buffer of words (see word_storage_) divided into pages of ``page_size`` words.
+	Supports indexing, slicing, ``len`` and iteration like the flat buffer.
+
+	The pages can be shared by several PagedStorage objects (see fork_),
+	a shared page is copied before it is written (copy-on-write).
+	Assigning a slice does not copy pages whose content does not change.
+	"""
+	def __init__(self, words, page_size = 256):
+		self.size = len(words)
+		self.page_size = page_size
+		self.pages = [words[i:i + page_size] for i in range(0, len(words), page_size)]
+		self.owned = bytearray(b"\x01" * len(self.pages))
+
+	def fork(self):
+		"""
+		.. _fork:
+
+		Returns a PagedStorage that shares all pages with this one.
+		"""
+		child = copy.copy(self)
+		child.pages = list(self.pages)
+		self.owned = bytearray(len(self.pages))
+		child.owned = bytearray(len(self.pages))
+		return child
+
+	def _page(self, index):
+		if(not self.owned[index]):
+			self.pages[index] = self.pages[index][:]
+			self.owned[index] = 1
+		return self.pages[index]
+
+	def __len__(self):
+		return self.size
+
+	def __iter__(self):
+		for page in self.pages:
+			yield from page
+
+	def __getitem__(self, index):
+		if(isinstance(index, slice)):
+			words = self.pages[0][:0] if(self.pages) else []
+			for page in self.pages:
+				words += page
+			return words[index]
+		if(index < 0):
+			index += self.size
+		if(index < 0 or index >= self.size):
+			raise IndexError("PagedStorage index out of range")
+		return self.pages[index // self.page_size][index % self.page_size]
+
+	def __setitem__(self, index, value):
+		if(isinstance(index, slice)):
+			start, stop, step = index.indices(self.size)
+			if(step != 1 or len(value) != max(0, stop - start)):
+				raise ValueError("PagedStorage supports only contiguous slices of the same length")
+			page_size = self.page_size
+			while(start < stop):
+				number, offset = divmod(start, page_size)
+				end = min(stop, (number + 1) * page_size)
+				words = value[:end - start]
+				value = value[end - start:]
+				page = self.pages[number]
+				if(isinstance(page, array.array) and not (isinstance(words, array.array) and words.typecode == page.typecode)):
+					words = array.array(page.typecode, words)
+				if(page[offset:offset + end - start] != words):
+					self._page(number)[offset:offset + end - start] = words
+				start = end
+			return
+		if(index < 0):
+			index += self.size
+		if(index < 0 or index >= self.size):
+			raise IndexError("PagedStorage assignment index out of range")
+		number = index // self.page_size
+		if(self.owned[number]):
+			self.pages[number][index % self.page_size] = value
+		else:
+			self._page(number)[index % self.page_size] = value
+
+	def __eq__(self, other):
+		if(isinstance(other, PagedStorage)):
+			other = other[:]
+		return self[:] == other
+
+	def __ne__(self, other):
+		return not self == other
+
+
+def copy_words(words):
+	"""
+	.. _copy_words:
+
+	Returns a copy of the buffer ``words`` (see word_storage_),
+	a ``memoryview`` is copied to an ``array.array``.
+	"""
+	if(isinstance(words, memoryview)):
+		result = array.array(words.format)
+		result.frombytes(words.cast("B"))
+		return result
+	return words[:]
+
+def word_typecode(width):
+	"""
+	.. _word_typecode:
+
+	Returns the smallest signed ``array.array`` typecode that is able
+	to hold words of the width ``width`` or ``None`` if the width exceeds
+	``64`` bits.
+	"""
+	for typecode in "bhiq":
+		if(array.array(typecode).itemsize * 8 >= width):
+			return typecode
+	return None
+
+def word_storage(size, width):
+	"""
+	.. _word_storage:
+
+	Returns a zero filled buffer for ``size`` words of the width ``width``:
+	an ``array.array`` with the typecode word_typecode_ or a ``list`` of
+	``int`` if the width exceeds ``64`` bits.
+	"""
+	typecode = word_typecode(width)
+	if(typecode is None):
+		return [0] * size
+	return array.array(typecode, bytes(size * array.array(typecode).itemsize))
+
+def words_to_bytes(words, width):
+	"""
+	.. _words_to_bytes:
+
+	Returns the words ``words`` as little-endian signed integers of
+	``(width + 7) // 8`` bytes, or of the itemsize of word_typecode_ if there is one.
+
+	The words are truncated to ``width`` (see truncator_), unless they are an ``array.array``
+	with the typecode word_typecode_.
+	"""
+	typecode = word_typecode(width)
+	if(not isinstance(words, array.array) or words.typecode != typecode):
+		truncate = truncator(width)
+		words = [truncate(word) for word in words]
+	if(typecode is None):
+		size = (width + 7) // 8
+		return b"".join(word.to_bytes(size, "little", signed = True) for word in words)
+	if(not isinstance(words, array.array)):
+		words = array.array(typecode, words)
+	if(sys.byteorder == "big"):
+		words = array.array(typecode, words)
+		words.byteswap()
+	return words.tobytes()
+
+def words_from_bytes(data, width):
+	"""
+	.. _words_from_bytes:
+
+	Reverse of words_to_bytes_, returns an ``array.array`` (see word_storage_)
+	or a ``list`` if the width exceeds ``64`` bits.
+	"""
+	typecode = word_typecode(width)
+	if(typecode is None):
+		size = (width + 7) // 8
+		return [int.from_bytes(data[i:i + size], "little", signed = True) for i in range(0, len(data), size)]
+	words = array.array(typecode)
+	words.frombytes(data)
+	if(sys.byteorder == "big"):
+		words.byteswap()
+	return words
+
+def word_size(width):
+	"""
+	Returns the number of bytes used by words_to_bytes_ for one word.
+	"""
+	typecode = word_typecode(width)
+	if(typecode is None):
+		return (width + 7) // 8
+	return array.array(typecode).itemsize
+
+
+_truncators = {}
+
+def truncator(width):
+	"""
+	.. _truncator:
+
+	Returns a function that truncates a value to the width ``width``
+	and returns the signed value, just like::
+
+		Integer(value, width = width).getvalue()
+
+	The functions are created once per width.
+	"""
+	if(width in _truncators):
+		return _truncators[width]
+	mask, sign_bit, low_mask = integer_constants(width)
+	def truncate(value):
+		word = abs(value) & mask
+		if(word & sign_bit):
+			return (word & low_mask) - low_mask
+		if(value < 0):
+			return -word
+		return word
+	_truncators[width] = truncate
+	return truncate
 
 
 class Register(object):
@@ -285,6 +746,16 @@ class Register(object):
 		"""
 		self.repr_.setvalue(value)
 
+def isplainregister(register):
+	"""
+	.. _isplainregister:
+
+	Returns ``True`` if ``register`` uses ``read`` and ``write`` of Register_,
+	so reading and writing has no side effects.
+	"""
+	return (type(register).read is Register.read
+			and type(register).write is Register.write)
+
 		
 		
 
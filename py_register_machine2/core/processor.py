@@ -1,6 +1,6 @@
 #!/usr/bin/python3
-from ..core import memory, device, register
-import time
+from ..core import memory, device, register, parts
+import time, struct, heapq
 
 
 """
@@ -24,11 +24,29 @@ class RegisterInterface(object):
 
 	Used by the Processor to perform read/write
 	operations on the registers.
+
+	The content of all plain Registers (see ``isplainregister``) is stored in
+	the flat list ``values``, truncated to the width of the Register using
+	``truncators`` (words within ``-limits[index]`` and ``limits[index]`` are stored as they are).
+	The Register objects get a RegisterSlot_ as their ``repr_``, so ``Register.read``
+	and ``Register.write`` still work.
+	Only Registers that override ``read`` or ``write`` (like ``OutputRegister``) are
+	stored in ``hooks`` and accessed through their methods, the entries of ``hooks``
+	are ``None`` for plain Registers.
+
+	Names are resolved to indices using ``indices_by_name``.
+
+	``values`` is never replaced, so it is safe to keep a reference to it.
 	"""
 	def __init__(self, registers = [], debug = 0, width = 64):
 		self.debug = 0
 		self.registers_by_name = {}
 		self.registers_by_index = []
+		self.indices_by_name = {}
+		self.values = []
+		self.hooks = []
+		self.truncators = []
+		self.limits = []
 		self.width = width
 		self.size = 2 ** width - 1
 		self._lock = False
@@ -53,9 +71,57 @@ class RegisterInterface(object):
 			raise SetupError("Number of Registers would exceed the address space({})".format(self.size))
 		if(register.name in self.registers_by_name):
 			raise SetupError("Register with name '{}' already added.".format(register.name))
+		index = len(self.registers_by_index)
 		self.registers_by_name[register.name] = register
 		self.registers_by_index.append(register)
-		return len(self.registers_by_index) - 1
+		self.indices_by_name[register.name] = index
+		self.truncators.append(parts.truncator(register.width))
+		self.limits.append(parts.integer_constants(register.width)[2])
+		if(parts.isplainregister(register)):
+			self.values.append(register.read())
+			self.hooks.append(None)
+			register.repr_ = RegisterSlot(self, index, register.width)
+		else:
+			self.values.append(0)
+			self.hooks.append(register)
+		return index
+
+	def fork(self):
+		"""
+		Returns a new RegisterInterface with copies of all Registers.
+		"""
+		interface = _copy(self)
+		interface.values = list(self.values)
+		interface.hooks = []
+		interface.registers_by_index = []
+		interface.registers_by_name = {}
+		interface.indices_by_name = dict(self.indices_by_name)
+		interface.truncators = list(self.truncators)
+		interface.limits = list(self.limits)
+		for index, (register, hook) in enumerate(zip(self.registers_by_index, self.hooks)):
+			register = _copy(register)
+			if(hook == None):
+				register.repr_ = RegisterSlot(interface, index, register.width)
+			else:
+				register.repr_ = _copy(register.repr_)
+				hook = register
+			interface.hooks.append(hook)
+			interface.registers_by_index.append(register)
+			interface.registers_by_name[register.name] = register
+		return interface
+
+	def index_of(self, name):
+		"""
+		Returns the index of the Register with the name ``name``.
+
+		Raises a NameError if there is no such Register and an AttributeError if
+		``name`` is not a ``str``.
+		"""
+		if(not isinstance(name, str)):
+			raise AttributeError("name_or_index has to be `str` or `int`, but is {}".format(type(name)))
+		if(not name in self.indices_by_name):
+			raise NameError("No Register with name '{}'".format(name))
+		return self.indices_by_name[name]
 
 	def write(self, name_or_index, word):
 		"""
@@ -65,18 +131,20 @@ class RegisterInterface(object):
 
 		If there is no Register with the specified name or index, a NameError will be raised.
 		"""
-		if(isinstance(name_or_index, str)):
-			if(name_or_index in self.registers_by_name):
-				self.registers_by_name[name_or_index].write(word)
-			else:
-				raise NameError("No Register with name '{}'".format(name_or_index))
-		elif( isinstance(name_or_index, int)):
-			if(name_or_index < len(self.registers_by_index)):
-				self.registers_by_index[name_or_index].write(word)
+		if(not isinstance(name_or_index, int)):
+			name_or_index = self.index_of(name_or_index)
+		try:
+			hook = self.hooks[name_or_index]
+		except IndexError:
+			raise NameError("No Register with index '{}'".format(name_or_index))
+		if(hook == None):
+			limit = self.limits[name_or_index]
+			if(-limit <= word <= limit):
+				self.values[name_or_index] = word
 			else:
-				raise NameError("No Register with index '{}'".format(name_or_index))
+				self.values[name_or_index] = self.truncators[name_or_index](word)
 		else:
-			raise AttributeError("name_or_index has to be `str` or `int`, but is {}".format(type(name_or_index)))
+			hook.write(word)
 
 	def read(self, name_or_index):
 		"""
@@ -86,18 +154,44 @@ class RegisterInterface(object):
 
 		If there is no Register with the specified name or index, a NameError will be raised.
 		"""
-		if(isinstance(name_or_index, str)):
-			if(name_or_index in self.registers_by_name):
-				return self.registers_by_name[name_or_index].read()
-			else:
-				raise NameError("No Register with name '{}'".format(name_or_index))
-		elif( isinstance(name_or_index, int)):
-			if(name_or_index < len(self.registers_by_index)):
-				return self.registers_by_index[name_or_index].read()
-			else:
-				raise NameError("No Register with index '{}'".format(name_or_index))
-		else:
-			raise AttributeError("name_or_index has to be `str` or `int`, but is {}".format(type(name_or_index)))
+		if(not isinstance(name_or_index, int)):
+			name_or_index = self.index_of(name_or_index)
+		try:
+			hook = self.hooks[name_or_index]
+		except IndexError:
+			raise NameError("No Register with index '{}'".format(name_or_index))
+		if(hook == None):
+			return self.values[name_or_index]
+		return hook.read()
+
+
+class RegisterSlot(object):
+	"""
+	.. _RegisterSlot:
+
+	Replaces the Integer_ of a plain Register in a RegisterInterface_,
+	the value is stored in ``values[index]`` of the interface.
+	Provides the methods of Integer_, ``getuvalue`` is computed from the
+	truncated (signed) value.
+	"""
+	def __init__(self, register_interface, index, width = 64):
+		self.values = register_interface.values
+		self.index = index
+		self.width = width
+		self.mask, self.sign_bit, self.low_mask = parts.integer_constants(width)
+		self.truncate = parts.truncator(width)
+
+	def setvalue(self, value):
+		self.values[self.index] = self.truncate(value)
+	def getvalue(self):
+		return self.values[self.index]
+	def setuvalue(self, value):
+		self.values[self.index] = self.truncate(value & self.mask)
+	def getuvalue(self):
+		value = self.values[self.index]
+		if(value < 0):
+			return -value ^ self.mask
+		return value
 
 
 class Processor(object):
@@ -136,6 +230,9 @@ class Processor(object):
 	1. The second Register (index 1) is the Engine Control Register (ECR) take a look at EnigneControlBits_.
 	2. The third Register (index 2) is the Stack Pointer (SP) and may be used for ``call``, ``ret``, ``push`` and ``pop``
 
+	The Registers are the only storage of these values, the Processor and the Commands
+	access the same Register objects (the Processor uses the properties ``pc``, ``ecr`` and ``sp``).
+
 
 	.. _`internal constants`:
 
@@ -162,6 +259,21 @@ class Processor(object):
 
 	The number of cycles can be observed by acessing the ``cycles`` variable.
 
+	.. _`decode cache`:
+
+	**Decode Cache**
+
+	Decoded instructions are cached by their address as
+	``(command, args, next_pc)``. The cache is filled lazily and
+	an entry is dropped once one of its words is changed (see add_write_hook_),
+	so self modifying code and code copied to the RAM work as expected.
+	Fetching a cached instruction does not read the memory BUS_.
+	Only instructions in devices that provide add_write_hook_ are cached,
+	the instructions in other devices are decoded in every cycle.
+	The instructions in a ``memory.SharedRAM`` are never cached, because other
+	processes write to it without notifying the write hooks.
+	Use flush_decode_cache_ if the memory has been changed behind the back of the devices.
+
 	"""
 	def __init__(self, f_cpu = None, width = 64,
 			interrupts = False, clock_barrier = None, debug = 0):
@@ -175,25 +287,35 @@ class Processor(object):
 		self.f_cpu = f_cpu
 		self.clock_barrier = clock_barrier
 
-		if(f_cpu != None and clock != None):
+		if(f_cpu != None and clock_barrier != None):
 			raise SetupError("Software Clock (f_cpu) and Thread Clock (clock_barrier) are mutually exclusive")
 		self.interrupt_enable = interrupts
 		self.interrupts = []
 		self.debug = debug
 
 		self.commands_by_opcode = {}
+		self.max_instruction_length = 1
+		self._decode_cache = {}
+		self._decoded_words = None
+		self._hooked_words = None
 
 		self.last_cycle = None
 		self.current_cycle = None
 
-
-		self.pc = 0
-		self.ecr = 0
-		self.sp = 0
 		self.on_cycle_callbacks = []
 		self.constants = {}
 		self.cycles = 0
 		self.push_pc = False
+		self.profiler = None
+		self.stats = None
+		self.tracer = None
+		self.clock = None
+
+		self._timers = []
+		self._events = []
+		self._next_event = _never
+		# the PC before the first interrupt, reset by the counting loop in every cycle
+		self._interrupted_pc = None
 
 	def en_dis_able_interrupts(self, mask):
 		"""
@@ -220,41 +342,95 @@ class Processor(object):
 		Interrupts the Processor and forces him to jump to ``address``.
 		If ``push_pc`` is enabled this will push the PC to the stack.
 		"""
+		if(self._interrupted_pc == None):
+			self._interrupted_pc = self.pc
 		if(self.push_pc):
 			self.memory_bus.write_word(self.sp, self.pc)
-			self._set_sp(self.sp - 1)
-		self._set_pc(address)
-
-	def _increase_pc(self):
-		self.pc += 1
-		self.register_interface.write(0, self.pc)
-		self.pc = self.register_interface.read(0)
-	def _refresh_pc(self):
-		self.pc = self.register_interface.read(0)
-	def _refresh_ecr(self):
-		self.ecr = self.register_interface.read(1)
-		if(self.debug > 5):
-			print("ECR: {}".format(bin(self.ecr)))
-	def _refresh_sp(self):
-		self.sp = self.register_interface.read(2)
-		if(self.debug > 5):
-			print("SP: {}".format(bin(self.sp)))
-	def _fetch_at_pc(self):
-		opcode = self.memory_bus.read_word(self.pc)
-		self._increase_pc()
-		return opcode
-	def _set_sp(self, sp):
-		self.sp = sp
-		self.register_interface.write(2, sp)
-		self._refresh_sp()
-	def _set_pc(self, pc):
-		self.pc = pc
-		self.register_interface.write(0, pc)
-		self._refresh_pc()
-	def _set_ecr(self, ecr):
-		self.ecr = ecr
-		self.register_interface.write(1, ecr)
-		self._refresh_ecr()
+			self.sp -= 1
+		self.pc = address
+
+	def schedule(self, timer, cycle):
+		"""
+		.. _schedule:
+
+		Schedule the event of ``timer`` (like a Counter_): ``timer.on_event()`` is invoked
+		once ``cycles`` reaches ``cycle``, after the instruction and the on cycle callbacks
+		of that cycle. ``timer.due`` is set to ``cycle``.
+
+		A timer has at most one pending event, scheduling it again replaces the event,
+		``cycle = None`` cancels it. Events of the same cycle are handled in the
+		order the timers have been scheduled for the first time.
+
+		The events are kept in a heap, the run loops just compare ``cycles`` with the
+		next event, so the timers cost nothing between their events.
+		"""
+		if(getattr(timer, "event_index", None) == None):
+			timer.event_index = len(self._timers)
+			self._timers.append(timer)
+		timer.due = cycle
+		if(cycle == None):
+			return
+		heapq.heappush(self._events, (cycle, timer.event_index, timer))
+		if(cycle < self._next_event):
+			self._next_event = cycle
+
+	def _dispatch_events(self, cycles):
+		events = self._events
+		while(events and events[0][0] <= cycles):
+			due, index, timer = heapq.heappop(events)
+			# replaced or cancelled events stay in the heap
+			if(timer.due != due):
+				continue
+			timer.on_event()
+			if(timer.due == due):
+				timer.due = None
+		self._next_event = events[0][0] if(events) else _never
+
+	def _reschedule(self):
+		self._events = [(timer.due, timer.event_index, timer) for timer in self._timers if(timer.due != None)]
+		heapq.heapify(self._events)
+		self._next_event = self._events[0][0] if(self._events) else _never
+
+	def _set_cycles(self, cycles):
+		"""
+		Set ``cycles``, the pending events are moved, too.
+		"""
+		delta = cycles - self.cycles
+		self.cycles = cycles
+		if(delta and self._timers):
+			for timer in self._timers:
+				if(timer.due != None):
+					timer.due += delta
+			self._reschedule()
+
+	@property
+	def pc(self):
+		"""
+		The content of the PC_. The Register is the only storage of the PC_,
+		so reading and writing invokes the Register's ``read`` and ``write``.
+		"""
+		return self.register_interface.registers_by_index[0].read()
+	@pc.setter
+	def pc(self, pc):
+		self.register_interface.registers_by_index[0].write(pc)
+	@property
+	def ecr(self):
+		"""
+		The content of the ECR_, see ``pc``.
+		"""
+		return self.register_interface.registers_by_index[1].read()
+	@ecr.setter
+	def ecr(self, ecr):
+		self.register_interface.registers_by_index[1].write(ecr)
+	@property
+	def sp(self):
+		"""
+		The content of the SP_, see ``pc``.
+		"""
+		return self.register_interface.registers_by_index[2].read()
+	@sp.setter
+	def sp(self, sp):
+		self.register_interface.registers_by_index[2].write(sp)
 	def _execute_on_cycle_callbacks(self):
 		for callback in self.on_cycle_callbacks:
 			callback()
@@ -284,7 +460,7 @@ class Processor(object):
 			ram = self.memory_bus.devices[1]
 			self.constants["RAMEND_HIGH"] = rom.size + ram.size - 1
 			self.constants["RAMEND_LOW"] = rom.size
-			self._set_sp(rom.size + ram.size - 1)
+			self.sp = rom.size + ram.size - 1
 			self.push_pc = True
 		if(self.device_bus.device_count() > 0):
 			flash = self.device_bus.devices[0]
@@ -297,10 +473,124 @@ class Processor(object):
 		rom = self.memory_bus.devices[0]
 		if(self.memory_bus.device_count() > 1):
 			ram = self.memory_bus.devices[1]
-			self._set_sp(rom.size + ram.size - 1)
-		self._set_pc(0)
-		self._set_ecr(0)
-		self.cycles = 0
+			self.sp = rom.size + ram.size - 1
+		self.pc = 0
+		self.ecr = 0
+		self._set_cycles(0)
+
+	def fork(self):
+		"""
+		.. _fork:
+
+		Returns a new Processor with the same state, Commands and Interrupts.
+
+		The Registers are copied, the devices are forked (see ``WordDevice.fork``):
+		the Processors share the words of the devices until one of them writes a page,
+		this page is copied for the writer. So forking a Processor with a large ROM
+		and Flash is cheap.
+
+		The ``on_cycle_callbacks`` of the Interrupts are bound to the new Interrupts,
+		all other callbacks are shared.
+		"""
+		child = _copy(self)
+		child.memory_bus = self.memory_bus.fork()
+		child.device_bus = self.device_bus.fork()
+		child.register_interface = self.register_interface.fork()
+		child.constants = dict(self.constants)
+		child._decode_cache = {}
+		child._decoded_words = None
+		child.profiler = None
+		child.stats = None
+		child.tracer = None
+		child.clock = None
+		child.commands_by_opcode = {}
+		for opcode, command in self.commands_by_opcode.items():
+			command = _copy(command)
+			command.membus = child.memory_bus
+			command.devbus = child.device_bus
+			command.register_interface = child.register_interface
+			child.commands_by_opcode[opcode] = command
+
+		child.interrupts = []
+		interrupts = {}
+		for interrupt in self.interrupts:
+			new = _copy(interrupt)
+			new.processor = child
+			interrupts[id(interrupt)] = new
+			child.interrupts.append(new)
+		child.on_cycle_callbacks = []
+		for callback in self.on_cycle_callbacks:
+			owner = id(getattr(callback, "__self__", None))
+			if(owner in interrupts):
+				callback = getattr(interrupts[owner], callback.__name__)
+			child.on_cycle_callbacks.append(callback)
+		child._timers = [interrupts.get(id(timer), timer) for timer in self._timers]
+		child._reschedule()
+		return child
+
+	def snapshot(self):
+		"""
+		.. _snapshot:
+
+		Returns a Snapshot_ of the complete machine: the content of all devices on
+		the memory BUS_ and the device BUS_, all Registers, ``cycles``, ``interrupt_enable``
+		and the ``enable`` flag and ``counter`` of the Interrupts.
+
+		Use ``Snapshot.to_bytes`` to get the binary form.
+		"""
+		devices = self.memory_bus.devices + self.device_bus.devices
+		registers = list(self.register_interface.values)
+		for index, hook in enumerate(self.register_interface.hooks):
+			if(hook != None):
+				registers[index] = hook.repr_.getvalue()
+		return Snapshot([device.width for device in devices],
+				[parts.copy_words(device.repr_) for device in devices],
+				[r.width for r in self.register_interface.registers_by_index],
+				registers,
+				self.cycles,
+				self.interrupt_enable,
+				[(interrupt.enable, getattr(interrupt, "counter", None)) for interrupt in self.interrupts])
+
+	def restore(self, snapshot):
+		"""
+		.. _restore:
+
+		Restore the state saved by snapshot_. ``snapshot`` is a Snapshot_ or its binary form.
+
+		The words are copied in one step per device, devices that did not change
+		are skipped. The write hooks of the changed devices are notified,
+		so the `decode cache`_ stays valid.
+
+		Raises a SetupError_ if the snapshot does not fit the layout of the Processor.
+		"""
+		if(not isinstance(snapshot, Snapshot)):
+			snapshot = Snapshot.from_bytes(snapshot)
+		devices = self.memory_bus.devices + self.device_bus.devices
+		if([(device.width, device.size) for device in devices] != [(width, len(words))
+					for width, words in zip(snapshot.device_widths, snapshot.devices)]
+				or [r.width for r in self.register_interface.registers_by_index] != snapshot.register_widths
+				or len(self.interrupts) != len(snapshot.interrupts)):
+			raise SetupError("Snapshot does not match the layout of the Processor")
+
+		for device, words in zip(devices, snapshot.devices):
+			if(device.repr_ != words):
+				device.repr_[:] = words
+				if(device.write_hooks):
+					device._written(0, device.size)
+
+		values = self.register_interface.values
+		values[:] = snapshot.registers
+		for index, hook in enumerate(self.register_interface.hooks):
+			if(hook != None):
+				hook.repr_.setvalue(values[index])
+				values[index] = 0
+
+		self._set_cycles(snapshot.cycles)
+		self.interrupt_enable = snapshot.interrupt_enable
+		for interrupt, (enable, counter) in zip(self.interrupts, snapshot.interrupts):
+			interrupt.enable = enable
+			if(counter != None):
+				interrupt.counter = counter
 
 
 	def register_on_cycle_callback(self, callback):
@@ -324,13 +614,20 @@ class Processor(object):
 
 		Register a Command in the Processor,
 		the Command can now be executed by the Processor.
+
+		The Processor uses a copy of ``command``, so one Command can be
+		registered in several Processors.
 		"""
 		if(command.opcode() in self.commands_by_opcode):
 			raise SetupError("Command with opcode {}(mnemonic: {}) already registered".format(command.opcode(), command.mnemonic()))
+		# the Command objects are shared by all Processors using them
+		command = _copy(command)
 		command.membus = self.memory_bus
 		command.devbus = self.device_bus
 		command.register_interface = self.register_interface
 		self.commands_by_opcode[command.opcode()] = command
+		self.max_instruction_length = max(self.max_instruction_length, command.numargs() + 1)
+		self.flush_decode_cache()
 
 	def register_memory_device(self, device):
 		"""
@@ -357,14 +654,67 @@ class Processor(object):
 		self.register_interface.add_register(register)
 
 
+	def flush_decode_cache(self):
+		"""
+		.. _flush_decode_cache:
+
+		Drop all entries of the `decode cache`_.
+		"""
+		self._decode_cache.clear()
+		if(self._decoded_words != None):
+			self._decoded_words[:] = bytes(len(self._decoded_words))
+
+	def _hook_memory_devices(self):
+		self._decoded_words = bytearray(self.memory_bus.current_max_offset)
+		# the words of the devices that invalidate the decoded instructions
+		self._hooked_words = bytearray(self.memory_bus.current_max_offset)
+		for device in self.memory_bus.devices:
+			if(hasattr(device, "add_write_hook") and not isinstance(device, memory.SharedRAM)):
+				start = self.memory_bus.start_addresses[device]
+				self._hooked_words[start:start + device.size] = b"\x01" * device.size
+				device.add_write_hook(lambda offset, count, start = start: self._invalidate_decoded(start + offset, count))
+
+	def _invalidate_decoded(self, address, count):
+		decoded_words = self._decoded_words
+		if(count > 1):
+			if(any(decoded_words[address:address + count])):
+				self.flush_decode_cache()
+			return
+		if(not decoded_words[address]):
+			return
+		decoded_words[address] = 0
+		for pc in range(address - self.max_instruction_length + 1, address + 1):
+			entry = self._decode_cache.get(pc)
+			if(entry != None and entry[2] > address):
+				del(self._decode_cache[pc])
+
+	def _decode_at(self, pc):
+		if(self._decoded_words == None):
+			self._hook_memory_devices()
+		opcode = self.memory_bus.read_word(pc)
+		if(not opcode in self.commands_by_opcode):
+			self.pc = pc + 1
+			raise SIGILL("Invalid opcode ({}) at {}".format(opcode, pc))
+		command = self.commands_by_opcode[opcode]
+		args = tuple(self.memory_bus.read_word(pc + 1 + i) for i in range(command.numargs()))
+		next_pc = pc + 1 + len(args)
+		entry = (command, args, next_pc)
+		if(0 in self._hooked_words[pc:next_pc]):
+			return entry
+		self._decode_cache[pc] = entry
+		self._decoded_words[pc:next_pc] = b"\x01" * (next_pc - pc)
+		return entry
+
 	def do_cycle(self):
 		"""
 		.. _do_cycle:
 
 		Run one clock cycle of the Processor_,
 		works according to processor_phases_.
+		The fetch, decode and fetch operands phases are skipped if
+		the instruction is in the `decode cache`_.
 
-		Then all ``on_cycle_callbacks`` are executed and the internal Registers are updated.
+		Then all ``on_cycle_callbacks`` are executed.
 
 		If ``f_cpu`` is set and the execution took not long enough,
 		``do_cycle`` will wait until the right time for the next cycle.
@@ -377,20 +727,23 @@ class Processor(object):
 			if(self.last_cycle == None):
 				self.last_cycle = time.time()
 
-		opcode = self._fetch_at_pc()
-		if(not opcode in self.commands_by_opcode):
-			raise SIGILL("Invalid opcode ({}) at {}".format(opcode, self.pc - 1))
-		command = self.commands_by_opcode[opcode]
-		numargs = command.numargs()
-		args = [self._fetch_at_pc() for i in range(numargs)]
+		pc_register = self.register_interface.registers_by_index[0]
+		pc = pc_register.read()
+		entry = self._decode_cache.get(pc)
+		if(entry == None):
+			entry = self._decode_at(pc)
+		command, args, next_pc = entry
+		pc_register.write(next_pc)
 		if(self.debug > 2):
-			print("{}|EXEC: [{}] {} $ ".format(self.pc, opcode, command.mnemonic()), *args)
+			print("{}|EXEC: [{}] {} $ ".format(next_pc, command.opcode(), command.mnemonic()), *args)
 		command.exec(*args)
+		if(self.debug > 5):
+			print("ECR: {}".format(bin(self.ecr)))
+			print("SP: {}".format(bin(self.sp)))
 
-		self._refresh_pc()
-		self._refresh_ecr()
-		self._refresh_sp()
 		self._execute_on_cycle_callbacks()
+		if(self.cycles + 1 >= self._next_event):
+			self._dispatch_events(self.cycles + 1)
 
 		self.current_cycle = time.time()
 		if(self.f_cpu != None):
@@ -401,16 +754,370 @@ class Processor(object):
 		if(self.clock_barrier != None):
 			self.clock_barrier.wait()
 		self.cycles += 1
-	def run(self):
+	def run(self, max_cycles = None):
 		"""
+		.. _run:
+
 		Runs do_cycle_, until either a stop bit in the ECR_ is set (see EnigneControlBits_),
+		``max_cycles`` cycles have been executed (if ``max_cycles`` is not ``None``)
 		or if an Exception in do_cycle_ occurs.
+
+		The loop is selected once by _select_run_loop_, if neither ``f_cpu``,
+		``clock_barrier``, ``on_cycle_callbacks`` nor ``debug > 2`` are used,
+		the cycles are executed without checking for these features and
+		PC_ and ECR_ are accessed in the ``values`` of the RegisterInterface_
+		(unless they are subclassed Registers).
+
+		If the ``clock`` is set (see ``engine_tools.clock.SoftwareClock``) the selected
+		loop is run in quanta that are paced by the clock, ``f_cpu`` must not be set then.
+
+		Returns the tuple ``(cycles, halted)``: the number of executed cycles and
+		``True`` if the stop bit has been set.
 		"""
-		while(1):
+		if(self.clock != None):
+			if(self.f_cpu != None):
+				raise SetupError("Software Clock (f_cpu) and the batched clock are mutually exclusive")
+			return self.clock.run(self._select_run_loop(), max_cycles)
+		return self._select_run_loop()(max_cycles)
+
+	def _select_run_loop(self):
+		"""
+		.. _select_run_loop:
+
+		Returns the loop used by run_.
+		If the ``profiler`` is set (see ``engine_tools.profiler.Profiler``)
+		the profiling loop is used, else if the ``stats`` are set
+		(see ``engine_tools.stats.ExecutionStats``) the counting loop is used,
+		else if the ``tracer`` is set (see ``engine_tools.tracer.Tracer``)
+		the tracing loop is used. These loops have a variant that uses do_cycle_
+		(if the Processor needs it, see run_), the variant is selected here.
+
+		Raises a SetupError_ if more than one of ``profiler``, ``stats`` and ``tracer`` is set.
+		"""
+		instruments = [name for name in ("profiler", "stats", "tracer") if(getattr(self, name) != None)]
+		if(len(instruments) > 1):
+			raise SetupError("{} can not be used together".format(" and ".join(instruments)))
+		plain = not self._needs_do_cycle()
+		if(self.profiler != None):
+			return self._run_profiled if(plain) else self._run_profiled_cycles
+		if(self.stats != None):
+			return self._run_counted if(plain) else self._run_counted_cycles
+		if(self.tracer != None):
+			return self._run_traced if(plain) else self._run_traced_cycles
+		if(not plain):
+			return self._run_cycles
+		return self._run_plain
+
+	def _needs_do_cycle(self):
+		return (self.f_cpu != None or self.clock_barrier != None
+				or self.on_cycle_callbacks or self.debug > 2
+				or self.register_interface.hooks[0] != None
+				or self.register_interface.hooks[1] != None)
+
+	def _run_cycles(self, max_cycles):
+		stop_bit = EnigneControlBits.engine_stop_bit
+		cycles = 0
+		while(max_cycles == None or cycles < max_cycles):
+			self.do_cycle()
+			cycles += 1
+			if(self.ecr & stop_bit):
+				return cycles, True
+		return cycles, False
+
+	def _run_plain(self, max_cycles):
+		stop_bit = EnigneControlBits.engine_stop_bit
+		decode_cache = self._decode_cache
+		values = self.register_interface.values
+		truncate_pc = self.register_interface.truncators[0]
+		cycles = 0
+		while(max_cycles == None or cycles < max_cycles):
+			entry = decode_cache.get(values[0])
+			if(entry == None):
+				entry = self._decode_at(values[0])
+			command, args, next_pc = entry
+			values[0] = truncate_pc(next_pc)
+			command.exec(*args)
+
+			if(self.cycles + 1 >= self._next_event):
+				self._dispatch_events(self.cycles + 1)
+			self.cycles += 1
+			cycles += 1
+			if(values[1] & stop_bit):
+				return cycles, True
+		return cycles, False
+
+	def _run_profiled(self, max_cycles):
+		stop_bit = EnigneControlBits.engine_stop_bit
+		decode_cache = self._decode_cache
+		values = self.register_interface.values
+		truncate_pc = self.register_interface.truncators[0]
+		counts = self.profiler.counts
+		times = self.profiler.times
+		now = time.perf_counter_ns
+		cycles = 0
+		last = now()
+		while(max_cycles == None or cycles < max_cycles):
+			pc = values[0]
+			entry = decode_cache.get(pc)
+			if(entry == None):
+				entry = self._decode_at(pc)
+			command, args, next_pc = entry
+			values[0] = truncate_pc(next_pc)
+			command.exec(*args)
+			if(self.cycles + 1 >= self._next_event):
+				self._dispatch_events(self.cycles + 1)
+			self.cycles += 1
+
+			counts[pc] += 1
+			current = now()
+			times[pc] += current - last
+			last = current
+			cycles += 1
+			if(values[1] & stop_bit):
+				return cycles, True
+		return cycles, False
+
+	def _run_profiled_cycles(self, max_cycles):
+		stop_bit = EnigneControlBits.engine_stop_bit
+		counts = self.profiler.counts
+		times = self.profiler.times
+		now = time.perf_counter_ns
+		cycles = 0
+		last = now()
+		while(max_cycles == None or cycles < max_cycles):
+			pc = self.pc
 			self.do_cycle()
-			if(self.ecr & EnigneControlBits.engine_stop_bit):
-				break
 
+			counts[pc] += 1
+			current = now()
+			times[pc] += current - last
+			last = current
+			cycles += 1
+			if(self.ecr & stop_bit):
+				return cycles, True
+		return cycles, False
+
+	def _run_counted(self, max_cycles):
+		stop_bit = EnigneControlBits.engine_stop_bit
+		decode_cache = self._decode_cache
+		values = self.register_interface.values
+		truncate_pc = self.register_interface.truncators[0]
+		stats = self.stats
+		entries = stats.update()
+		cycles = 0
+		while(max_cycles == None or cycles < max_cycles):
+			entry = decode_cache.get(values[0])
+			if(entry == None):
+				entry = self._decode_at(values[0])
+			command, args, next_pc = entry
+			next_pc = truncate_pc(next_pc)
+			values[0] = next_pc
+			command.exec(*args)
+
+			counters = entries[command]
+			counters[0] += 1
+			if(values[0] != next_pc):
+				counters[1] += 1
+			if(counters[2]):
+				stats.call_depth += counters[2]
+				if(stats.call_depth > stats.max_call_depth):
+					stats.max_call_depth = stats.call_depth
+			if(self.cycles + 1 >= self._next_event):
+				self._dispatch_events(self.cycles + 1)
+			self.cycles += 1
+			cycles += 1
+			if(values[1] & stop_bit):
+				return cycles, True
+		return cycles, False
+
+	def _run_counted_cycles(self, max_cycles):
+		stop_bit = EnigneControlBits.engine_stop_bit
+		decode_cache = self._decode_cache
+		truncate_pc = self.register_interface.truncators[0]
+		stats = self.stats
+		entries = stats.update()
+		cycles = 0
+		while(max_cycles == None or cycles < max_cycles):
+			pc = self.pc
+			entry = decode_cache.get(pc)
+			if(entry == None):
+				entry = self._decode_at(pc)
+			command, args, next_pc = entry
+			next_pc = truncate_pc(next_pc)
+			self._interrupted_pc = None
+			self.do_cycle()
+
+			counters = entries[command]
+			counters[0] += 1
+			pc = self._interrupted_pc if(self._interrupted_pc != None) else self.pc
+			if(pc != next_pc):
+				counters[1] += 1
+			if(counters[2]):
+				stats.call_depth += counters[2]
+				if(stats.call_depth > stats.max_call_depth):
+					stats.max_call_depth = stats.call_depth
+			cycles += 1
+			if(self.ecr & stop_bit):
+				return cycles, True
+		return cycles, False
+
+	def _run_traced(self, max_cycles):
+		stop_bit = EnigneControlBits.engine_stop_bit
+		decode_cache = self._decode_cache
+		values = self.register_interface.values
+		truncate_pc = self.register_interface.truncators[0]
+		tracer = self.tracer
+		cycles = 0
+		tracer.attach()
+		try:
+			while(max_cycles == None or cycles < max_cycles):
+				pc = values[0]
+				entry = decode_cache.get(pc)
+				if(entry == None):
+					entry = self._decode_at(pc)
+				command, args, next_pc = entry
+				cycle = self.cycles
+				values[0] = truncate_pc(next_pc)
+				command.exec(*args)
+				tracer.record(cycle, pc, command.opcode(), args)
+				if(cycle + 1 >= self._next_event):
+					self._dispatch_events(cycle + 1)
+				self.cycles += 1
+
+				cycles += 1
+				if(values[1] & stop_bit):
+					return cycles, True
+			return cycles, False
+		finally:
+			tracer.detach()
+
+	def _run_traced_cycles(self, max_cycles):
+		stop_bit = EnigneControlBits.engine_stop_bit
+		decode_cache = self._decode_cache
+		tracer = self.tracer
+		cycles = 0
+		tracer.attach()
+		try:
+			while(max_cycles == None or cycles < max_cycles):
+				pc = self.pc
+				entry = decode_cache.get(pc)
+				if(entry == None):
+					entry = self._decode_at(pc)
+				command, args, next_pc = entry
+				cycle = self.cycles
+				self.do_cycle()
+				tracer.record(cycle, pc, command.opcode(), args)
+
+				cycles += 1
+				if(self.ecr & stop_bit):
+					return cycles, True
+			return cycles, False
+		finally:
+			tracer.detach()
+
+
+_never = float("inf")
+
+def _copy(obj):
+	# faster than copy.copy for plain objects
+	new = obj.__class__.__new__(obj.__class__)
+	new.__dict__.update(obj.__dict__)
+	return new
+
+
+class Snapshot(object):
+	"""
+	.. _Snapshot:
+
+	The state of a Processor_, see snapshot_ and restore_.
+
+	``devices`` holds copies of the buffers of the devices (see word_storage_),
+	``registers`` the content of all Registers by index.
+
+	The binary form (to_bytes_) is::
+
+		"PRM2SNAP" version(u8) cycles(i64) interrupt_enable(u8)
+		number_of_devices(u32) [width(u32) size(u32) words] ...
+		number_of_registers(u32) [width(u32)] ... [word] ...
+		number_of_interrupts(u32) [enable(u8) has_counter(u8) counter(i64)] ...
+
+	All integers are little-endian, the words are stored using words_to_bytes_.
+	"""
+	magic = b"PRM2SNAP"
+	version = 1
+
+	def __init__(self, device_widths, devices, register_widths, registers,
+			cycles = 0, interrupt_enable = False, interrupts = []):
+		self.device_widths = device_widths
+		self.devices = devices
+		self.register_widths = register_widths
+		self.registers = registers
+		self.cycles = cycles
+		self.interrupt_enable = interrupt_enable
+		self.interrupts = interrupts
+
+	def to_bytes(self):
+		"""
+		.. _to_bytes:
+
+		Returns the binary form of the Snapshot.
+		"""
+		data = [self.magic, struct.pack("<BqB", self.version, self.cycles, bool(self.interrupt_enable)),
+				struct.pack("<I", len(self.devices))]
+		for width, words in zip(self.device_widths, self.devices):
+			data.append(struct.pack("<II", width, len(words)))
+			data.append(parts.words_to_bytes(words, width))
+		data.append(struct.pack("<I", len(self.registers)))
+		data.append(struct.pack("<{}I".format(len(self.register_widths)), *self.register_widths))
+		for width, word in zip(self.register_widths, self.registers):
+			data.append(parts.words_to_bytes([word], width))
+		data.append(struct.pack("<I", len(self.interrupts)))
+		for enable, counter in self.interrupts:
+			data.append(struct.pack("<BBq", bool(enable), counter != None, counter or 0))
+		return b"".join(data)
+
+	@staticmethod
+	def from_bytes(data):
+		"""
+		Returns the Snapshot saved by to_bytes_.
+
+		Raises a ValueError if ``data`` is not a Snapshot.
+		"""
+		if(not data.startswith(Snapshot.magic)):
+			raise ValueError("data is not a Snapshot")
+		offset = len(Snapshot.magic)
+		version, cycles, interrupt_enable = struct.unpack_from("<BqB", data, offset)
+		if(version != Snapshot.version):
+			raise ValueError("unsupported Snapshot version: {}".format(version))
+		offset += struct.calcsize("<BqB")
+
+		def unpack(fmt):
+			nonlocal offset
+			result = struct.unpack_from(fmt, data, offset)
+			offset += struct.calcsize(fmt)
+			return result
+		def words(width, count):
+			nonlocal offset
+			size = parts.word_size(width) * count
+			result = parts.words_from_bytes(data[offset:offset + size], width)
+			offset += size
+			return result
+
+		device_widths = []
+		devices = []
+		for i in range(unpack("<I")[0]):
+			width, size = unpack("<II")
+			device_widths.append(width)
+			devices.append(words(width, size))
+		count = unpack("<I")[0]
+		register_widths = list(unpack("<{}I".format(count)))
+		registers = [words(width, 1)[0] for width in register_widths]
+		interrupts = []
+		for i in range(unpack("<I")[0]):
+			enable, has_counter, counter = unpack("<BBq")
+			interrupts.append((bool(enable), counter if(has_counter) else None))
+		return Snapshot(device_widths, devices, register_widths, registers,
+				cycles, bool(interrupt_enable), interrupts)
 
 
 class SetupError(Exception):
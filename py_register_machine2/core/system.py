@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.core.system**: Several Processors sharing devices
+
+A System_ runs several Processor_ s in one thread, interleaved in quanta of cycles,
+instead of running every Processor in its own thread that waits on a
+``clock_barrier`` after every cycle.
+
+The Processors share devices by registering the same device on their BUS es,
+the writes of one Processor are visible to the other Processors immediately
+(and drop the entries of their `decode cache`_). So the Processors are only
+synchronized at the boundaries of the quanta and on the accesses of the shared devices.
+
+*Example*::
+
+	shared = memory.RAM(100)
+	system = System(quantum = 1000)
+	for code in (producer, consumer):
+		proc, rom, ram, flash = small_register_machine()
+		# register the shared device after the RAM, the RAM holds the stack
+		proc.register_memory_device(shared)
+		proc.setup_done()
+		rom.program(Assembler(proc, StringIO(code)).assemble())
+		system.add_processor(proc)
+
+	system.run()
+
+run_processes_ runs every Processor in its own process instead, the Processors
+must share SharedRAM_ s (see ``core.memory``) then. The ``cas`` command
+(see ``commands.atomic``) synchronizes the Processors in both modes.
+"""
+
+from .processor import EnigneControlBits, SetupError, Snapshot
+from .memory import SharedRAM
+from . import parts
+import multiprocessing
+
+
+class System(object):
+	"""
+	.. _System:
+
+	Runs the ``processors`` round robin: every Processor that is not halted
+	executes up to ``quantum`` cycles per round (using ``Processor.run``, so
+	the ``profiler``, ``stats``, ``tracer`` and ``clock`` of the Processors are used).
+	Between two rounds the cycles of two Processors differ by at most ``quantum``.
+
+	A Processor is halted if the stop bit of its ECR_ is set (see EnigneControlBits_).
+	"""
+	def __init__(self, processors = None, quantum = 1000):
+		if(quantum < 1):
+			raise ValueError("quantum must be at least 1, not {}".format(quantum))
+		self.processors = []
+		self.quantum = quantum
+		self.rounds = 0
+		for processor in processors or []:
+			self.add_processor(processor)
+
+	def add_processor(self, processor):
+		"""
+		Add the Processor ``processor``, returns its index.
+		"""
+		if(processor.clock_barrier != None):
+			raise SetupError("the Processors of a System must not use a clock_barrier")
+		self.processors.append(processor)
+		return len(self.processors) - 1
+
+	def halted(self):
+		"""
+		Returns a list of ``bool`` s: ``True`` if the Processor is halted.
+		"""
+		stop_bit = EnigneControlBits.engine_stop_bit
+		return [bool(processor.ecr & stop_bit) for processor in self.processors]
+
+	def reset(self):
+		"""
+		Reset all Processors (see ``Processor.reset``).
+		"""
+		for processor in self.processors:
+			processor.reset()
+		self.rounds = 0
+
+	def run(self, max_cycles = None):
+		"""
+		.. _System.run:
+
+		Runs the Processors until all of them are halted or executed ``max_cycles`` cycles
+		(if ``max_cycles`` is not ``None``). Processors that are halted already are not run.
+		An Exception of a Processor stops the System, the other Processors keep their state.
+
+		Returns a list of ``(cycles, halted)`` (see ``Processor.run``), one tuple per Processor.
+		"""
+		results = [[0, halted] for halted in self.halted()]
+		running = [index for index, (cycles, halted) in enumerate(results) if(not halted)]
+		while(running):
+			still_running = []
+			for index in running:
+				quantum = self.quantum
+				if(max_cycles != None):
+					quantum = min(quantum, max_cycles - results[index][0])
+				cycles, halted = self.processors[index].run(quantum)
+				results[index][0] += cycles
+				results[index][1] = halted
+				if(not halted and (max_cycles == None or results[index][0] < max_cycles)):
+					still_running.append(index)
+			running = still_running
+			self.rounds += 1
+		return [tuple(result) for result in results]
+
+	def run_processes(self, max_cycles = None):
+		"""
+		.. _run_processes:
+
+		Runs every Processor that is not halted in its own process (using the ``fork``
+		start method of ``multiprocessing``) until it is halted or executed ``max_cycles`` cycles.
+		The processes are not synchronized, except by the shared devices, which must be SharedRAM_ s.
+
+		Afterwards the state of the Processors is restored from the processes
+		(see ``Processor.snapshot``, the SharedRAMs are not changed).
+		The ``profiler``, ``stats`` and ``tracer`` of the Processors are not updated.
+		If a Processor raised an Exception, the first one is raised once all processes finished.
+
+		Returns a list of ``(cycles, halted)``, like run_.
+		"""
+		try:
+			context = multiprocessing.get_context("fork")
+		except ValueError:
+			raise SetupError("run_processes needs the fork start method")
+		owners = {}
+		for index, processor in enumerate(self.processors):
+			for device in processor.memory_bus.devices + processor.device_bus.devices:
+				if(owners.setdefault(id(device), index) != index and not isinstance(device, SharedRAM)):
+					raise SetupError("Device {} is shared by several Processors but not a SharedRAM".format(device))
+
+		results = [(0, halted) for halted in self.halted()]
+		running = []
+		for index, processor in enumerate(self.processors):
+			if(results[index][1]):
+				continue
+			receiver, sender = context.Pipe(duplex = False)
+			process = context.Process(target = _run_process, args = (processor, max_cycles, sender), daemon = True)
+			process.start()
+			sender.close()
+			running.append((index, process, receiver))
+
+		error = None
+		for index, process, receiver in running:
+			try:
+				cycles, halted, snapshot, exception = receiver.recv()
+			except EOFError:
+				process.join()
+				error = error or RuntimeError("The process of Processor {} exited with {}".format(index, process.exitcode))
+				continue
+			finally:
+				receiver.close()
+			process.join()
+
+			processor = self.processors[index]
+			snapshot = Snapshot.from_bytes(snapshot)
+			# keep the current words of the shared devices
+			for position, device in enumerate(processor.memory_bus.devices + processor.device_bus.devices):
+				if(isinstance(device, SharedRAM)):
+					snapshot.devices[position] = parts.copy_words(device.repr_)
+			processor.restore(snapshot)
+			results[index] = (cycles, halted)
+			error = error or exception
+		if(error != None):
+			raise error
+		return results
+
+
+def _run_process(processor, max_cycles, connection):
+	start = processor.cycles
+	halted = False
+	exception = None
+	try:
+		halted = processor.run(max_cycles)[1]
+	except Exception as e:
+		exception = e
+	connection.send((processor.cycles - start, halted, processor.snapshot().to_bytes(), exception))
+	connection.close()
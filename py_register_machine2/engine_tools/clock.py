@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.engine_tools.clock**: A batched software clock
+
+The SoftwareClock_ paces ``Processor.run`` to a frequency like ``f_cpu``, but
+it does not wait after every cycle: the cycles are executed in quanta
+by the fast run loops and the clock waits after every quantum until the
+deadline of the executed cycles. The deadlines are relative to the start of
+the run (using ``time.perf_counter_ns``), so the errors of the waits
+do not accumulate. Short waits spin instead of sleeping, because the
+granularity of ``time.sleep`` is too coarse for them.
+
+It is enabled by setting the ``clock`` of the Processor_ (``f_cpu`` must not be set).
+
+*Example*::
+
+	from py_register_machine2.engine_tools.clock import SoftwareClock
+
+	processor.clock = SoftwareClock(100000)
+	processor.run()
+	print(processor.clock.to_dict())
+"""
+
+import time
+
+
+class SoftwareClock(object):
+	"""
+	.. _SoftwareClock:
+
+	Paces the execution to ``f_cpu`` cycles per second in quanta of ``quantum``
+	cycles (by default the cycles of one millisecond). Waits that are shorter
+	than ``spin_ns`` nanoseconds spin, longer waits sleep until ``spin_ns``
+	before the deadline and spin then.
+
+	``cycles`` and ``elapsed_ns`` are the executed cycles and the wall time of all runs,
+	``late`` counts the quanta that ended after their deadline (the following
+	quanta are executed without waiting until the clock caught up).
+	"""
+	def __init__(self, f_cpu, quantum = None, spin_ns = 200000):
+		if(f_cpu <= 0):
+			raise ValueError("f_cpu must be positive, not {}".format(f_cpu))
+		self.f_cpu = f_cpu
+		if(quantum == None):
+			quantum = max(1, int(f_cpu // 1000))
+		self.quantum = quantum
+		self.spin_ns = spin_ns
+		self.reset()
+
+	def reset(self):
+		"""
+		Set the statistics to ``0``.
+		"""
+		self.cycles = 0
+		self.elapsed_ns = 0
+		self.quanta = 0
+		self.late = 0
+
+	def run(self, loop, max_cycles = None):
+		"""
+		Runs ``loop`` (a run loop of the Processor_) in quanta until it is halted or
+		``max_cycles`` cycles have been executed. Returns ``(cycles, halted)`` like ``Processor.run``.
+		"""
+		now = time.perf_counter_ns
+		period = 1e9 / self.f_cpu
+		quantum = self.quantum
+		cycles = 0
+		halted = False
+		start = now()
+		try:
+			while(max_cycles == None or cycles < max_cycles):
+				if(max_cycles != None and max_cycles - cycles < quantum):
+					quantum = max_cycles - cycles
+				executed, halted = loop(quantum)
+				cycles += executed
+				self.quanta += 1
+				self.wait(start + int(cycles * period))
+				if(halted):
+					break
+		finally:
+			self.cycles += cycles
+			self.elapsed_ns += now() - start
+		return cycles, halted
+
+	def wait(self, deadline):
+		"""
+		Wait until ``time.perf_counter_ns()`` reaches ``deadline``.
+		"""
+		now = time.perf_counter_ns
+		remaining = deadline - now()
+		if(remaining <= 0):
+			self.late += 1
+			return
+		if(remaining > self.spin_ns):
+			time.sleep((remaining - self.spin_ns) / 1e9)
+		while(now() < deadline):
+			pass
+
+	def achieved_frequency(self):
+		"""
+		Returns the executed cycles per second of all runs.
+		"""
+		if(not self.elapsed_ns):
+			return 0.0
+		return self.cycles * 1e9 / self.elapsed_ns
+
+	def to_dict(self):
+		"""
+		Returns the target and the achieved frequency::
+
+			{"f_cpu": 100000, "achieved": 99998.7, "ratio": 0.99999,
+			"cycles": 100000, "elapsed_ns": 1000013000, "quanta": 1000, "late": 0}
+		"""
+		achieved = self.achieved_frequency()
+		return {"f_cpu": self.f_cpu, "achieved": achieved, "ratio": achieved / self.f_cpu,
+				"cycles": self.cycles, "elapsed_ns": self.elapsed_ns,
+				"quanta": self.quanta, "late": self.late}
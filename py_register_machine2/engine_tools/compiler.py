@@ -0,0 +1,490 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.engine_tools.compiler**: A basic block compiler
+
+The BlockCompiler_ is an optional execution engine for a Processor_.
+It splits the code in the ROM/RAM into basic blocks and translates every
+block into a generated python function. Register indices and the addresses
+of the instructions are constants in the generated code, the
+Stack Pointer is kept in a local variable.
+
+Translations are available for all ``ArithmeticCommand`` s and the commands
+from ``py_register_machine2.commands.basic_commands`` and
+``py_register_machine2.commands.stack_based``, all other commands are
+executed by invoking their ``exec`` method.
+
+*Example*::
+
+	from py_register_machine2.engine_tools.compiler import BlockCompiler
+
+	processor, rom, ram, flash = small.get_machine()
+	rom.program(program)
+	BlockCompiler(processor).run()
+"""
+
+from ..core.commands import ArithmeticCommand, FunctionCommand
+from ..core.processor import EnigneControlBits
+from ..core import memory
+from ..commands import basic_commands, stack_based
+
+
+class _Untranslatable(Exception):
+	pass
+
+
+class _Instruction(object):
+	"""
+	Collects the generated source of one instruction.
+	"""
+	def __init__(self, compiler, index, next_pc):
+		self.compiler = compiler
+		self.index = index
+		self.next_pc = next_pc
+		self.lines = []
+		self.temporaries = 0
+		self.uses_pc = False
+		self.writes_pc = False
+		self.writes_ecr = False
+		self.writes_memory = False
+
+	def temporary(self, expression):
+		name = "t{}".format(self.temporaries)
+		self.temporaries += 1
+		self.lines.append("{} = {}".format(name, expression))
+		return name
+
+	def read(self, index):
+		self.compiler.check_register(index)
+		if(index == 0):
+			self.uses_pc = True
+			return "pc"
+		if(index == 2):
+			return "sp"
+		if(self.compiler.isplain(index)):
+			return "V[{}]".format(index)
+		return "R{}()".format(index)
+
+	def write(self, index, expression):
+		self.compiler.check_register(index)
+		if(index == 0):
+			self.uses_pc = True
+			self.writes_pc = True
+			self.lines.append("pc = T0({})".format(expression))
+		elif(index == 2):
+			self.lines.append("sp = T2({})".format(expression))
+		else:
+			if(index == 1):
+				self.writes_ecr = True
+			if(self.compiler.isplain(index)):
+				self.lines.append("V[{0}] = T{0}({1})".format(index, expression))
+			else:
+				self.lines.append("W{}({})".format(index, expression))
+
+	def read_word(self, address):
+		return "MR({})".format(address)
+	def write_word(self, address, word):
+		self.writes_memory = True
+		self.lines.append("MW({}, {})".format(address, word))
+
+
+def _translate_arithmetic(instruction, command, op1, op2):
+	in1 = instruction.temporary(instruction.read(op1))
+	in2 = instruction.temporary(instruction.read(op2))
+	function = command.function
+	if(function is basic_commands.mov_function):
+		instruction.write(op2, in1)
+	elif(function is basic_commands.add_function):
+		instruction.write(op2, "{} + {}".format(in1, in2))
+	elif(function is basic_commands.sub_function):
+		instruction.write(op2, "{} - {}".format(in1, in2))
+	elif(function is basic_commands.mul_function):
+		instruction.write(op2, "{} * {}".format(in1, in2))
+	elif(function is basic_commands.div_function):
+		instruction.write(op2, "{} // {}".format(in1, in2))
+	else:
+		instruction.write(op2, "{}({}, {})".format(instruction.compiler.constant(function), in1, in2))
+
+def _translate_pld(instruction, addr_from, to):
+	from_ = instruction.temporary(instruction.read(addr_from))
+	instruction.write(to, instruction.read_word(from_))
+def _translate_pst(instruction, from_, addr_to):
+	to = instruction.temporary(instruction.read(addr_to))
+	word = instruction.temporary(instruction.read(from_))
+	instruction.write_word(to, word)
+def _translate_ld(instruction, from_, to):
+	instruction.write(to, instruction.read_word(repr(from_)))
+def _translate_st(instruction, from_, to):
+	word = instruction.temporary(instruction.read(from_))
+	instruction.write_word(repr(to), word)
+def _translate_jmp(instruction, to):
+	instruction.write(0, "{} - 2 + {}".format(instruction.read(0), to))
+def _translate_sjmp(instruction, to):
+	instruction.write(0, repr(to))
+def _translate_inc(instruction, register):
+	instruction.write(register, "{} + 1".format(instruction.temporary(instruction.read(register))))
+def _translate_dec(instruction, register):
+	instruction.write(register, "{} - 1".format(instruction.temporary(instruction.read(register))))
+def _translate_in(instruction, addr_from, to):
+	from_ = instruction.temporary(instruction.read(addr_from))
+	instruction.write(to, "DR({})".format(from_))
+def _translate_out(instruction, from_, addr_to):
+	to = instruction.temporary(instruction.read(addr_to))
+	word = instruction.temporary(instruction.read_word(repr(from_)))
+	instruction.lines.append("DW({}, {})".format(to, word))
+def _translate_ldi(instruction, const, to):
+	instruction.write(to, repr(const))
+
+def _branch_translation(condition):
+	def translate(instruction, op1, op2):
+		word = instruction.temporary(instruction.read(op1))
+		instruction.lines.append("if({}):".format(condition.format(word)))
+		body = _Instruction(instruction.compiler, instruction.index, instruction.next_pc)
+		body.write(0, "{} + {}".format(body.read(0), op2 - 3))
+		instruction.lines.extend("\t" + line for line in body.lines)
+		instruction.uses_pc = instruction.writes_pc = True
+	return translate
+
+def _translate_resw(instruction, words):
+	instruction.write(2, "{} - {}".format(instruction.read(2), abs(words)))
+def _translate_frew(instruction, words):
+	instruction.write(2, "{} + {}".format(instruction.read(2), abs(words)))
+def _translate_push(instruction, register):
+	instruction.write_word("sp", instruction.temporary(instruction.read(register)))
+	instruction.write(2, "sp - 1")
+def _translate_pop(instruction, register):
+	sp = instruction.temporary("sp + 1")
+	instruction.write(register, instruction.read_word(sp))
+	instruction.write(2, sp)
+def _translate_call(instruction, addr):
+	pc = instruction.read(0)
+	instruction.write_word("sp", pc)
+	instruction.write(2, "sp - 1")
+	instruction.write(0, "{} + {}".format(pc, addr - 2))
+def _translate_ret(instruction):
+	sp = instruction.temporary("sp + 1")
+	instruction.write(0, instruction.read_word(sp))
+	instruction.write(2, sp)
+def _translate_scall(instruction, addr):
+	instruction.write_word("sp", instruction.read(0))
+	instruction.write(2, "sp - 1")
+	instruction.write(0, repr(addr - 2))
+
+translations = {
+	basic_commands.pld_function: _translate_pld,
+	basic_commands.pst_function: _translate_pst,
+	basic_commands.ld_function: _translate_ld,
+	basic_commands.st_function: _translate_st,
+	basic_commands.jmp_function: _translate_jmp,
+	basic_commands.sjmp_function: _translate_sjmp,
+	basic_commands.inc_function: _translate_inc,
+	basic_commands.dec_function: _translate_dec,
+	basic_commands.jne_function: _branch_translation("{} != 0"),
+	basic_commands.jeq_function: _branch_translation("{} == 0"),
+	basic_commands.jle_function: _branch_translation("{} <= 0"),
+	basic_commands.jlt_function: _branch_translation("{} < 0"),
+	basic_commands.jge_function: _branch_translation("{} >= 0"),
+	basic_commands.jgt_function: _branch_translation("{} > 0"),
+	basic_commands.in_function: _translate_in,
+	basic_commands.out_function: _translate_out,
+	basic_commands.ldi_function: _translate_ldi,
+	stack_based.resw_function: _translate_resw,
+	stack_based.frew_function: _translate_frew,
+	stack_based.push_function: _translate_push,
+	stack_based.pop_function: _translate_pop,
+	stack_based.call_function: _translate_call,
+	stack_based.ret_function: _translate_ret,
+	stack_based.scall_function: _translate_scall,
+}
+"""
+The translations of the ``FunctionCommand`` s by their ``function``.
+"""
+
+
+class _Block(object):
+	def __init__(self, start, end, length, function, next_pcs, fallbacks, alive):
+		self.start = start
+		self.end = end
+		self.length = length
+		self.function = function
+		self.next_pcs = next_pcs
+		self.fallbacks = fallbacks
+		self.alive = alive
+
+
+class BlockCompiler(object):
+	"""
+	.. _BlockCompiler:
+
+	Runs the code of the Processor_ ``processor`` using generated python functions,
+	one function per basic block.
+
+	A basic block ends after an instruction that writes the PC_ or after
+	``max_block_length`` instructions. The blocks are compiled lazily, if the
+	code of a block is changed (see ``WordDevice.add_write_hook``) the
+	block is dropped and the running block is left after the write.
+	Code in devices without ``add_write_hook`` and in a ``memory.SharedRAM``
+	(other processes write to it without notifying the hooks) is not compiled.
+
+	The final state, the ``cycles`` and the interrupt behaviour are the same
+	as with ``Processor.run``. If the Processor uses ``f_cpu``, a ``clock_barrier``,
+	``on_cycle_callbacks``, a ``debug`` level above ``2`` or subclassed Registers
+	for PC_, ECR_ or SP_, run_ falls back to do_cycle_. Blocks that would reach
+	a scheduled event (see ``Processor.schedule``, used by the ``Counter``) are
+	executed using do_cycle_, too.
+	"""
+	def __init__(self, processor, max_block_length = 64):
+		self.processor = processor
+		self.max_block_length = max_block_length
+		self._blocks = {}
+		self._owners = {}
+		self._fault = [0, 0]
+		self._hooked_words = None
+		self._namespace = None
+		self._constants = {}
+
+	def constant(self, value):
+		"""
+		Makes ``value`` available to the generated code and returns its name.
+		"""
+		name = "K{}".format(len(self._constants))
+		self._constants[name] = value
+		return name
+
+	def isplain(self, index):
+		return self.processor.register_interface.hooks[index] == None
+
+	def check_register(self, index):
+		if(not isinstance(index, int) or index < 0
+				or index >= len(self.processor.register_interface.registers_by_index)):
+			raise _Untranslatable()
+
+	def _build_namespace(self):
+		processor = self.processor
+		register_interface = processor.register_interface
+		namespace = {
+			"MR": processor.memory_bus.read_word,
+			"MW": processor.memory_bus.write_word,
+			"DR": processor.device_bus.read_word,
+			"DW": processor.device_bus.write_word,
+			"V": register_interface.values,
+			"fault": self._fault,
+		}
+		for index, register in enumerate(register_interface.registers_by_index):
+			namespace["T{}".format(index)] = register_interface.truncators[index]
+			namespace["R{}".format(index)] = register.read
+			namespace["W{}".format(index)] = register.write
+		self._namespace = namespace
+
+	def _hook_memory_devices(self):
+		bus = self.processor.memory_bus
+		self._hooked_words = bytearray(bus.current_max_offset)
+		for device in bus.devices:
+			if(hasattr(device, "add_write_hook") and not isinstance(device, memory.SharedRAM)):
+				start = bus.start_addresses[device]
+				self._hooked_words[start:start + device.size] = b"\x01" * device.size
+				device.add_write_hook(lambda offset, count, start = start: self._invalidate(start + offset, count))
+
+	def _invalidate(self, address, count):
+		owners = self._owners
+		for word in range(address, address + count):
+			if(word in owners):
+				for start in list(owners[word]):
+					self._drop_block(start)
+
+	def _drop_block(self, start):
+		block = self._blocks.pop(start, None)
+		if(block == None):
+			return
+		block.alive[0] = False
+		for word in range(block.start, block.end):
+			starts = self._owners.get(word)
+			if(starts != None):
+				starts.discard(start)
+				if(not starts):
+					del(self._owners[word])
+
+	def _decode_block(self, pc):
+		processor = self.processor
+		instructions = []
+		while(len(instructions) < self.max_block_length):
+			try:
+				opcode = processor.memory_bus.read_word(pc)
+				if(not opcode in processor.commands_by_opcode):
+					break
+				command = processor.commands_by_opcode[opcode]
+				args = [processor.memory_bus.read_word(pc + 1 + i) for i in range(command.numargs())]
+			except Exception:
+				break
+			next_pc = pc + 1 + len(args)
+			if(0 in self._hooked_words[pc:next_pc]):
+				break
+			instructions.append((pc, command, args, next_pc))
+			pc = next_pc
+			if(self._writes_pc(command, args)):
+				break
+		return instructions
+
+	def _writes_pc(self, command, args):
+		try:
+			instruction = self._translate(0, command, args, 0)
+		except _Untranslatable:
+			return False
+		return instruction.writes_pc
+
+	def _translate(self, index, command, args, next_pc):
+		instruction = _Instruction(self, index, next_pc)
+		if(isinstance(command, ArithmeticCommand)):
+			_translate_arithmetic(instruction, command, *args)
+		elif(isinstance(command, FunctionCommand) and command.function in translations):
+			translations[command.function](instruction, *args)
+		else:
+			raise _Untranslatable()
+		return instruction
+
+	def _compile(self, pc):
+		if(self._namespace == None):
+			self._build_namespace()
+		if(self._hooked_words == None):
+			self._hook_memory_devices()
+		self._constants = {}
+		instructions = self._decode_block(pc)
+		if(not instructions):
+			return None
+		T0 = self._namespace["T0"]
+		alive = [True]
+		lines = ["def block(sp):", "\tj = 0", "\ttry:"]
+		fallbacks = set()
+		for index, (address, command, args, next_pc) in enumerate(instructions):
+			count = index + 1
+			lines.append("\t\t# {}: {} {}".format(address, command.mnemonic(), " ".join(str(a) for a in args)))
+			lines.append("\t\tj = {}".format(index))
+			try:
+				instruction = self._translate(index, command, args, next_pc)
+			except _Untranslatable:
+				fallbacks.add(index)
+				exec_ = self.constant(command.exec)
+				lines.extend(["\t\tV[0] = {}".format(T0(next_pc)),
+					"\t\tV[2] = sp",
+					"\t\t{}({})".format(exec_, ", ".join(repr(a) for a in args)),
+					"\t\tsp = V[2]",
+					"\t\tpc = V[0]",
+					"\t\tif(pc != {} or V[1] & {} or not alive[0]):".format(T0(next_pc), EnigneControlBits.engine_stop_bit),
+					"\t\t\treturn pc, sp, {}".format(count)])
+				continue
+			if(instruction.uses_pc):
+				lines.append("\t\tpc = {}".format(T0(next_pc)))
+			lines.extend("\t\t" + line for line in instruction.lines)
+			if(instruction.writes_pc):
+				lines.append("\t\treturn pc, sp, {}".format(count))
+				continue
+			if(instruction.writes_ecr):
+				lines.append("\t\tif(V[1] & {}):".format(EnigneControlBits.engine_stop_bit))
+				lines.append("\t\t\treturn {}, sp, {}".format(next_pc, count))
+			if(instruction.writes_memory):
+				lines.append("\t\tif(not alive[0]):")
+				lines.append("\t\t\treturn {}, sp, {}".format(next_pc, count))
+		lines.extend(["\texcept BaseException:",
+			"\t\tfault[0] = j",
+			"\t\tfault[1] = sp",
+			"\t\traise",
+			"\treturn {}, sp, {}".format(instructions[-1][3], len(instructions))])
+
+		namespace = dict(self._namespace)
+		namespace.update(self._constants)
+		namespace["alive"] = alive
+		exec(compile("\n".join(lines), "<block {}>".format(pc), "exec"), namespace)
+
+		end = instructions[-1][3]
+		block = _Block(pc, end, len(instructions), namespace["block"],
+				[i[3] for i in instructions], fallbacks, alive)
+		self._blocks[pc] = block
+		for word in range(pc, end):
+			self._owners.setdefault(word, set()).add(pc)
+		return block
+
+	def can_compile(self):
+		"""
+		Returns ``True`` if run_ is able to use the compiled blocks.
+		"""
+		processor = self.processor
+		hooks = processor.register_interface.hooks
+		return (processor.f_cpu == None and processor.clock_barrier == None
+				and not processor.on_cycle_callbacks
+				and processor.debug <= 2
+				and hooks[0] == None and hooks[1] == None and hooks[2] == None)
+
+	def _sync(self, pc, sp):
+		values = self.processor.register_interface.values
+		values[0] = pc
+		values[2] = sp
+
+	def _step(self, max_cycles):
+		processor = self.processor
+		start = processor.cycles
+		while(max_cycles == None or processor.cycles - start < max_cycles):
+			processor.do_cycle()
+			if(processor.ecr & EnigneControlBits.engine_stop_bit):
+				return processor.cycles - start, True
+		return processor.cycles - start, False
+
+	def run(self, max_cycles = None):
+		"""
+		.. _run:
+
+		Run the code until the engine stop bit in the ECR_ is set
+		(like ``Processor.run``) or until ``max_cycles`` cycles
+		have been executed.
+
+		Returns the tuple ``(cycles, halted)``.
+		"""
+		processor = self.processor
+		if(not self.can_compile()):
+			return self._step(max_cycles)
+		if(processor.register_interface.read(1) & EnigneControlBits.engine_stop_bit):
+			return self._step(1)
+
+		values = processor.register_interface.values
+		stop_bit = EnigneControlBits.engine_stop_bit
+		start = processor.cycles
+		pc = values[0]
+		sp = values[2]
+		halted = False
+		try:
+			while(max_cycles == None or processor.cycles - start < max_cycles):
+				block = self._blocks.get(pc)
+				if(block == None):
+					block = self._compile(pc)
+				# single step the blocks that would reach max_cycles or a
+				# scheduled event, do_cycle dispatches the events
+				if(block == None or (max_cycles != None
+						and block.length > max_cycles - (processor.cycles - start))
+						or processor.cycles + block.length >= processor._next_event):
+					self._sync(pc, sp)
+					try:
+						processor.do_cycle()
+					finally:
+						pc = values[0]
+						sp = values[2]
+					if(values[1] & stop_bit):
+						halted = True
+						break
+					continue
+				try:
+					pc, sp, executed = block.function(sp)
+				except BaseException:
+					index, sp = self._fault
+					processor.cycles += index
+					if(index in block.fallbacks):
+						pc = values[0]
+						sp = values[2]
+					else:
+						pc = block.next_pcs[index]
+					raise
+				processor.cycles += executed
+				if(values[1] & stop_bit):
+					halted = True
+					break
+		finally:
+			self._sync(pc, sp)
+		return processor.cycles - start, halted
@@ -0,0 +1,606 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.engine_tools.lockstep**: Run many instances of one machine at once
+
+The LockstepEngine_ holds the state of ``lanes`` instances of a configured
+Processor_ in NumPy arrays and executes the program on all instances at once,
+using vectorized arithmetic. Every lane has its own PC_, so branches are
+masked: in every step the lanes are grouped by their PC_ and every group executes
+one instruction. Lanes that halt (or fail) drop out.
+
+The results are the same as running ``Processor.run`` once per lane.
+
+*Example*::
+
+	from py_register_machine2.machines import gym_bav_16
+	from py_register_machine2.engine_tools.lockstep import LockstepEngine
+
+	processor, rom, ram, flash = gym_bav_16.machine()
+	rom.program(program)
+
+	engine = LockstepEngine(processor, 1000)
+	engine.set_register("r1", numpy.arange(1000))
+	cycles, halted = engine.run()
+	print(engine.get_register("A"))
+
+*Note*: This module requires NumPy.
+"""
+
+import numpy
+
+from ..core import parts, register
+from ..core.processor import SetupError, SIGILL, EnigneControlBits
+from ..core.commands import ArithmeticCommand, FunctionCommand
+from ..commands import basic_commands, stack_based, gym_bav_16
+
+
+_MAX_ADD = 2 ** 62 - 1
+_MAX_INT64 = 2 ** 63 - 1
+
+
+def truncate_array(values, width):
+	"""
+	.. _truncate_array:
+
+	Truncates the ``int64`` array ``values`` to the width ``width``,
+	like ``parts.truncator``. All values must be in ``-(2 ** 63 - 1) ... 2 ** 63 - 1``.
+	"""
+	mask, sign_bit, low_mask = parts.integer_constants(width)
+	if(width >= 64):
+		return values
+	word = numpy.abs(values) & mask
+	return numpy.where(word & sign_bit, (word & low_mask) - low_mask,
+			numpy.where(values < 0, -word, word))
+
+def _exact(function, a, b, width, fast):
+	"""
+	Computes ``function(a, b)`` truncated to ``width``. If ``fast`` is false
+	the result might not fit into ``int64`` and python integers are used.
+	"""
+	if(fast):
+		return truncate_array(function(a, b), width)
+	truncate = parts.truncator(width)
+	return numpy.array([truncate(function(int(x), int(y))) for x, y in zip(a, b)], dtype = numpy.int64)
+
+def _bound(values):
+	if(len(values) == 0):
+		return 0
+	return int(numpy.abs(values).max())
+
+
+class LockstepEngine(object):
+	"""
+	.. _LockstepEngine:
+
+	Copies the state of the Processor_ ``processor`` (Registers, ROM, RAM and the
+	devices on the device BUS) into ``lanes`` instances.
+
+	``registers``
+		``(lanes, number of registers)`` array
+	``memory``
+		one array per device of the memory BUS. Read-only devices (like the ROM) are
+		shared by all lanes and have the shape ``(size,)``, all others ``(lanes, size)``.
+	``devices``
+		one ``(lanes, size)`` array per device of the device BUS
+	``cycles``
+		the executed cycles per lane
+	``halted``
+		``True`` for every lane that has set the engine stop bit
+	``errors``
+		``None`` or the Exception that stopped the lane (like ``SIGILL`` or ``ZeroDivisionError``)
+	``outputs``
+		the text written to ``OutputRegister`` s per lane
+
+	All Registers must be plain Registers or ``OutputRegister`` s, all devices must be
+	``WordDevice`` s that do not override ``read`` or ``write`` and all widths must not exceed ``64`` bits.
+	The supported Commands are all ``ArithmeticCommand`` s and the commands from
+	``basic_commands``, ``stack_based`` and ``gym_bav_16``. Otherwise a SetupError_ is raised.
+	"""
+	def __init__(self, processor, lanes):
+		self.processor = processor
+		self.lanes = lanes
+		self._check(processor)
+
+		register_interface = processor.register_interface
+		self.register_widths = [r.width for r in register_interface.registers_by_index]
+		self.output_registers = {index for index, r in enumerate(register_interface.registers_by_index)
+				if(isinstance(r, register.OutputRegister))}
+		self.registers = numpy.array([[r.read() for r in register_interface.registers_by_index]] * lanes,
+				dtype = numpy.int64)
+
+		self.memory = []
+		self._memory_layout = self._layout(processor.memory_bus, self.memory, share = True)
+		self.devices = []
+		self._device_layout = self._layout(processor.device_bus, self.devices, share = False)
+
+		self.cycles = numpy.zeros(lanes, dtype = numpy.int64)
+		self.halted = numpy.zeros(lanes, dtype = bool)
+		self.running = numpy.ones(lanes, dtype = bool)
+		self.errors = [None] * lanes
+		self.outputs = [""] * lanes
+		self._decoded = {}
+
+	def _check(self, processor):
+		if(processor.f_cpu != None or processor.clock_barrier != None or processor.on_cycle_callbacks):
+			raise SetupError("f_cpu, clock_barrier and on_cycle_callbacks are not supported")
+		if(processor._timers):
+			raise SetupError("Counters (scheduled events) are not supported")
+		for r in processor.register_interface.registers_by_index:
+			if(r.width > 64):
+				raise SetupError("Register '{}' is wider than 64 bits".format(r.name))
+			if(not parts.isplainregister(r) and type(r) is not register.OutputRegister):
+				raise SetupError("Register '{}' is neither a plain Register nor an OutputRegister".format(r.name))
+		for bus in (processor.memory_bus, processor.device_bus):
+			for device in bus.devices:
+				if(type(device).read is not parts.WordDevice.read
+						or type(device).write is not parts.WordDevice.write
+						or device.width > 64):
+					raise SetupError("Device {} is not supported".format(device))
+		for command in processor.commands_by_opcode.values():
+			if(_executor(command) == None):
+				raise SetupError("Command '{}' is not supported".format(command.mnemonic()))
+
+	def _layout(self, bus, arrays, share):
+		layout = []
+		for device in bus.devices:
+			content = numpy.array(device.repr_[:], dtype = numpy.int64)
+			shared = share and not device.mode & 0b10
+			if(not shared):
+				content = numpy.array([content] * self.lanes, dtype = numpy.int64).reshape(self.lanes, device.size)
+			arrays.append(content)
+			layout.append((bus.start_addresses[device], device.size, content, shared, device))
+		return layout
+
+	def index_of(self, name_or_index):
+		if(isinstance(name_or_index, int)):
+			return name_or_index
+		return self.processor.register_interface.index_of(name_or_index)
+
+	def set_register(self, name_or_index, values):
+		"""
+		Set the Register ``name_or_index`` of all lanes to ``values``
+		(one value per lane or one value for all lanes).
+		"""
+		index = self.index_of(name_or_index)
+		values = numpy.broadcast_to(numpy.asarray(values, dtype = object), (self.lanes,))
+		truncate = parts.truncator(self.register_widths[index])
+		self.registers[:, index] = [truncate(int(v)) for v in values]
+
+	def get_register(self, name_or_index):
+		"""
+		Returns the content of the Register ``name_or_index`` of all lanes.
+		"""
+		return self.registers[:, self.index_of(name_or_index)]
+
+	def fault(self, lanes, exception):
+		"""
+		Stops the lanes ``lanes`` because of ``exception``.
+		"""
+		for lane in lanes:
+			self.errors[lane] = exception
+		self.running[lanes] = False
+
+	def read_register(self, lanes, index):
+		return self.registers[lanes, index]
+
+	def write_register(self, lanes, index, values):
+		"""
+		Writes the already truncated ``int64`` array ``values`` to the Register ``index``.
+		Returns the lanes that did not fail.
+		"""
+		if(index in self.output_registers):
+			ok = numpy.ones(len(lanes), dtype = bool)
+			for i, (lane, value) in enumerate(zip(lanes, values)):
+				try:
+					self.outputs[lane] += chr(int(value))
+				except OverflowError:
+					self.outputs[lane] += "?"
+				except Exception as e:
+					self.errors[lane] = e
+					self.running[lane] = False
+					ok[i] = False
+			self.registers[lanes, index] = values
+			return lanes[ok]
+		self.registers[lanes, index] = values
+		return lanes
+
+	def truncate_register(self, index, values):
+		return truncate_array(values, self.register_widths[index])
+
+	def _access(self, layout, bus, lanes, addresses, words = None):
+		"""
+		Reads (``words is None``) or writes words using the devices in ``layout``.
+		Returns ``(values, ok)``.
+		"""
+		values = numpy.zeros(len(lanes), dtype = numpy.int64)
+		ok = numpy.zeros(len(lanes), dtype = bool)
+		if(words is not None):
+			words = truncate_array(words, bus.width)
+		for start, size, content, shared, device in layout:
+			selected = (addresses >= start) & (addresses < start + size)
+			if(not selected.any()):
+				continue
+			if(words is None and not device.mode & 0b01):
+				self.fault(lanes[selected], parts.WriteOnlyError("Device is Write-Only"))
+				continue
+			if(words is not None and not device.mode & 0b10):
+				self.fault(lanes[selected], parts.ReadOnlyError("Device is Read-Only"))
+				continue
+			offsets = addresses[selected] - start
+			if(words is None):
+				if(shared):
+					values[selected] = content[offsets]
+				else:
+					values[selected] = content[lanes[selected], offsets]
+			else:
+				content[lanes[selected], offsets] = truncate_array(words[selected], device.width)
+			ok |= selected
+		outside = ~ok & ((addresses < 0) | (addresses >= bus.current_max_offset))
+		for lane, address in zip(lanes[outside], addresses[outside]):
+			self.fault([lane], parts.BUSError("Offset({}) exceeds address space of BUS({})".format(address,
+						bus.current_max_offset)))
+		if(words is None):
+			values = truncate_array(values, bus.width)
+		return values, ok
+
+	def read_memory(self, lanes, addresses):
+		return self._access(self._memory_layout, self.processor.memory_bus, lanes, addresses)
+	def write_memory(self, lanes, addresses, words):
+		return self._access(self._memory_layout, self.processor.memory_bus, lanes, addresses, words)[1]
+	def read_device(self, lanes, addresses):
+		return self._access(self._device_layout, self.processor.device_bus, lanes, addresses)
+	def write_device(self, lanes, addresses, words):
+		return self._access(self._device_layout, self.processor.device_bus, lanes, addresses, words)[1]
+
+	def _isshared(self, address, count):
+		for start, size, content, shared, device in self._memory_layout:
+			if(start <= address and address + count <= start + size):
+				return shared
+		return False
+
+	def _decode(self, pc, lanes):
+		"""
+		Decodes the instruction at ``pc`` for the lanes ``lanes``.
+		Yields ``(lanes, command, args, next_pc)``, there might be several
+		instructions, if the code is in the RAM.
+		"""
+		if(pc in self._decoded):
+			command, args, next_pc = self._decoded[pc]
+			yield lanes, command, args, next_pc
+			return
+		commands_by_opcode = self.processor.commands_by_opcode
+		opcodes, ok = self.read_memory(lanes, numpy.full(len(lanes), pc, dtype = numpy.int64))
+		lanes, opcodes = lanes[ok], opcodes[ok]
+		for opcode in numpy.unique(opcodes):
+			group = lanes[opcodes == opcode]
+			opcode = int(opcode)
+			if(not opcode in commands_by_opcode):
+				self.registers[group, 0] = self.truncate_register(0, numpy.full(len(group), pc + 1, dtype = numpy.int64))
+				self.fault(group, SIGILL("Invalid opcode ({}) at {}".format(opcode, pc)))
+				continue
+			command = commands_by_opcode[opcode]
+			words = []
+			for i in range(command.numargs()):
+				word, ok = self.read_memory(group, numpy.full(len(group), pc + 1 + i, dtype = numpy.int64))
+				group = group[ok]
+				words = [w[ok] for w in words] + [word[ok]]
+			next_pc = pc + 1 + command.numargs()
+			if(not len(group)):
+				continue
+			if(words):
+				rows, inverse = numpy.unique(numpy.array(words).T, axis = 0, return_inverse = True)
+				inverse = inverse.reshape(-1)
+			else:
+				rows, inverse = numpy.zeros((1, 0), dtype = numpy.int64), numpy.zeros(len(group), dtype = int)
+			for k, row in enumerate(rows):
+				args = tuple(int(a) for a in row)
+				if(len(rows) == 1 and self._isshared(pc, next_pc - pc)):
+					self._decoded[pc] = (command, args, next_pc)
+				yield group[inverse == k], command, args, next_pc
+
+	def step(self):
+		"""
+		Executes one cycle on all running lanes.
+		Returns ``False`` if no lane is running (all lanes halted or failed), ``True`` else.
+		"""
+		active = numpy.flatnonzero(self.running)
+		if(not len(active)):
+			return False
+		pcs = self.registers[active, 0]
+		if((pcs == pcs[0]).all()):
+			groups = [(int(pcs[0]), active)]
+		else:
+			unique, inverse = numpy.unique(pcs, return_inverse = True)
+			groups = [(int(pc), active[inverse == k]) for k, pc in enumerate(unique)]
+		for pc, lanes in groups:
+			for lanes, command, args, next_pc in self._decode(pc, lanes):
+				self.registers[lanes, 0] = self.truncate_register(0, numpy.full(len(lanes), next_pc, dtype = numpy.int64))
+				done = _executor(command)(self, lanes, *args)
+				self.cycles[done] += 1
+				halted = done[(self.registers[done, 1] & EnigneControlBits.engine_stop_bit) != 0]
+				self.halted[halted] = True
+				self.running[halted] = False
+		return True
+
+	def run(self, max_cycles = None):
+		"""
+		Runs all lanes until they halt or fail or until ``max_cycles`` cycles
+		have been executed.
+
+		Returns the arrays ``(cycles, halted)``, like ``Processor.run``.
+		"""
+		steps = 0
+		while(self.running.any() and (max_cycles == None or steps < max_cycles)):
+			self.step()
+			steps += 1
+		return self.cycles, self.halted
+
+
+def _register(engine, lanes, index):
+	"""
+	Resolves ``index`` (an ``int`` or a name), faults the lanes if there is no such Register.
+	Returns the index or ``None``.
+	"""
+	count = len(engine.register_widths)
+	if(isinstance(index, str)):
+		if(not index in engine.processor.register_interface.indices_by_name):
+			engine.fault(lanes, NameError("No Register with name '{}'".format(index)))
+			return None
+		return engine.processor.register_interface.indices_by_name[index]
+	if(index >= count or index < -count):
+		engine.fault(lanes, NameError("No Register with index '{}'".format(index)))
+		return None
+	return index % count
+
+def _read(engine, lanes, index):
+	return engine.read_register(lanes, index)
+
+def _write(engine, lanes, index, values):
+	return engine.write_register(lanes, index, engine.truncate_register(index, values))
+
+def _constant(lanes, value):
+	return numpy.full(len(lanes), value, dtype = numpy.int64)
+
+_operators = {basic_commands.add_function: (lambda a, b: a + b, False),
+		basic_commands.sub_function: (lambda a, b: a - b, False),
+		basic_commands.mul_function: (lambda a, b: a * b, True)}
+
+def _compute(engine, lanes, index, function, in1, in2):
+	"""
+	Writes ``function(in1, in2)`` to the Register ``index``.
+	"""
+	if(function is basic_commands.mov_function):
+		return _write(engine, lanes, index, in1)
+	if(function is basic_commands.div_function):
+		zero = in2 == 0
+		if(zero.any()):
+			engine.fault(lanes[zero], ZeroDivisionError("integer division or modulo by zero"))
+			lanes, in1, in2 = lanes[~zero], in1[~zero], in2[~zero]
+		return _write(engine, lanes, index, in1 // in2)
+	width = engine.register_widths[index]
+	if(function in _operators):
+		operator, multiplies = _operators[function]
+		if(multiplies):
+			fast = _bound(in1) * _bound(in2) <= _MAX_INT64
+		else:
+			fast = max(_bound(in1), _bound(in2)) <= _MAX_ADD
+		return engine.write_register(lanes, index, _exact(operator, in1, in2, width, fast))
+	return engine.write_register(lanes, index, _exact(function, in1, in2, width, False))
+
+def _arithmetic(function):
+	def execute(engine, lanes, op1, op2):
+		registers = _registers(engine, lanes, op1, op2)
+		if(registers == None):
+			return lanes[:0]
+		op1, op2 = registers
+		in1 = _read(engine, lanes, op1)
+		in2 = _read(engine, lanes, op2)
+		return _compute(engine, lanes, op2, function, in1, in2)
+	return execute
+
+def _add_constant(engine, lanes, index, values, constant):
+	if(max(_bound(values), abs(constant)) <= _MAX_ADD):
+		return _write(engine, lanes, index, values + constant)
+	truncate = parts.truncator(engine.register_widths[index])
+	return engine.write_register(lanes, index,
+			numpy.array([truncate(int(v) + constant) for v in values], dtype = numpy.int64))
+
+def _registers(engine, lanes, *indices):
+	result = []
+	for index in indices:
+		index = _register(engine, lanes, index)
+		if(index == None):
+			return None
+		result.append(index)
+	return result
+
+def _load(engine, lanes, word, ok, to):
+	lanes, word = lanes[ok], word[ok]
+	to = _register(engine, lanes, to)
+	if(to == None):
+		return lanes[:0]
+	return _write(engine, lanes, to, word)
+
+def _pld(engine, lanes, addr_from, to):
+	addr_from = _register(engine, lanes, addr_from)
+	if(addr_from == None):
+		return lanes[:0]
+	word, ok = engine.read_memory(lanes, _read(engine, lanes, addr_from))
+	return _load(engine, lanes, word, ok, to)
+def _pst(engine, lanes, from_, addr_to):
+	registers = _registers(engine, lanes, from_, addr_to)
+	if(registers == None):
+		return lanes[:0]
+	from_, addr_to = registers
+	ok = engine.write_memory(lanes, _read(engine, lanes, addr_to), _read(engine, lanes, from_))
+	return lanes[ok]
+def _ld(engine, lanes, from_, to):
+	word, ok = engine.read_memory(lanes, _constant(lanes, from_))
+	return _load(engine, lanes, word, ok, to)
+def _st(engine, lanes, from_, to):
+	from_ = _register(engine, lanes, from_)
+	if(from_ == None):
+		return lanes[:0]
+	ok = engine.write_memory(lanes, _constant(lanes, to), _read(engine, lanes, from_))
+	return lanes[ok]
+def _jmp(engine, lanes, to):
+	return _add_constant(engine, lanes, 0, _read(engine, lanes, 0), to - 2)
+def _sjmp(engine, lanes, to):
+	return _write(engine, lanes, 0, _constant(lanes, to))
+def _incdec(step):
+	def execute(engine, lanes, index):
+		index = _register(engine, lanes, index)
+		if(index == None):
+			return lanes[:0]
+		return _add_constant(engine, lanes, index, _read(engine, lanes, index), step)
+	return execute
+def _branch(condition):
+	def execute(engine, lanes, op1, op2):
+		op1 = _register(engine, lanes, op1)
+		if(op1 == None):
+			return lanes[:0]
+		taken = condition(_read(engine, lanes, op1))
+		done = _add_constant(engine, lanes[taken], 0, _read(engine, lanes[taken], 0), op2 - 3)
+		return numpy.concatenate((lanes[~taken], done))
+	return execute
+def _in(engine, lanes, addr_from, to):
+	addr_from = _register(engine, lanes, addr_from)
+	if(addr_from == None):
+		return lanes[:0]
+	word, ok = engine.read_device(lanes, _read(engine, lanes, addr_from))
+	return _load(engine, lanes, word, ok, to)
+def _out(engine, lanes, from_, addr_to):
+	addr_to = _register(engine, lanes, addr_to)
+	if(addr_to == None):
+		return lanes[:0]
+	to = _read(engine, lanes, addr_to)
+	word, ok = engine.read_memory(lanes, _constant(lanes, from_))
+	lanes, to, word = lanes[ok], to[ok], word[ok]
+	return lanes[engine.write_device(lanes, to, word)]
+def _ldi(engine, lanes, const, to):
+	to = _register(engine, lanes, to)
+	if(to == None):
+		return lanes[:0]
+	return _write(engine, lanes, to, _constant(lanes, const))
+
+def _resw(engine, lanes, words):
+	return _add_constant(engine, lanes, 2, _read(engine, lanes, 2), -abs(words))
+def _frew(engine, lanes, words):
+	return _add_constant(engine, lanes, 2, _read(engine, lanes, 2), abs(words))
+def _push(engine, lanes, index):
+	index = _register(engine, lanes, index)
+	if(index == None):
+		return lanes[:0]
+	sp = _read(engine, lanes, 2)
+	ok = engine.write_memory(lanes, sp, _read(engine, lanes, index))
+	return _write(engine, lanes[ok], 2, sp[ok] - 1)
+def _pop(engine, lanes, index):
+	sp = _read(engine, lanes, 2) + 1
+	word, ok = engine.read_memory(lanes, sp)
+	done = _load(engine, lanes, word, ok, index)
+	return _write(engine, done, 2, sp[numpy.isin(lanes, done)])
+def _call(engine, lanes, addr):
+	pc = _read(engine, lanes, 0)
+	sp = _read(engine, lanes, 2)
+	ok = engine.write_memory(lanes, sp, pc)
+	lanes, pc, sp = lanes[ok], pc[ok], sp[ok]
+	_write(engine, lanes, 2, sp - 1)
+	return _add_constant(engine, lanes, 0, pc, addr - 2)
+def _ret(engine, lanes):
+	sp = _read(engine, lanes, 2) + 1
+	word, ok = engine.read_memory(lanes, sp)
+	lanes, sp = lanes[ok], sp[ok]
+	_write(engine, lanes, 0, word[ok])
+	return _write(engine, lanes, 2, sp)
+def _scall(engine, lanes, addr):
+	pc = _read(engine, lanes, 0)
+	sp = _read(engine, lanes, 2)
+	ok = engine.write_memory(lanes, sp, pc)
+	lanes, sp = lanes[ok], sp[ok]
+	_write(engine, lanes, 2, sp - 1)
+	return _write(engine, lanes, 0, _constant(lanes, addr - 2))
+
+def _gym_dload(engine, lanes, c):
+	return _ldi(engine, lanes, c, "A")
+_mov = _arithmetic(basic_commands.mov_function)
+
+def _gym_load(engine, lanes, r):
+	return _mov(engine, lanes, r, "A")
+def _gym_store(engine, lanes, r):
+	return _mov(engine, lanes, "A", r)
+def _gym_arithmetic(function):
+	def execute(engine, lanes, r):
+		registers = _registers(engine, lanes, "A", r)
+		if(registers == None):
+			return lanes[:0]
+		a, r = registers
+		in1 = _read(engine, lanes, a)
+		in2 = _read(engine, lanes, r)
+		return _compute(engine, lanes, a, function, in1, in2)
+	return execute
+def _gym_jump(engine, lanes, c):
+	return _write(engine, lanes, _register(engine, lanes, "PC"), _constant(lanes, c * 2))
+def _gym_halt(engine, lanes):
+	return _write(engine, lanes, _register(engine, lanes, "ECR"), _constant(lanes, 1))
+def _gym_branch(condition):
+	def execute(engine, lanes, c):
+		a = _register(engine, lanes, "A")
+		if(a == None):
+			return lanes[:0]
+		taken = condition(_read(engine, lanes, a))
+		done = _write(engine, lanes[taken], _register(engine, lanes, "PC"), _constant(lanes[taken], c * 2))
+		return numpy.concatenate((lanes[~taken], done))
+	return execute
+
+executors = {
+	basic_commands.pld_function: _pld,
+	basic_commands.pst_function: _pst,
+	basic_commands.ld_function: _ld,
+	basic_commands.st_function: _st,
+	basic_commands.jmp_function: _jmp,
+	basic_commands.sjmp_function: _sjmp,
+	basic_commands.inc_function: _incdec(1),
+	basic_commands.dec_function: _incdec(-1),
+	basic_commands.jne_function: _branch(lambda x: x != 0),
+	basic_commands.jeq_function: _branch(lambda x: x == 0),
+	basic_commands.jle_function: _branch(lambda x: x <= 0),
+	basic_commands.jlt_function: _branch(lambda x: x < 0),
+	basic_commands.jge_function: _branch(lambda x: x >= 0),
+	basic_commands.jgt_function: _branch(lambda x: x > 0),
+	basic_commands.in_function: _in,
+	basic_commands.out_function: _out,
+	basic_commands.ldi_function: _ldi,
+	stack_based.resw_function: _resw,
+	stack_based.frew_function: _frew,
+	stack_based.push_function: _push,
+	stack_based.pop_function: _pop,
+	stack_based.call_function: _call,
+	stack_based.ret_function: _ret,
+	stack_based.scall_function: _scall,
+	gym_bav_16.dload_function: _gym_dload,
+	gym_bav_16.load_function: _gym_load,
+	gym_bav_16.store_function: _gym_store,
+	gym_bav_16.add_function: _gym_arithmetic(basic_commands.add_function),
+	gym_bav_16.sub_function: _gym_arithmetic(basic_commands.sub_function),
+	gym_bav_16.mult_function: _gym_arithmetic(basic_commands.mul_function),
+	gym_bav_16.div_function: _gym_arithmetic(basic_commands.div_function),
+	gym_bav_16.jump_function: _gym_jump,
+	gym_bav_16.halt_function: _gym_halt,
+	gym_bav_16.JNE.function: _gym_branch(lambda x: x != 0),
+	gym_bav_16.JEQ.function: _gym_branch(lambda x: x == 0),
+	gym_bav_16.JLT.function: _gym_branch(lambda x: x < 0),
+	gym_bav_16.JLE.function: _gym_branch(lambda x: x <= 0),
+	gym_bav_16.JGT.function: _gym_branch(lambda x: x > 0),
+	gym_bav_16.JGE.function: _gym_branch(lambda x: x >= 0),
+}
+"""
+The vectorized implementations of the ``FunctionCommand`` s by their ``function``.
+"""
+
+def _executor(command):
+	if(isinstance(command, ArithmeticCommand)):
+		return _arithmetic(command.function)
+	if(isinstance(command, FunctionCommand)):
+		return executors.get(command.function)
+	return None
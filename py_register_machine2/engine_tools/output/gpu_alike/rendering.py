@@ -8,12 +8,14 @@ class RenderDevice(parts.WordDevice):
 		self.renderer = renderer
 	def write(self, offset, value):
 		if(offset >= self.size):
-			raise AddressError("Offset({}) not in address space({})".format(offset, self.size))
-		self.repr_[offset].setvalue(value)
+			raise parts.AddressError("Offset({}) not in address space({})".format(offset, self.size))
+		self.repr_[offset] = self.truncate(value)
+		if(self.write_hooks):
+			self._written(offset, 1)
 		if(offset == 9):
 			self.renderer.interrupt()
 	def clear_IR(self):
-		self.repr_[9].setvalue(0)
+		self.repr_[9] = 0
 
 
 class Renderer(object):
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.engine_tools.profiler**: Profile the execution of a program
+
+The Profiler_ counts the executions of every instruction (by its address)
+and the host wall time spent executing it. It is enabled by setting the
+``profiler`` of the Processor_, ``Processor.run`` uses a profiling run loop then
+(the other run loops are not changed).
+
+*Example*::
+
+	from py_register_machine2.engine_tools.profiler import Profiler
+
+	asm = Assembler(processor, open("prog.asm"))
+	rom.program(asm.assemble())
+
+	processor.profiler = Profiler(processor, asm.source_map)
+	processor.run()
+	print(processor.profiler.report())
+"""
+
+from ..core.parts import BUSError
+
+
+class Profiler(object):
+	"""
+	.. _Profiler:
+
+	Holds the execution counts and the wall time (in nanoseconds) of every address
+	of the memory BUS of ``processor``: ``counts[pc]`` and ``times[pc]``.
+	The Processor_ must be set up, because the lists have the size of the memory BUS.
+
+	``source_map`` (a ``tools.sourcemap.SourceMap``) is used to map the addresses to the lines
+	of the assembly code.
+	"""
+	def __init__(self, processor, source_map = None):
+		self.processor = processor
+		self.source_map = source_map
+		self.counts = [0] * processor.memory_bus.current_max_offset
+		self.times = [0] * processor.memory_bus.current_max_offset
+
+	def reset(self):
+		"""
+		Set all counts and times to ``0``.
+		"""
+		self.counts[:] = [0] * len(self.counts)
+		self.times[:] = [0] * len(self.times)
+
+	def hottest_pcs(self, top = 10):
+		"""
+		Returns the ``top`` addresses with the most time spent as list of ``(pc, count, time)``.
+		"""
+		pcs = [(pc, count, self.times[pc]) for pc, count in enumerate(self.counts) if(count)]
+		pcs.sort(key = lambda x: (-x[2], x[0]))
+		return pcs[:top]
+
+	def hottest_lines(self, top = 10):
+		"""
+		Returns the ``top`` lines of the assembly code with the most time spent
+		as list of ``(filename, line, count, time)``. Addresses that are not
+		in the ``source_map`` are ignored.
+		"""
+		if(self.source_map == None):
+			return []
+		lines = {}
+		for pc, count in enumerate(self.counts):
+			if(not count):
+				continue
+			line = self.source_map.lookup(pc)
+			if(line == None):
+				continue
+			entry = lines.setdefault(line, [0, 0])
+			entry[0] += count
+			entry[1] += self.times[pc]
+		result = [(self.source_map.filename, line, count, time) for line, (count, time) in lines.items()]
+		result.sort(key = lambda x: (-x[3], x[1]))
+		return result[:top]
+
+	def instruction_end(self, pc):
+		"""
+		Returns the address following the instruction at ``pc``.
+		"""
+		entry = self.processor._decode_cache.get(pc)
+		if(entry != None):
+			return entry[2]
+		try:
+			opcode = self.processor.memory_bus.read_word(pc)
+		except BUSError:
+			return pc + 1
+		if(not opcode in self.processor.commands_by_opcode):
+			return pc + 1
+		return pc + 1 + self.processor.commands_by_opcode[opcode].numargs()
+
+	def basic_blocks(self, top = 10):
+		"""
+		Returns the ``top`` basic blocks with the most time spent as list of
+		``(start, end, count, time)``, ``end`` is the address following the last instruction.
+
+		The basic blocks are determined from the profile: a block is a sequence of
+		adjacent executed instructions with the same execution count.
+		"""
+		blocks = []
+		block = None
+		for pc, count in enumerate(self.counts):
+			if(not count):
+				continue
+			if(block != None and block[1] == pc and block[2] == count):
+				block[1] = self.instruction_end(pc)
+				block[3] += self.times[pc]
+				continue
+			block = [pc, self.instruction_end(pc), count, self.times[pc]]
+			blocks.append(block)
+		blocks.sort(key = lambda x: (-x[3], x[0]))
+		return [tuple(block) for block in blocks[:top]]
+
+	def report(self, top = 10):
+		"""
+		Returns a text report of the hottest lines (if there is a ``source_map``),
+		basic blocks and addresses.
+		"""
+		total = sum(self.times) or 1
+		result = ["cycles: {}, time: {:.3f} ms".format(sum(self.counts), sum(self.times) / 1e6)]
+		if(self.source_map != None):
+			result.append("== lines ==")
+			for filename, line, count, time in self.hottest_lines(top):
+				name = "{}:{}".format(filename, line) if(filename != None) else "line {}".format(line)
+				result.append("{}\t{}\t{:.3f} ms\t{:.1f}%".format(name, count, time / 1e6, 100 * time / total))
+		result.append("== basic blocks ==")
+		for start, end, count, time in self.basic_blocks(top):
+			result.append("{}-{}\t{}\t{:.3f} ms\t{:.1f}%".format(start, end - 1, count, time / 1e6, 100 * time / total))
+		result.append("== addresses ==")
+		for pc, count, time in self.hottest_pcs(top):
+			result.append("{}\t{}\t{:.3f} ms\t{:.1f}%".format(pc, count, time / 1e6, 100 * time / total))
+		return "\n".join(result)
@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.engine_tools.stats**: Execution statistics
+
+ExecutionStats_ count the executions of every command, how often a branch
+changed the PC_ (taken branches) and the call depth of the ``stack_based``
+commands ``call``, ``scall`` and ``ret``.
+
+They are enabled by setting the ``stats`` of the Processor_, ``Processor.run``
+uses a counting run loop then (the other run loops are not changed).
+
+*Example*::
+
+	from py_register_machine2.engine_tools.stats import ExecutionStats
+
+	processor.stats = ExecutionStats(processor)
+	processor.run()
+	print(processor.stats.to_json(indent = 4))
+"""
+
+import json
+from ..commands import basic_commands, stack_based, gym_bav_16
+
+_branch_functions = set(command.function for command in (basic_commands.jmp, basic_commands.sjmp,
+		basic_commands.jne, basic_commands.jeq, basic_commands.jle, basic_commands.jlt,
+		basic_commands.jge, basic_commands.jgt,
+		stack_based.call, stack_based.scall, stack_based.ret,
+		gym_bav_16.JUMP, gym_bav_16.JNE, gym_bav_16.JEQ, gym_bav_16.JLT,
+		gym_bav_16.JLE, gym_bav_16.JGT, gym_bav_16.JGE))
+
+
+def call_depth_change(command):
+	"""
+	Returns the change of the call depth if ``command`` is executed:
+	``1`` for ``call`` and ``scall``, ``-1`` for ``ret``, ``0`` else.
+	"""
+	function = getattr(command, "function", None)
+	if(function in (stack_based.call_function, stack_based.scall_function)):
+		return 1
+	if(function == stack_based.ret_function):
+		return -1
+	return 0
+
+def can_branch(command):
+	"""
+	Returns ``True`` if ``command`` is one of the jumps, branches, calls or returns
+	of ``basic_commands``, ``stack_based`` and ``gym_bav_16``.
+	"""
+	return getattr(command, "function", None) in _branch_functions
+
+
+class ExecutionStats(object):
+	"""
+	.. _ExecutionStats:
+
+	Execution statistics of the commands of ``processor``.
+
+	``entries`` maps the Commands to ``[executions, taken, call depth change, branch]``,
+	``taken`` is the number of executions that changed the PC_ (jumps, taken branches,
+	calls and returns), changes of the PC_ by Interrupts are not counted.
+	``branch`` is ``True`` if the command can branch (see ``can_branch``),
+	other commands that changed the PC_ (like ``mov r0 PC``) are reported as branches, too.
+	"""
+	def __init__(self, processor):
+		self.processor = processor
+		self.entries = {}
+		self.call_depth = 0
+		self.max_call_depth = 0
+		self.update()
+
+	def update(self):
+		"""
+		Add the Commands registered after the construction.
+		"""
+		for command in self.processor.commands_by_opcode.values():
+			if(not command in self.entries):
+				self.entries[command] = [0, 0, call_depth_change(command), can_branch(command)]
+		return self.entries
+
+	def reset(self):
+		"""
+		Set all counters to ``0``.
+		"""
+		for entry in self.entries.values():
+			entry[0] = entry[1] = 0
+		self.call_depth = 0
+		self.max_call_depth = 0
+
+	def to_dict(self):
+		"""
+		Returns the statistics as ``dict``, the commands are ordered by their executions,
+		``taken`` and ``not_taken`` are reported for branches only::
+
+			{"cycles": 120,
+			"commands": {"add": {"opcode": 6, "count": 40},
+				"jgt": {"opcode": 21, "count": 40, "taken": 39, "not_taken": 1}, ...},
+			"call_depth": 0,
+			"max_call_depth": 2}
+		"""
+		commands = sorted(self.entries.items(), key = lambda x: (-x[1][0], x[0].opcode()))
+		result = {}
+		for command, (count, taken, depth, branch) in commands:
+			entry = result[command.mnemonic()] = {"opcode": command.opcode(), "count": count}
+			if(branch or taken):
+				entry["taken"] = taken
+				entry["not_taken"] = count - taken
+		return {"cycles": sum(entry[0] for entry in self.entries.values()),
+				"commands": result,
+				"call_depth": self.call_depth,
+				"max_call_depth": self.max_call_depth}
+
+	def to_json(self, **kwargs):
+		"""
+		Returns to_dict as JSON, ``kwargs`` are passed to ``json.dumps``.
+		"""
+		return json.dumps(self.to_dict(), **kwargs)
@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.engine_tools.tracer**: Binary execution traces
+
+The Tracer_ records every executed instruction as a fixed-size binary record
+in a preallocated ring buffer, instead of printing it (like ``debug > 2``).
+It is enabled by setting the ``tracer`` of the Processor_, ``Processor.run``
+uses a tracing run loop then (the other run loops are not changed).
+
+One record contains the cycle, the PC_, the opcode, the arguments and
+the first word written by the instruction (a Register, a word on the memory BUS
+or a word on the device BUS, writes to the PC_ are used only if nothing
+else is written).
+
+If the Tracer has an ``outfile`` every full buffer is written to the file by a
+background thread, else the oldest records are overwritten.
+The TraceReader_ decodes a trace file lazily.
+
+**File Format**
+
+All integers are little-endian::
+
+	"PRM2TRC\\0" version(u16) max_args(u16) [record] ...
+
+	record: cycle(i64) pc(i64) opcode(i64) number_of_args(u8) write_kind(u8)
+		args(i64 * max_args) address(i64) value(i64)
+
+*Example*::
+
+	from py_register_machine2.engine_tools.tracer import Tracer, TraceReader
+
+	with open("prog.trace", "wb") as fout:
+		processor.tracer = Tracer(processor, outfile = fout)
+		processor.run()
+		processor.tracer.close()
+
+	for record in TraceReader("prog.trace"):
+		print(record.cycle, record.pc, record.opcode, record.args)
+"""
+
+import struct, threading, queue, mmap
+from collections import namedtuple
+
+
+magic = b"PRM2TRC\0"
+version = 1
+
+WRITE_NONE = 0
+WRITE_REGISTER = 1
+WRITE_MEMORY = 2
+WRITE_DEVICE = 3
+
+TraceRecord = namedtuple("TraceRecord", ["cycle", "pc", "opcode", "args", "write_kind", "address", "value"])
+
+
+def record_struct(max_args):
+	"""
+	Returns the ``struct.Struct`` of one record.
+	"""
+	return struct.Struct("<qqqBB" + "q" * max_args + "qq")
+
+def decode(fields, max_args):
+	"""
+	Returns the TraceRecord of the unpacked ``fields``.
+	"""
+	nargs = fields[3]
+	return TraceRecord(fields[0], fields[1], fields[2], fields[5:5 + nargs], fields[4],
+			fields[5 + max_args], fields[6 + max_args])
+
+
+class Tracer(object):
+	"""
+	.. _Tracer:
+
+	Records the instructions executed by ``processor`` in a ring buffer
+	of ``size`` records. The Processor_ must be set up and all Commands must be registered,
+	the widths of the BUS es and Registers must not exceed ``64`` bits.
+
+	If ``outfile`` (a file opened in binary mode) is given, full buffers are
+	written to the file by a background thread (at most ``queued`` buffers
+	are waiting, the Processor waits if the file is too slow). Use close_ to write
+	the remaining records.
+	"""
+	def __init__(self, processor, size = 65536, outfile = None, queued = 4):
+		widths = [processor.memory_bus.width, processor.device_bus.width]
+		widths.extend(register.width for register in processor.register_interface.registers_by_index)
+		if(max(widths) > 64):
+			raise ValueError("Tracer supports widths up to 64 bits, not {}".format(max(widths)))
+		self.processor = processor
+		self.max_args = processor.max_instruction_length - 1
+		self.struct = record_struct(self.max_args)
+		self.record_size = self.struct.size
+		self.size = size
+		self.buffer = bytearray(size * self.record_size)
+		self.position = 0
+		self.wrapped = False
+		self.count = 0
+		self._padding = [(0,) * (self.max_args - n) for n in range(self.max_args + 1)]
+		self._write = None
+		self._saved = []
+
+		self.outfile = outfile
+		self._thread = None
+		if(outfile != None):
+			outfile.write(magic + struct.pack("<HH", version, self.max_args))
+			self._full = queue.Queue(maxsize = queued)
+			self._free = queue.Queue()
+			self._thread = threading.Thread(target = self._writer, daemon = True)
+			self._thread.start()
+
+	def _writer(self):
+		while(True):
+			buffer = self._full.get()
+			if(buffer == None):
+				self._full.task_done()
+				return
+			self.outfile.write(buffer)
+			if(len(buffer) == len(self.buffer)):
+				self._free.put(buffer)
+			self._full.task_done()
+
+	def record(self, cycle, pc, opcode, args):
+		"""
+		Append one record, the write is taken from the hooks installed by ``attach``.
+		"""
+		kind, address, value = self._write or (WRITE_NONE, 0, 0)
+		self._write = None
+		self.struct.pack_into(self.buffer, self.position * self.record_size,
+				cycle, pc, opcode, len(args), kind, *args, *self._padding[len(args)], address, value)
+		self.count += 1
+		self.position += 1
+		if(self.position == self.size):
+			self.position = 0
+			if(self.outfile == None):
+				self.wrapped = True
+				return
+			self._full.put(self.buffer)
+			try:
+				self.buffer = self._free.get_nowait()
+			except queue.Empty:
+				self.buffer = bytearray(len(self.buffer))
+
+	def attach(self):
+		"""
+		Install the hooks that record the writes of the instructions,
+		used by the tracing run loop of the Processor_.
+		"""
+		processor = self.processor
+		register_interface = processor.register_interface
+		self._write = None
+		self._saved = [(register_interface, "write", register_interface.__dict__.get("write")),
+				(processor.memory_bus, "write_word", processor.memory_bus.__dict__.get("write_word")),
+				(processor.device_bus, "write_word", processor.device_bus.__dict__.get("write_word"))]
+
+		def write(name_or_index, word, write = register_interface.write, truncators = register_interface.truncators):
+			write(name_or_index, word)
+			if(self._write == None or (self._write[0] == WRITE_REGISTER and self._write[1] == 0)):
+				index = name_or_index
+				if(not isinstance(index, int)):
+					index = register_interface.index_of(index)
+				self._write = (WRITE_REGISTER, index, truncators[index](word))
+		register_interface.write = write
+
+		for kind, bus in ((WRITE_MEMORY, processor.memory_bus), (WRITE_DEVICE, processor.device_bus)):
+			def write_word(offset, word, write_word = bus.write_word, kind = kind, truncate = bus.truncate):
+				write_word(offset, word)
+				if(self._write == None or (self._write[0] == WRITE_REGISTER and self._write[1] == 0)):
+					self._write = (kind, offset, truncate(word))
+			bus.write_word = write_word
+
+	def detach(self):
+		"""
+		Remove the hooks installed by attach.
+		"""
+		for owner, name, method in self._saved:
+			if(method == None):
+				del(owner.__dict__[name])
+			else:
+				setattr(owner, name, method)
+		self._saved = []
+
+	def records(self):
+		"""
+		Yields the TraceRecord s in the buffer (the last ``size`` records, if there is no ``outfile``).
+		"""
+		positions = range(self.position)
+		if(self.wrapped):
+			positions = list(range(self.position, self.size)) + list(positions)
+		for position in positions:
+			yield decode(self.struct.unpack_from(self.buffer, position * self.record_size), self.max_args)
+
+	def flush(self):
+		"""
+		Write the records in the buffer to the ``outfile`` and wait until all
+		buffers are written.
+		"""
+		if(self.outfile == None):
+			return
+		if(self.position):
+			self._full.put(bytes(self.buffer[:self.position * self.record_size]))
+			self.position = 0
+		self._full.join()
+		self.outfile.flush()
+
+	def close(self):
+		"""
+		Flush and stop the background thread, the ``outfile`` is not closed.
+		"""
+		if(self._thread == None):
+			return
+		self.flush()
+		self._full.put(None)
+		self._thread.join()
+		self._thread = None
+
+
+class TraceReader(object):
+	"""
+	.. _TraceReader:
+
+	Reads the trace file ``filename`` (see above) using ``mmap``,
+	the records are decoded when they are accessed::
+
+		trace = TraceReader("prog.trace")
+		print(len(trace), trace[-1])
+		for record in trace:
+			...
+	"""
+	def __init__(self, filename):
+		with open(filename, "rb") as fin:
+			header = fin.read(len(magic) + 4)
+			if(not header.startswith(magic)):
+				raise ValueError("{} is not a trace file".format(filename))
+			version_, self.max_args = struct.unpack_from("<HH", header, len(magic))
+			if(version_ != version):
+				raise ValueError("unsupported trace file version: {}".format(version_))
+			fin.seek(0, 2)
+			length = fin.tell()
+			self.data = mmap.mmap(fin.fileno(), 0, access = mmap.ACCESS_READ) if(length) else b""
+		self.struct = record_struct(self.max_args)
+		self.offset = len(magic) + 4
+		self.count = (len(self.data) - self.offset) // self.struct.size
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, index):
+		if(index < 0):
+			index += self.count
+		if(index < 0 or index >= self.count):
+			raise IndexError("trace index out of range")
+		return decode(self.struct.unpack_from(self.data, self.offset + index * self.struct.size), self.max_args)
+
+	def __iter__(self):
+		data = memoryview(self.data)[self.offset:self.offset + self.count * self.struct.size]
+		for fields in self.struct.iter_unpack(data):
+			yield decode(fields, self.max_args)
+
+	def close(self):
+		if(isinstance(self.data, mmap.mmap)):
+			self.data.close()
@@ -7,7 +7,8 @@ Just replaces mnemonics with opcodes and handles references.
 """
 
 from ...engine_tools.conversions import *
-import logging
+from ..sourcemap import SourceMap
+import logging, array
 
 # logging.basicConfig(level = logging.DEBUG)
 
@@ -43,7 +44,9 @@ class Assembler(object):
 	
 	Program Run
 		Generates one iterable of integers
-	
+
+	assemble_ chains these stages, stream_run_ (used by assemble_stream)
+	does the same in a single pass over the lines.
 	"""
 	def __init__(self, processor, open_stream, directives = [], commentstarts = [";"]):
 		self.processor = processor
@@ -53,6 +56,8 @@ class Assembler(object):
 		self.word_count = 0
 		self.refs = {} # jump marks
 		self.static_refs = {} # will stay in flash
+		self.inserted_refs = set() # jump marks already inserted by stream_run
+		self.source_map = SourceMap(getattr(open_stream, "name", None))
 		self.commentstarts = commentstarts
 
 		self.commands = {}
@@ -78,41 +83,49 @@ class Assembler(object):
 		sp_run = []
 		for line in self.open_stream.read().split("\n"):
 			self.line_count += 1
-			if(self.iscomment(line)):
-				continue
-			if(line.isspace()):
-				continue
-			line = self.stripcomments(line)
-
-			words = line.split()
-			if(len(words) == 0):
-				continue
-			if(isreference(words)):
-				self.add_ref(words)
-				continue
-			if(self.isdirective(words)):
-				sp_run.append(self.handle_directive(words))
-				continue
-			if(not words[0] in self.commands):
-				raise AssembleError("[Line {}]: Unknown Mnemonic '{}'".format(self.line_count, words[0]))
-
-			mnemo = words[0]
-			args = words[1:]
-			if(len(args) != self.commands[mnemo].numargs()):
-				# check for default arguments
-				args_ = list(args)
-				for argtype in self.commands[mnemo].argtypes()[len(args):]:
-					if(not argtype.can_default):
-						raise AssembleError("[Line {}]: Mnemonic '{}' expects {} arguments, but got {}".format(self.line_count, mnemo, self.commands[mnemo].numargs(), len(args)))
-					else:
-						args_.append(argtype.default)
-				args = args_
-			self.word_count += 1 + len(args)
-						
-			logging.debug("split run: " + str((self.line_count, "command", self.commands[mnemo], (args))))
-			sp_run.append((self.line_count, "command", self.commands[mnemo], (args)))
+			line = self.split_line(line)
+			if(line != None):
+				sp_run.append(line)
 		return sp_run
 
+	def split_line(self, line):
+		"""
+		Splits one line of assembly code (see split_run_), returns ``None``
+		if the line contains no command or directive.
+		"""
+		if(self.iscomment(line)):
+			return None
+		if(line.isspace()):
+			return None
+		line = self.stripcomments(line)
+
+		words = line.split()
+		if(len(words) == 0):
+			return None
+		if(isreference(words)):
+			self.add_ref(words)
+			return None
+		if(self.isdirective(words)):
+			return self.handle_directive(words)
+		if(not words[0] in self.commands):
+			raise AssembleError("[Line {}]: Unknown Mnemonic '{}'".format(self.line_count, words[0]))
+
+		mnemo = words[0]
+		args = words[1:]
+		if(len(args) != self.commands[mnemo].numargs()):
+			# check for default arguments
+			args_ = list(args)
+			for argtype in self.commands[mnemo].argtypes()[len(args):]:
+				if(not argtype.can_default):
+					raise AssembleError("[Line {}]: Mnemonic '{}' expects {} arguments, but got {}".format(self.line_count, mnemo, self.commands[mnemo].numargs(), len(args)))
+				else:
+					args_.append(argtype.default)
+			args = args_
+		self.word_count += 1 + len(args)
+
+		logging.debug("split run: %s", (self.line_count, "command", self.commands[mnemo], (args)))
+		return (self.line_count, "command", self.commands[mnemo], (args))
+
 
 	def add_ref(self, wordlist):
 		"""
@@ -138,6 +151,9 @@ class Assembler(object):
 			if(refname in self.static_refs):
 				raise ReferenceError("[line {}]:{} already defined here (word) {} (line) {}".format(self.line_count,
 							refname, self.static_refs[refname][0], self.static_refs[refname][1]))
+			if(refname in self.inserted_refs):
+				raise ReferenceError("[line {}]:{} already used as jump mark (word) {} (line) {}".format(self.line_count,
+							refname, self.refs[refname][0], self.refs[refname][1]))
 			self.static_refs[refname] = (self.word_count, self.line_count)
 		else:
 			if(refname in self.refs):
@@ -168,15 +184,18 @@ class Assembler(object):
 		arg_run = []
 
 		for line in sp_r:
-			logging.debug("argument run: handling: " + str(line))
-			if(line[1] == "data"):
-				arg_run.append( (line[0], line[1], line[2], line[2].get_words(line[3])))
-				continue
-			if(line[1] == "command"):
-				self.checkargs(line[0], line[2], line[3])
-				arg_run.append( (line[0], line[1], line[2], [a for a in self.convert_args(line[2], line[3])]))
+			arg_run.append(self.argument_line(line))
 		return arg_run
-				
+
+	def argument_line(self, line):
+		"""
+		Converts the arguments of one line of the split_run_ (see argument_run_).
+		"""
+		logging.debug("argument run: handling: %s", line)
+		if(line[1] == "data"):
+			return (line[0], line[1], line[2], line[2].get_words(line[3]))
+		self.checkargs(line[0], line[2], line[3])
+		return (line[0], line[1], line[2], [a for a in self.convert_args(line[2], line[3])])
 
 	def checkargs(self, lineno, command, args):
 		"""
@@ -214,10 +233,12 @@ class Assembler(object):
 		.. _dereference_run:
 
 		Converts the commands to opcodes and inserts the (relative or static) references.
+		Fills the ``source_map`` (a ``tools.sourcemap.SourceMap``).
 		
 		"""
 		wc = 0
 		der_run = []
+		self.source_map = SourceMap(self.source_map.filename)
 		for line in arg_r:
 			args = []
 			for argument in line[3]:
@@ -241,6 +262,7 @@ class Assembler(object):
 			if(line[1] == "command"):
 				data = [line[2].opcode()]
 			data.extend(args)
+			self.source_map.add(wc, len(data), line[0])
 			wc += len(data)
 			der_run.append((line[0], line[1], data))
 		return der_run
@@ -271,6 +293,70 @@ class Assembler(object):
 		program = self.program_run(de_r)
 		return program
 
+	def stream_run(self, typecode = "q"):
+		"""
+		.. _stream_run:
+
+		Assembles the code in one pass, reading ``open_stream`` line by line.
+
+		The words are appended to an ``array.array`` of the typecode ``typecode``
+		(a ``list``, if a word does not fit into it). References to jump marks
+		and static references that are already known are inserted immediately,
+		forward references are stored and patched at the end, so the
+		memory used does not depend on the number of lines (except for the
+		references and the ``source_map``).
+
+		The result is the same as the result of assemble_, except that
+		a jump mark that is used before a static reference (directive) with the same name is defined
+		raises a ReferenceError (assemble_ would use the static reference)
+		and that the errors are raised in the order of the lines.
+		"""
+		program = array.array(typecode)
+		patches = []
+		for line in self.open_stream:
+			self.line_count += 1
+			line = self.split_line(line)
+			if(line == None):
+				continue
+			lineno, kind, what, arguments = self.argument_line(line)
+			my_word = len(program)
+			data = []
+			if(kind == "command"):
+				data.append(what.opcode())
+			for argument in arguments:
+				if(isinstance(argument, int)):
+					data.append(argument)
+				elif(argument in self.static_refs):
+					data.append(self.static_refs[argument][0])
+				elif(argument in self.refs):
+					self.inserted_refs.add(argument)
+					data.append(self.refs[argument][0] - my_word)
+				else:
+					patches.append((my_word + len(data), my_word, argument, lineno))
+					data.append(0)
+			self.source_map.add(my_word, len(data), lineno)
+			try:
+				program.extend(array.array(typecode, data) if(isinstance(program, array.array)) else data)
+			except OverflowError:
+				program = program.tolist()
+				program.extend(data)
+
+		for index, my_word, argument, lineno in patches:
+			if(argument in self.static_refs):
+				word = self.static_refs[argument][0]
+			elif(argument in self.refs):
+				word = self.refs[argument][0] - my_word
+			else:
+				raise ArgumentError("[line {}]: Argument '{}' is neither an int nor a reference.".format(lineno, argument))
+			program[index] = word
+		return program
+
+	def assemble_stream(self, typecode = "q"):
+		"""
+		Same as assemble_ using the single pass stream_run_, for large inputs.
+		"""
+		return self.stream_run(typecode)
+
 	def iscomment(self, line):
 		for commentstart in self.commentstarts:
 			if(line.startswith(commentstart)):
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.tools.assembler.cache**: On-disk cache of assembled programs
+
+Used by ``cli assemble``. The entries are object files (see ``tools.objectfile``)
+named by a hash of the source code and everything that changes the result of the
+Assembler_: the commands (opcodes, mnemonics and argument types), the registers,
+the directives, the comment starts and the ``constants`` of the processor.
+
+Several processes may share one cache directory: the entries are written to
+a temporary file that is renamed, so a reader never sees an incomplete entry.
+The entries get the mode of a file created by ``open`` (``0o666`` without the umask),
+not the mode ``0o600`` of the temporary file, so other users can read them, too.
+If the cache exceeds its size the least recently used entries are removed.
+"""
+
+import hashlib, os, tempfile
+
+# change this if the key or the entries change
+cache_version = 1
+
+
+def source_key(assembler, chunks, *extra):
+	"""
+	.. _source_key:
+
+	Returns the key of the source code ``chunks`` (an iterable of ``str``)
+	assembled by ``assembler`` (an Assembler_). The ``str`` s ``extra``
+	are added to the key, too.
+	"""
+	hash_ = hashlib.sha256()
+	def add(*values):
+		hash_.update(repr(values).encode("utf-8"))
+		hash_.update(b"\0")
+
+	add("PRM2", cache_version)
+	for mnemonic, command in sorted(assembler.commands.items()):
+		add("command", command.opcode(), mnemonic,
+				[(a.type_, a.can_default, a.default) for a in command.argtypes()])
+	for name, index in sorted(assembler.register_indices.items()):
+		add("register", name, index)
+	for name, directive in sorted(assembler.directives.items()):
+		function = getattr(directive, "function", None)
+		add("directive", name, type(directive).__module__, type(directive).__name__, directive.isstatic(),
+				getattr(function, "__module__", None), getattr(function, "__name__", None))
+	add("commentstarts", list(assembler.commentstarts))
+	add("constants", sorted(assembler.processor.constants.items()))
+	add("extra", extra)
+	for chunk in chunks:
+		hash_.update(chunk.encode("utf-8"))
+	return hash_.hexdigest()
+
+def _umask():
+	# the umask can only be read by setting it
+	umask = os.umask(0)
+	os.umask(umask)
+	return umask
+
+
+class AssemblyCache(object):
+	"""
+	.. _AssemblyCache:
+
+	A cache of object files in the directory ``directory`` (created if needed)
+	holding at most ``max_size`` bytes.
+	"""
+	def __init__(self, directory, max_size = 64 * 1024 * 1024):
+		self.directory = directory
+		self.max_size = max_size
+		os.makedirs(directory, exist_ok = True)
+
+	def path(self, key):
+		return os.path.join(self.directory, key + ".o")
+
+	def get(self, key):
+		"""
+		Returns the entry ``key`` (``bytes``) or ``None`` if it is not cached.
+		"""
+		path = self.path(key)
+		try:
+			with open(path, "rb") as fin:
+				data = fin.read()
+		except (FileNotFoundError, IsADirectoryError):
+			return None
+		try:
+			# mark as recently used
+			os.utime(path)
+		except OSError:
+			pass
+		return data
+
+	def put(self, key, data):
+		"""
+		Stores the entry ``key`` and removes the least recently used entries
+		if the cache is too big.
+		"""
+		fd, tmp = tempfile.mkstemp(dir = self.directory, prefix = ".", suffix = ".tmp")
+		try:
+			with os.fdopen(fd, "wb") as fout:
+				fout.write(data)
+			os.chmod(tmp, 0o666 & ~_umask())
+			os.replace(tmp, self.path(key))
+		except BaseException:
+			try:
+				os.remove(tmp)
+			except OSError:
+				pass
+			raise
+		self.evict()
+
+	def evict(self):
+		"""
+		Removes the least recently used entries until the cache holds at most ``max_size`` bytes.
+		Entries removed by other processes are ignored.
+		"""
+		entries = []
+		total = 0
+		for name in os.listdir(self.directory):
+			if(name.startswith(".") or not name.endswith(".o")):
+				continue
+			try:
+				stat = os.stat(os.path.join(self.directory, name))
+			except FileNotFoundError:
+				continue
+			entries.append((stat.st_mtime, name, stat.st_size))
+			total += stat.st_size
+		entries.sort()
+		for mtime, name, size in entries:
+			if(total <= self.max_size):
+				break
+			try:
+				os.remove(os.path.join(self.directory, name))
+			except FileNotFoundError:
+				pass
+			total -= size
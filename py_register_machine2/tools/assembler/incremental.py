@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.tools.assembler.incremental**: Incremental reassembly
+
+Used by the web front-end, that reassembles the complete code on every change.
+"""
+
+from .assembler import Assembler
+from io import StringIO
+
+
+class IncrementalAssembler(object):
+	"""
+	.. _IncrementalAssembler:
+
+	Assembles the code of one editor (``str``) again and again.
+
+	The results of the split run and the argument run of every line are cached
+	by the content of the line, so only changed lines are split and converted again.
+	The reference layout and the insertion of the references are done for
+	the complete code, they are cheap.
+
+	If the code contains an error the code is assembled by the Assembler_ to raise the same
+	exception as ``Assembler.assemble``.
+	"""
+	def __init__(self, processor, directives = [], commentstarts = [";"]):
+		self.processor = processor
+		self.directives = directives
+		self.commentstarts = commentstarts
+		self.lines = {}
+		self.program = []
+		self._assembler = Assembler(processor, StringIO(), directives = directives, commentstarts = commentstarts)
+
+	def split_line(self, line):
+		"""
+		Returns the cached result of the split and the argument run of the line ``line``:
+		``(jump mark, static reference, word count, opcode, arguments)``.
+		``jump mark`` and ``static reference`` are names or ``None``,
+		``opcode`` is ``None`` for data.
+
+		Returns ``None`` if the line contains an error.
+		"""
+		if(line in self.lines):
+			return self.lines[line]
+		asm = self._assembler
+		asm.refs = {}
+		asm.static_refs = {}
+		asm.word_count = 0
+		try:
+			split = asm.split_line(line)
+			if(split == None):
+				arguments = []
+				opcode = None
+			else:
+				lineno, kind, what, arguments = asm.argument_line(split)
+				opcode = what.opcode() if(kind == "command") else None
+		except BaseException:
+			return None
+		ref = list(asm.refs)[0] if(asm.refs) else None
+		static_ref = list(asm.static_refs)[0] if(asm.static_refs) else None
+		result = (ref, static_ref, asm.word_count, opcode, arguments)
+		self.lines[line] = result
+		return result
+
+	def assemble(self, code):
+		"""
+		.. _incremental_assemble:
+
+		Assembles ``code`` (``str``) and returns ``(program, diff)``.
+
+		``program`` is a ``list`` of integers (the same as ``Assembler.assemble``),
+		``diff`` the list of ``(offset, words)`` where the program differs from the
+		previous one.
+
+		Might raise the exceptions raised by ``Assembler.assemble``.
+		"""
+		lines = []
+		refs = {}
+		static_refs = {}
+		word_count = 0
+		for line in code.split("\n"):
+			split = self.split_line(line)
+			if(split == None):
+				return self._fallback(code)
+			ref, static_ref, count, opcode, arguments = split
+			if(ref != None):
+				if(ref in refs):
+					return self._fallback(code)
+				refs[ref] = word_count
+			if(static_ref != None):
+				if(static_ref in static_refs):
+					return self._fallback(code)
+				static_refs[static_ref] = word_count
+			word_count += count
+			if(opcode != None or arguments):
+				lines.append(split)
+		# forget the lines that have been removed
+		self.lines = {line: self.lines[line] for line in code.split("\n") if(line in self.lines)}
+
+		program = []
+		for ref, static_ref, count, opcode, arguments in lines:
+			my_word = len(program)
+			if(opcode != None):
+				program.append(opcode)
+			for argument in arguments:
+				if(isinstance(argument, int)):
+					program.append(argument)
+				elif(argument in static_refs):
+					program.append(static_refs[argument])
+				elif(argument in refs):
+					program.append(refs[argument] - my_word)
+				else:
+					return self._fallback(code)
+
+		diff = self.diff(self.program, program)
+		self.program = program
+		return program, diff
+
+	def _fallback(self, code):
+		program = Assembler(self.processor, StringIO(code),
+				directives = self.directives, commentstarts = self.commentstarts).assemble()
+		diff = self.diff(self.program, program)
+		self.program = program
+		return program, diff
+
+	@staticmethod
+	def diff(old, new):
+		"""
+		Returns the list of ``(offset, words)`` where ``new`` differs from ``old``.
+		"""
+		diff = []
+		start = None
+		for i, word in enumerate(new):
+			if(i < len(old) and old[i] == word):
+				if(start != None):
+					diff.append((start, new[start:i]))
+					start = None
+			elif(start == None):
+				start = i
+		if(start != None):
+			diff.append((start, new[start:]))
+		return diff
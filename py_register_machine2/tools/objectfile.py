@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.tools.objectfile**: Object files
+
+Object files contain the assembled sections (like ``ROM`` and ``FLASH``) of a program.
+
+**Binary Format**
+
+All integers are little-endian::
+
+	"PRM2OBJ\\0" version(u16) number_of_sections(u16)
+	[name_length(u8) name width(u32) offset(u32) length(u32) words] ...
+
+``width`` is the width of the words in bits, ``offset`` is the offset in the
+device the section is programmed to and ``length`` the number of words.
+The words are signed integers, packed using ``parts.words_to_bytes``
+(one ``8``, ``16``, ``32`` or ``64`` bit integer per word or
+``(width + 7) // 8`` bytes for wider words).
+
+**Text Format**
+
+The old text format is still readable, one line per section::
+
+	<sectionname>:<code>
+
+Eg::
+
+	ROM:[22, 0, 4, 22, 1, 1]
+	FLASH:[22, 0, 4, 22, 1, 1]
+
+The words are loaded with the offset ``0``.
+"""
+
+import struct, ast
+from ..core import parts
+
+magic = b"PRM2OBJ\0"
+version = 1
+
+
+class Section(object):
+	"""
+	.. _Section:
+
+	One section of an object file. ``words`` is an ``array.array`` (see ``parts.word_storage``),
+	a ``list`` or any other iterable of ``int``.
+	"""
+	def __init__(self, name, words, width = 64, offset = 0):
+		self.name = name
+		self.words = words
+		self.width = width
+		self.offset = offset
+
+	def __repr__(self):
+		return "Section({}, <{} words>, width = {}, offset = {})".format(repr(self.name),
+				len(self.words), self.width, self.offset)
+
+	def program(self, device):
+		"""
+		Program the section to ``device`` (a ROM or Flash), in one step.
+		"""
+		device.program(self.words, self.offset)
+
+
+def dumps(sections):
+	"""
+	.. _dumps:
+
+	Returns the binary form of the Section_ s ``sections``.
+	"""
+	data = [magic, struct.pack("<HH", version, len(sections))]
+	for section in sections:
+		name = section.name.encode("ascii")
+		data.append(struct.pack("<B", len(name)))
+		data.append(name)
+		data.append(struct.pack("<III", section.width, section.offset, len(section.words)))
+		data.append(parts.words_to_bytes(section.words, section.width))
+	return b"".join(data)
+
+def loads(data):
+	"""
+	.. _loads:
+
+	Returns the list of Section_ s in ``data`` (``bytes`` in the binary format
+	or the text format, see above).
+
+	Raises a ValueError if ``data`` is not an object file.
+	"""
+	if(not data.startswith(magic)):
+		return loads_text(data.decode("ascii") if(isinstance(data, bytes)) else data)
+	version_, count = struct.unpack_from("<HH", data, len(magic))
+	if(version_ != version):
+		raise ValueError("unsupported object file version: {}".format(version_))
+	offset = len(magic) + 4
+	sections = []
+	for i in range(count):
+		name_length = data[offset]
+		name = data[offset + 1: offset + 1 + name_length].decode("ascii")
+		offset += 1 + name_length
+		width, device_offset, length = struct.unpack_from("<III", data, offset)
+		offset += 12
+		size = parts.word_size(width) * length
+		if(offset + size > len(data)):
+			raise ValueError("object file is truncated (section {})".format(name))
+		words = parts.words_from_bytes(data[offset:offset + size], width)
+		offset += size
+		sections.append(Section(name, words, width = width, offset = device_offset))
+	return sections
+
+def loads_text(text):
+	"""
+	Returns the list of Section_ s in the text format ``text``.
+	"""
+	sections = []
+	for line in text.split("\n"):
+		if(line.strip() == ""):
+			continue
+		name, code = line.split(":", 1)
+		words = ast.literal_eval(code)
+		if(not isinstance(words, list)):
+			raise ValueError("invalid section: {}".format(name))
+		width = max([64] + [abs(word).bit_length() + 1 for word in words])
+		sections.append(Section(name, words, width = width))
+	return sections
+
+def dumps_text(sections):
+	"""
+	Returns the text form of the Section_ s ``sections``.
+	The offsets are lost.
+	"""
+	return "".join("{}:{}\n".format(section.name, list(section.words)) for section in sections)
+
+def load(infile):
+	"""
+	Read the Section_ s from the file ``infile`` (opened in binary mode), see loads_.
+	"""
+	return loads(infile.read())
+
+def dump(sections, outfile):
+	"""
+	Write the Section_ s to the file ``outfile`` (opened in binary mode), see dumps_.
+	"""
+	outfile.write(dumps(sections))
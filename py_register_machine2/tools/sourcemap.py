@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+
+"""
+**py_register_machine2.tools.sourcemap**: Source maps
+
+A source map maps the words of an assembled program to the lines
+of the assembly code, it is generated by the Assembler_ (``Assembler.source_map``)
+and used by the ``engine_tools.profiler.Profiler``.
+
+The JSON form is::
+
+	{"filename": "prog.asm", "offset": 0, "words": [[address, count, line], ...]}
+"""
+
+import array, json
+from bisect import bisect_right
+
+
+class SourceMap(object):
+	"""
+	.. _SourceMap:
+
+	Maps the word addresses of a program to the lines of the file ``filename``.
+	``offset`` is the address of the first word of the program (``0`` for the ROM).
+	"""
+	def __init__(self, filename = None, offset = 0):
+		self.filename = filename
+		self.offset = offset
+		self.addresses = array.array("q")
+		self.counts = array.array("q")
+		self.lines = array.array("q")
+
+	def add(self, address, count, line):
+		"""
+		The ``count`` words starting at ``address`` (relative to the
+		start of the program) have been generated by the line ``line``.
+		The lines must be added in the order of their addresses.
+		"""
+		if(count <= 0):
+			return
+		self.addresses.append(address)
+		self.counts.append(count)
+		self.lines.append(line)
+
+	def lookup(self, address):
+		"""
+		Returns the line that generated the word at ``address`` (including the ``offset``)
+		or ``None``.
+		"""
+		address -= self.offset
+		index = bisect_right(self.addresses, address) - 1
+		if(index < 0 or address >= self.addresses[index] + self.counts[index]):
+			return None
+		return self.lines[index]
+
+	def __len__(self):
+		return len(self.addresses)
+
+	def __iter__(self):
+		"""
+		Yields ``(address, count, line)``.
+		"""
+		return zip(self.addresses, self.counts, self.lines)
+
+	def to_dict(self):
+		return {"filename": self.filename, "offset": self.offset,
+				"words": [list(entry) for entry in self]}
+
+	@staticmethod
+	def from_dict(dct):
+		source_map = SourceMap(dct.get("filename"), dct.get("offset", 0))
+		for address, count, line in dct["words"]:
+			source_map.add(address, count, line)
+		return source_map
+
+	def dump(self, outfile):
+		"""
+		Write the source map as JSON to ``outfile``.
+		"""
+		json.dump(self.to_dict(), outfile)
+
+	@staticmethod
+	def load(infile):
+		"""
+		Read a source map written by ``dump`` from ``infile``.
+		"""
+		return SourceMap.from_dict(json.load(infile))
@@ -42,9 +42,14 @@ setup(
 					# comment this requirement if you do not need it.
 
 
-		"docopt >= 0.6.1"	# this is only required for
+		"docopt >= 0.6.1",	# this is only required for
 					# py_register_machine2.app.cli
 					# comment this requirement if you do not need it.
+
+
+		"numpy >= 1.13"		# this is only required for
+					# py_register_machine2.engine_tools.lockstep
+					# comment this requirement if you do not need it.
 	]
 
 
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+import io, pytest
+
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler, ArgumentError
+from py_register_machine2.tools.assembler import directives
+
+from test_processor import programs
+
+
+forward = """ldi 3 r0
+jmp start
+.set values 7
+.word unused 5
+.zeros gap 3
+.padd fill 2 9
+.set nine 9
+start:
+ld values r1
+ldi nine r2
+loop:
+dec r0
+jeq r0 done
+jmp loop
+back:
+ldi 1 ECR
+done:
+ld nine r3
+jmp back
+"""
+
+def get_assembler(code):
+	processor, rom, ram, flash = get_machine()
+	return Assembler(processor, io.StringIO(code), directives = [
+			directives.BaseDirective(".word"),
+			directives.Zeros(), directives.Padding(),
+			type("Set", (directives.BaseDirective,), {"isstatic": lambda self: True})(".set")])
+
+def test_stream_matches_assemble():
+	for name, code in list(programs.items()) + [("forward", forward)]:
+		expected = get_assembler(code).assemble()
+		assert list(get_assembler(code).assemble_stream()) == expected, name
+		assert list(get_assembler(code).assemble_stream("l")) == expected, name
+
+def test_stream_runs_like_assemble():
+	results = []
+	for method in ("assemble", "assemble_stream"):
+		processor, rom, ram, flash = get_machine()
+		rom.program(getattr(get_assembler(forward), method)())
+		processor.run()
+		results.append([processor.register_interface.read(name) for name in ("r0", "r1", "r2", "r3")])
+	assert results[0] == results[1] == [0, 7, 12, 9]
+
+def test_unknown_references():
+	for method in ("assemble", "assemble_stream"):
+		with pytest.raises(ArgumentError):
+			getattr(get_assembler("jmp nowhere\n"), method)()
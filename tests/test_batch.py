@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+import io, json
+
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+from py_register_machine2.app.cli.batch import run_batch, read_manifest
+
+
+program = """ld 60 r0
+ldi 0 r1
+loop:
+add r0 r1
+dec r0
+jgt r0 loop
+st r1 61
+ldi 72 out0
+ldi 1 ECR
+"""
+
+def execute(code, job):
+	stream = io.StringIO()
+	proc, rom, ram, flash = get_machine()
+	proc.register_interface.registers_by_name["out0"].open_stream = stream
+	rom.program(code)
+	for name, value in job.get("registers", {}).items():
+		proc.register_interface.write(name, value)
+	for offset, value in job.get("memory", {}).items():
+		proc.memory_bus.write_word(int(offset), value)
+	cycles, halted = proc.run(job.get("steps"))
+	return {"cycles": cycles, "halted": halted,
+			"registers": {r.name: r.read() for r in proc.register_interface.registers_by_index},
+			"output": stream.getvalue(),
+			"memory": [[60, [proc.memory_bus.read_word(60), proc.memory_bus.read_word(61)]]]}
+
+
+def test_batch_matches_execute(tmp_path):
+	proc, rom, ram, flash = get_machine()
+	code = Assembler(proc, io.StringIO(program)).assemble()
+	(tmp_path / "sum.o").write_text("ROM:{}\n".format(code))
+
+	jobs = [{"id": i, "object": str(tmp_path / "sum.o"), "memory": {"60": i}, "dump": [[60, 2]]} for i in range(20)]
+	jobs.append({"id": "regs", "object": str(tmp_path / "sum.o"), "registers": {"r5": 9}, "steps": 5, "dump": [[60, 2]]})
+	jobs.append({"id": "missing", "object": str(tmp_path / "missing.o")})
+	manifest = io.StringIO("".join(json.dumps(job) + "\n" for job in jobs))
+
+	outfile = io.StringIO()
+	run_batch(read_manifest(manifest), outfile, workers = 2,
+			default_machine = "py_register_machine2.machines.small")
+	results = [json.loads(line) for line in outfile.getvalue().splitlines()]
+
+	assert [result["id"] for result in results] == [job["id"] for job in jobs]
+	for job, result in zip(jobs[:-1], results):
+		assert result["error"] == None
+		expected = execute(code, job)
+		assert result["cycles"] == expected["cycles"], job
+		assert result["halted"] == expected["halted"], job
+		assert result["registers"] == expected["registers"], job
+		assert result["output"] == expected["output"], job
+		assert result["memory"] == expected["memory"], job
+	assert results[-2]["cycles"] == 5 and not results[-2]["halted"]
+	assert results[-1]["error"].startswith("FileNotFoundError")
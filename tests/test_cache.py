@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+
+import io, os, stat, subprocess, sys
+
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+from py_register_machine2.tools.assembler.cache import AssemblyCache, source_key
+
+
+def get_key(code, *extra, commentstarts = [";"]):
+	processor, rom, ram, flash = get_machine()
+	assembler = Assembler(processor, io.StringIO(code), commentstarts = commentstarts)
+	return source_key(assembler, [code[:5], code[5:]], *extra)
+
+def test_source_key():
+	key = get_key("ldi 1 r0\nldi 1 ECR\n", "ROM", "64")
+	assert key == get_key("ldi 1 r0\nldi 1 ECR\n", "ROM", "64")
+	assert key != get_key("ldi 2 r0\nldi 1 ECR\n", "ROM", "64")
+	assert key != get_key("ldi 1 r0\nldi 1 ECR\n", "FLASH", "64")
+	assert key != get_key("ldi 1 r0\nldi 1 ECR\n", "ROM", "64", commentstarts = ["#"])
+
+def test_hit_and_miss(tmp_path):
+	cache = AssemblyCache(str(tmp_path / "cache"))
+	assert cache.get("a") == None
+	cache.put("a", b"first")
+	assert cache.get("a") == b"first"
+	cache.put("a", b"second")
+	assert cache.get("a") == b"second"
+	assert cache.get("b") == None
+	assert sorted(os.listdir(cache.directory)) == ["a.o"]
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+	cache = AssemblyCache(str(tmp_path), max_size = 250)
+	cache.put("a", b"a" * 100)
+	cache.put("b", b"b" * 100)
+	os.utime(cache.path("a"), (1000, 1000))
+	os.utime(cache.path("b"), (2000, 2000))
+
+	# the hit makes "a" the most recently used entry
+	assert cache.get("a") == b"a" * 100
+	cache.put("c", b"c" * 100)
+	assert cache.get("b") == None
+	assert cache.get("a") == b"a" * 100
+	assert cache.get("c") == b"c" * 100
+
+	cache.put("d", b"d" * 300)
+	assert os.listdir(str(tmp_path)) == []
+
+def test_entries_are_readable_by_others(tmp_path):
+	umask = os.umask(0o022)
+	try:
+		cache = AssemblyCache(str(tmp_path))
+		cache.put("a", b"data")
+	finally:
+		os.umask(umask)
+	assert stat.S_IMODE(os.stat(cache.path("a")).st_mode) == 0o644
+
+def test_cli_assemble_uses_the_cache(tmp_path):
+	def assemble(code):
+		return subprocess.run([sys.executable, "-m", "py_register_machine2.app.cli", "assemble",
+				"--string", code, "--text", "--cache", str(tmp_path)],
+				stdout = subprocess.PIPE, check = True).stdout
+
+	first = assemble("ldi 1 r0\nldi 1 ECR\n")
+	assert len(os.listdir(str(tmp_path))) == 1
+	assert assemble("ldi 1 r0\nldi 1 ECR\n") == first
+	assert len(os.listdir(str(tmp_path))) == 1
+	assert assemble("ldi 2 r0\nldi 1 ECR\n") != first
+	assert len(os.listdir(str(tmp_path))) == 2
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+import pytest
+
+from py_register_machine2.core import processor
+from py_register_machine2.engine_tools.clock import SoftwareClock
+
+from test_processor import programs, get_program_machine, state
+
+
+def test_clocked_run_matches_run():
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		proc.run()
+		expected = state(proc)
+
+		proc, rom, ram = get_program_machine(name)
+		proc.clock = SoftwareClock(10 ** 9, quantum = 5)
+		assert proc.run() == (expected[2], True)
+		assert state(proc) == expected, name
+		assert proc.clock.cycles == expected[2]
+
+def test_clocked_run_stops_at_max_cycles():
+	proc, rom, ram = get_program_machine("sum")
+	proc.run()
+	expected = state(proc)
+
+	proc, rom, ram = get_program_machine("sum")
+	proc.clock = SoftwareClock(10 ** 9, quantum = 7)
+	assert proc.run(0) == (0, False)
+	assert proc.run(100) == (100, False)
+	assert proc.cycles == 100
+	assert proc.clock.quanta == 15
+	cycles = 100
+	while(True):
+		done, halted = proc.run(30)
+		cycles += done
+		if(halted):
+			break
+		assert done == 30
+	assert state(proc) == expected
+	assert proc.clock.cycles == cycles == expected[2]
+
+def test_clock_paces_the_run():
+	proc, rom, ram = get_program_machine("sum")
+	proc.clock = SoftwareClock(20000, quantum = 20)
+	assert proc.run(200) == (200, False)
+	# the last quantum ends at its deadline
+	assert proc.clock.elapsed_ns >= 200 * 10 ** 9 // 20000
+	assert proc.clock.to_dict()["ratio"] <= 1.0
+
+def test_clock_setup():
+	with pytest.raises(ValueError):
+		SoftwareClock(0)
+	assert SoftwareClock(100000).quantum == 100
+	assert SoftwareClock(10).quantum == 1
+
+	proc, rom, ram = get_program_machine("sum")
+	proc.f_cpu = 1000
+	proc.clock = SoftwareClock(1000)
+	with pytest.raises(processor.SetupError):
+		proc.run(1)
@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+
+import io
+
+from py_register_machine2.core import processor, memory, register, device, interrupts
+from py_register_machine2.commands.basic_commands import basic_commands
+from py_register_machine2.commands import stack_based
+from py_register_machine2.tools.assembler.assembler import Assembler
+from py_register_machine2.engine_tools.compiler import BlockCompiler
+
+from test_processor import programs, get_program_machine, state, PlainRAM
+
+
+def test_programs():
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		proc.run()
+		expected = state(proc)
+
+		proc, rom, ram = get_program_machine(name)
+		compiler = BlockCompiler(proc, max_block_length = 4)
+		assert compiler.can_compile()
+		assert compiler.run() == (expected[2], True)
+		assert state(proc) == expected, name
+
+def test_max_cycles():
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		proc.run()
+		expected = state(proc)
+
+		proc, rom, ram = get_program_machine(name)
+		compiler = BlockCompiler(proc)
+		results = []
+		while(not results or not results[-1][1]):
+			results.append(compiler.run(7))
+		assert [cycles for cycles, halted in results[:-1]] == [7] * (len(results) - 1)
+		assert sum(cycles for cycles, halted in results) == expected[2]
+		assert state(proc) == expected, name
+
+def test_fallback_to_do_cycle():
+	proc, rom, ram = get_program_machine("memory")
+	proc.run()
+	expected = state(proc)
+
+	proc, rom, ram = get_program_machine("memory")
+	calls = []
+	proc.register_on_cycle_callback(lambda: calls.append(1))
+	compiler = BlockCompiler(proc)
+	assert not compiler.can_compile()
+	compiler.run()
+	assert state(proc) == expected
+	assert len(calls) == expected[2]
+
+def test_code_written_to_the_ram():
+	proc, rom, ram = get_program_machine("sum")
+	compiler = BlockCompiler(proc)
+	rom.program(Assembler(proc, io.StringIO("ldi 50 PC\n")).assemble())
+	for address, word in enumerate(Assembler(proc, io.StringIO("ldi 1 r0\nldi 1 ECR\n")).assemble()):
+		proc.memory_bus.write_word(50 + address, word)
+	compiler.run()
+	assert proc.register_interface.read("r0") == 1
+
+	# the program changes the compiled instruction "ldi 1 r0"
+	rom.program(Assembler(proc, io.StringIO("ldi 7 r2\nst r2 51\nldi 50 PC\n")).assemble())
+	proc.reset()
+	compiler.run()
+	assert proc.register_interface.read("r0") == 7
+
+def test_code_in_devices_without_write_hooks():
+	proc = processor.Processor()
+	rom = memory.ROM(10)
+	plain = PlainRAM(20)
+	proc.register_memory_device(rom)
+	proc.register_memory_device(plain)
+	proc.add_register(register.Register("r0"))
+	for command in basic_commands:
+		proc.register_command(command)
+	proc.setup_done()
+	compiler = BlockCompiler(proc)
+
+	rom.program(Assembler(proc, io.StringIO("ldi 10 PC\n")).assemble())
+	plain.words[:6] = Assembler(proc, io.StringIO("ldi 1 r0\nldi 1 ECR\n")).assemble()
+	compiler.run()
+	assert proc.register_interface.read("r0") == 1
+
+	plain.words[1] = 5
+	proc.reset()
+	compiler.run()
+	assert proc.register_interface.read("r0") == 5
+
+
+counter_program = """jmp start
+isr:
+inc r3
+ret
+start:
+ldi 0 r1
+ldi 3000 r0
+loop:
+add r0 r1
+dec r0
+jgt r0 loop
+ldi 1 ECR
+"""
+
+def get_counter_machine(overflow):
+	proc = processor.Processor(interrupts = True)
+	rom = memory.ROM(200)
+	proc.register_memory_device(rom)
+	proc.register_memory_device(memory.RAM(300))
+	proc.register_device(device.Flash(10))
+	for i in range(5):
+		proc.add_register(register.Register("r{}".format(i)))
+	for command in basic_commands + stack_based.stack_based_commands:
+		proc.register_command(command)
+	counter = interrupts.Counter(2, "counter", proc, overflow)
+	proc.setup_done()
+	proc.reset()
+	rom.program(Assembler(proc, io.StringIO(counter_program)).assemble())
+	counter.enable = True
+	return proc, counter
+
+def counter_state(proc, counter):
+	return [proc.register_interface.read(i) for i in range(8)], proc.cycles, counter.counter
+
+
+def test_counter_interrupts():
+	for overflow in (7, 8, 50, 333, 5000):
+		proc, counter = get_counter_machine(overflow)
+		proc.run()
+		expected = counter_state(proc, counter)
+
+		proc, counter = get_counter_machine(overflow)
+		compiler = BlockCompiler(proc)
+		assert compiler.can_compile()
+		compiler.run()
+		assert counter_state(proc, counter) == expected, overflow
+		if(overflow < 5000):
+			assert expected[0][6] > 0
+
+def test_counter_interrupts_max_cycles():
+	for overflow in (7, 333):
+		proc, counter = get_counter_machine(overflow)
+		expected = [proc.run(cycles) + counter_state(proc, counter) for cycles in (100, 1001, 17)]
+
+		proc, counter = get_counter_machine(overflow)
+		compiler = BlockCompiler(proc)
+		assert [compiler.run(cycles) + counter_state(proc, counter) for cycles in (100, 1001, 17)] == expected
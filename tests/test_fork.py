@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+import io
+
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+
+from test_processor import programs, get_program_machine, state
+
+
+def test_fork_runs_like_the_parent():
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		proc.run(3)
+		child = proc.fork()
+		proc.run()
+		expected = state(proc)
+		child.run()
+		assert state(child) == expected, name
+
+def test_child_writes_are_private():
+	proc, rom, ram = get_program_machine("memory")
+	before = state(proc)
+	first = proc.fork()
+	second = proc.fork()
+
+	first.run()
+	assert state(proc) == before
+	assert state(second) == before
+
+	# the words of the RAM and the Flash (in the second page)
+	first.memory_bus.write_word(100, 42)
+	first.device_bus.write_word(300, 43)
+	second.device_bus.write_word(300, 44)
+	assert proc.memory_bus.read_word(100) == 0
+	assert proc.device_bus.read_word(300) == 0
+	assert second.memory_bus.read_word(100) == 0
+	assert first.device_bus.read_word(300) == 43
+	assert second.device_bus.read_word(300) == 44
+
+	first.register_interface.write("r0", 5)
+	assert proc.register_interface.read("r0") == 0
+	assert second.register_interface.read("r0") == 0
+
+	# forks of forks
+	third = first.fork()
+	third.memory_bus.write_word(100, 7)
+	assert first.memory_bus.read_word(100) == 42
+	assert third.device_bus.read_word(300) == 43
+
+def test_child_code_is_private():
+	proc, rom, ram = get_program_machine("sum")
+	rom.program(Assembler(proc, io.StringIO("ldi 50 PC\n")).assemble())
+	def load(proc, code):
+		for address, word in enumerate(Assembler(proc, io.StringIO(code)).assemble()):
+			proc.memory_bus.write_word(50 + address, word)
+	load(proc, "ldi 1 r0\nldi 1 ECR\n")
+	child = proc.fork()
+	proc.run()
+
+	load(child, "ldi 2 r0\nldi 1 ECR\n")
+	sibling = proc.fork()
+	child.run()
+	assert child.register_interface.read("r0") == 2
+	assert proc.register_interface.read("r0") == 1
+	assert sibling.register_interface.read("r0") == 1
+	assert proc.memory_bus.read_word(51) == sibling.memory_bus.read_word(51) != child.memory_bus.read_word(51)
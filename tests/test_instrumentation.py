@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+
+import io, subprocess, sys
+
+import pytest
+
+from py_register_machine2.core.processor import SetupError
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+from py_register_machine2.engine_tools.profiler import Profiler
+from py_register_machine2.engine_tools.stats import ExecutionStats
+
+
+code = "ldi 3 r0\nloop:\ndec r0\njgt r0 loop\nldi 1 ECR\n"
+
+def machine():
+	processor, rom, ram, flash = get_machine()
+	rom.program(Assembler(processor, io.StringIO(code)).assemble())
+	return processor
+
+def cli(*args):
+	return subprocess.run([sys.executable, "-m", "py_register_machine2.app.cli", "execute",
+			"--string", "ROM:[22, 3, 1, 22, 1, 2]"] + list(args), capture_output = True, text = True)
+
+
+def test_profiler_and_stats_are_rejected():
+	processor = machine()
+	processor.profiler = Profiler(processor)
+	processor.stats = ExecutionStats(processor)
+	with pytest.raises(SetupError):
+		processor.run()
+	assert processor.cycles == 0
+
+	processor.profiler = None
+	assert processor.run() == (8, True)
+	assert processor.stats.to_dict()["cycles"] == 8
+
+def test_cli_rejects_profile_and_stats():
+	result = cli("--profile", "--stats")
+	assert result.returncode != 0
+	assert "can not be used together" in result.stderr
+
+def test_tracer_is_not_combined(tmp_path):
+	from py_register_machine2.engine_tools.tracer import Tracer
+
+	processor = machine()
+	processor.stats = ExecutionStats(processor)
+	processor.tracer = Tracer(processor)
+	with pytest.raises(SetupError):
+		processor.run()
+
+	trace = tmp_path / "t.bin"
+	for option in ("--profile", "--stats"):
+		result = cli(option, "--trace={}".format(trace))
+		assert result.returncode != 0
+		assert "can not be used together" in result.stderr
+		assert not trace.exists()
+
+def test_stats_ignore_interrupts():
+	from py_register_machine2.core import interrupts
+	from py_register_machine2.commands import stack_based
+
+	results = []
+	for callback in (False, True):
+		processor, rom, ram, flash = get_machine()
+		for command in stack_based.stack_based_commands:
+			processor.register_command(command)
+		processor.interrupt_enable = True
+		counter = interrupts.Counter(2, "counter", processor, 7)
+		counter.enable = True
+		rom.program(Assembler(processor, io.StringIO("jmp start\nisr:\nret\nstart:\n"
+				"ldi 300 r0\nloop:\nadd r0 r1\ndec r0\njgt r0 loop\nldi 1 ECR\n")).assemble())
+		if(callback):
+			# forces the do_cycle variant of the counting loop
+			processor.register_on_cycle_callback(lambda: None)
+		processor.stats = ExecutionStats(processor)
+		processor.run()
+		results.append(processor.stats.to_dict())
+
+	assert results[0] == results[1]
+	commands = results[0]["commands"]
+	assert "taken" not in commands["add"]
+	assert commands["jgt"]["taken"] == commands["jgt"]["count"] - 1
+	assert commands["ret"]["taken"] == commands["ret"]["count"] > 0
+
+def test_stats_loop_variants():
+	results = []
+	for callback in (False, True):
+		processor = machine()
+		if(callback):
+			# forces the do_cycle variant of the counting loop
+			processor.register_on_cycle_callback(lambda: None)
+		processor.stats = ExecutionStats(processor)
+		assert processor.run() == (8, True)
+		results.append(processor.stats.to_dict())
+	assert results[0] == results[1]
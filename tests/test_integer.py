@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+
+"""
+Compares ``parts.Integer`` and ``parts.truncator`` with the bitset
+implementation of ``Integer`` they replaced.
+"""
+
+import random
+
+from py_register_machine2.core import parts
+from py_register_machine2.engine_tools.operations import bitsetxor
+
+
+class BitsetInteger(object):
+	"""
+	The previous implementation of ``parts.Integer``.
+	"""
+	def __init__(self, value = 0, width = 64):
+		self.width = width
+		self._value = 0
+		self._sign = 0
+		self.setvalue(value)
+
+	def setvalue(self, value):
+		self._value = abs(value)
+		self._sign = 0
+		if(value < 0):
+			self._sign = 1
+
+	def getvalue(self):
+		bitset = [0] * self.width
+		zero = [1] * self.width
+
+		for shift in range(self.width):
+			bitset[shift] = (self._value & (1 << shift)) >> shift
+		sign = 0
+		if((not bitset[-1]) and self._sign):
+			bitset[-1] = 1
+			sign = 1
+		elif(bitset[-1]):
+			bitset = bitsetxor(bitset, zero)
+			sign = 1
+
+		value = [ bitset[shift] << shift for shift in range(self.width - 1)]
+		value = sum(value)
+		if(sign):
+			return -1 * value
+		return value
+
+	def setuvalue(self, value):
+		self._value = value
+		self._sign = 0
+
+	def getuvalue(self):
+		bitset = [0] * self.width
+		zero = [1] * self.width
+		for shift in range(self.width):
+			bitset[shift] = (self._value & (1 << shift)) >> shift
+		if(self._sign):
+			bitset = bitsetxor(zero, bitset)
+
+		value = [ bitset[shift] << shift for shift in range(self.width)]
+		return sum(value)
+
+
+def edge_values(width):
+	"""
+	Values around the sign bit and the mask of ``width`` and of the neighbouring widths.
+	"""
+	values = [0, 1, -1]
+	for w in (width - 1, width, width + 1):
+		if(w < 1):
+			continue
+		for base in (1 << (w - 1), (1 << w) - 1, 1 << w):
+			for delta in (-1, 0, 1):
+				values.extend((base + delta, -(base + delta)))
+	return values
+
+def sample_values(width, rng, count = 60):
+	values = edge_values(width)
+	for i in range(count):
+		bits = rng.randint(0, 2 * width + 2)
+		value = rng.getrandbits(bits) if(bits) else 0
+		values.append(-value if(rng.random() < 0.5) else value)
+	return values
+
+
+def test_signed_values():
+	rng = random.Random(1)
+	for width in range(1, 131):
+		truncate = parts.truncator(width)
+		for value in sample_values(width, rng):
+			expected = BitsetInteger(value, width).getvalue()
+			assert parts.Integer(value, width).getvalue() == expected, (width, value)
+			assert truncate(value) == expected, (width, value)
+
+def test_unsigned_values():
+	rng = random.Random(2)
+	for width in range(1, 131):
+		for value in sample_values(width, rng):
+			old = BitsetInteger(value, width)
+			new = parts.Integer(value, width)
+			assert new.getuvalue() == old.getuvalue(), (width, value)
+
+			if(value >= 0):
+				old.setuvalue(value)
+				new.setuvalue(value)
+				assert new.getuvalue() == old.getuvalue(), (width, value)
+				assert new.getvalue() == old.getvalue(), (width, value)
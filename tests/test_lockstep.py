@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+
+import io
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+from py_register_machine2.engine_tools.lockstep import LockstepEngine
+
+
+def test_step_after_all_lanes_halted():
+	processor, rom, ram, flash = get_machine()
+	rom.program(Assembler(processor, io.StringIO("ldi 3 r0\nldi 1 ECR\n")).assemble())
+	engine = LockstepEngine(processor, 4)
+	cycles, halted = engine.run()
+	assert halted.all()
+	assert list(cycles) == [2] * 4
+
+	assert engine.step() == False
+	assert list(engine.cycles) == [2] * 4
+	assert list(engine.get_register("r0")) == [3] * 4
@@ -0,0 +1,26 @@
+#!/usr/bin/python3
+
+import io
+
+from py_register_machine2.core import parts
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools import objectfile
+from py_register_machine2.tools.assembler.assembler import Assembler
+
+
+def test_words_wider_than_the_section_are_truncated():
+	for width in (8, 16, 64, 100):
+		truncate = parts.truncator(width)
+		words = [0, 1, -1, 2 ** 70 + 5, -(2 ** 70) - 5, 2 ** (width - 1), 99999999999999999999]
+		sections = objectfile.loads(objectfile.dumps([objectfile.Section("ROM", words, width = width)]))
+		assert list(sections[0].words) == [truncate(word) for word in words]
+
+def test_assemble_with_overflowing_constant():
+	for method in ("assemble", "assemble_stream"):
+		processor, rom, ram, flash = get_machine()
+		assembler = Assembler(processor, io.StringIO("ldi 99999999999999999999 r0\nldi 1 ECR\n"))
+		data = objectfile.dumps([objectfile.Section("ROM", getattr(assembler, method)(), width = rom.width)])
+		for section in objectfile.loads(data):
+			section.program(rom)
+		processor.run()
+		assert processor.register_interface.read("r0") == rom.truncate(99999999999999999999), method
@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+
+import pytest
+
+from py_register_machine2.core import parts, memory, device
+
+
+values = [0, 1, -1, 127, 128, -128, -129, 255, 2 ** 31, -(2 ** 31) - 1,
+		2 ** 63 - 1, 2 ** 63, -(2 ** 64) - 3, 2 ** 70 + 5, 99999999999999999999]
+
+
+def test_words_are_truncated_like_integers():
+	for width in (1, 8, 16, 20, 32, 64, 100):
+		ram = memory.RAM(len(values), width = width)
+		for offset, value in enumerate(values):
+			ram.write(offset, value)
+		assert [ram.read(offset) for offset in range(len(values))] == [
+				parts.Integer(value, width).getvalue() for value in values], width
+
+def test_store_matches_write():
+	for width in (8, 64, 100):
+		written = memory.RAM(len(values) + 2, width = width)
+		for offset, value in enumerate(values):
+			written.write(offset + 2, value)
+		stored = memory.RAM(len(values) + 2, width = width)
+		stored.store(values, 2)
+		assert list(stored.repr_) == list(written.repr_), width
+
+def test_store_out_of_range_writes_nothing():
+	rom = memory.ROM(4)
+	with pytest.raises(parts.AddressError):
+		rom.program([1, 2, 3], 2)
+	assert list(rom.repr_) == [0] * 4
+
+def test_program_and_modes():
+	rom = memory.ROM(4, width = 8)
+	rom.program([1, 300, -1])
+	rom.program_word(3, 129)
+	assert [rom.read(i) for i in range(4)] == [parts.Integer(word, 8).getvalue() for word in (1, 300, -1, 129)]
+	with pytest.raises(parts.ReadOnlyError):
+		rom.write(0, 1)
+	with pytest.raises(parts.AddressError):
+		rom.read(4)
+
+	flash = device.Flash(3)
+	flash.program([5, 6], 1)
+	flash.write(0, -7)
+	assert [flash.read(i) for i in range(3)] == [-7, 5, 6]
+
+def test_bus_decodes_every_offset():
+	devices = [memory.RAM(size) for size in (4, 1, 5, 19)]
+	bus = memory.BUS()
+	starts = [bus.register_device(d) for d in devices]
+	assert starts == [0, 4, 5, 10]
+	for offset in range(bus.current_max_offset):
+		bus.write_word(offset, offset + 100)
+	for d, start in zip(devices, starts):
+		assert [d.read(i) for i in range(d.size)] == list(range(start + 100, start + 100 + d.size))
+	assert [bus.read_word(offset) for offset in range(29)] == list(range(100, 129))
+	assert bus.reads == 29 and bus.writes == 29
+
+def test_bus_offsets_outside_of_the_address_space():
+	bus = memory.BUS()
+	ram = memory.RAM(3)
+	bus.register_device(ram)
+	for offset in (-1, 3, 4):
+		with pytest.raises(parts.BUSError):
+			bus.read_word(offset)
+		with pytest.raises(parts.BUSError):
+			bus.write_word(offset, 1)
+	assert list(ram.repr_) == [0] * 3
+	with pytest.raises(parts.BUSSetupError):
+		bus.register_device(memory.RAM(1))
+
+def test_cli_exits_on_bus_errors():
+	import subprocess, sys
+	# ld 500 r0
+	result = subprocess.run([sys.executable, "-m", "py_register_machine2.app.cli", "execute",
+			"--string", "ROM:[4, 500, 4, 22, 1, 1]"], capture_output = True, text = True)
+	assert result.returncode != 0
+	assert "BUSError" in result.stderr
+	assert "Traceback" not in result.stderr
+
+def test_mapped_flash_survives_close_and_reopen(tmp_path):
+	filename = str(tmp_path / "flash.bin")
+	flash = device.MappedFlash(filename, 300, width = 16)
+	assert [flash.read(offset) for offset in range(300)] == [0] * 300
+	for offset, value in enumerate(values):
+		flash.write(offset, value)
+	flash.store([5, 6, 7], 297)
+	expected = [flash.read(offset) for offset in range(300)]
+	assert expected[:len(values)] == [parts.Integer(value, 16).getvalue() for value in values]
+	flash.close()
+
+	flash = device.MappedFlash(filename, 300, width = 16)
+	assert [flash.read(offset) for offset in range(300)] == expected
+	flash.close()
+
+	# a larger Flash is extended with zeros
+	flash = device.MappedFlash(filename, 400, width = 16)
+	assert [flash.read(offset) for offset in range(400)] == expected + [0] * 100
+
+	# forks keep their words in the memory
+	child = flash.fork()
+	child.write(0, 99)
+	assert flash.read(0) == expected[0]
+	flash.close()
+	flash = device.MappedFlash(filename, 400, width = 16)
+	assert flash.read(0) == expected[0]
+	flash.close()
+
+	with pytest.raises(ValueError):
+		device.MappedFlash(filename, 10, width = 100)
+
+def test_heatmap_counts_the_device_accesses():
+	from test_processor import get_program_machine, state
+	proc, rom, ram = get_program_machine("memory")
+	proc.run()
+	expected = state(proc)
+
+	proc, rom, ram = get_program_machine("memory")
+	accesses = {}
+	def count(device, method):
+		function = getattr(device, method)
+		def counting(offset, *args):
+			key = (method, proc.memory_bus.start_addresses[device] + offset)
+			accesses[key] = accesses.get(key, 0) + 1
+			return function(offset, *args)
+		setattr(device, method, counting)
+	for device_ in (rom, ram):
+		count(device_, "read")
+		count(device_, "write")
+
+	heatmap = proc.memory_bus.enable_heatmap(page_size = 16)
+	proc.run()
+	assert state(proc) == expected
+	for method, counters, device_counters in (("read", heatmap.reads, heatmap.device_reads),
+			("write", heatmap.writes, heatmap.device_writes)):
+		pages = [0] * len(counters)
+		for (kind, offset), number in accesses.items():
+			if(kind == method):
+				pages[offset // 16] += number
+		assert counters.tolist() == pages, method
+		assert device_counters.tolist() == [
+				sum(number for (kind, offset), number in accesses.items() if(kind == method and offset < 50)),
+				sum(number for (kind, offset), number in accesses.items() if(kind == method and offset >= 50))], method
+	assert heatmap.to_dict()["devices"][1]["writes"] == 11
+
+	with pytest.raises(parts.BUSError):
+		proc.memory_bus.read_word(250)
+	assert proc.memory_bus.disable_heatmap() is heatmap
+	reads = heatmap.reads.tolist()
+	proc.memory_bus.read_word(60)
+	assert heatmap.reads.tolist() == reads
@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+
+import io
+
+from py_register_machine2.core import processor, memory, register
+from py_register_machine2.commands.basic_commands import basic_commands
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+
+
+programs = {
+	"sum": """ldi 0 r1
+ldi 100 r0
+loop:
+add r0 r1
+dec r0
+jgt r0 loop
+ldi 1 ECR
+""",
+	"memory": """ldi 60 r2
+ldi 10 r0
+fill:
+pst r0 r2
+inc r2
+dec r0
+jne r0 fill
+ldi 60 r2
+ldi 10 r0
+ldi 0 r1
+sum:
+pld r2 r3
+add r3 r1
+inc r2
+dec r0
+jgt r0 sum
+st r1 59
+ld 59 r4
+ldi 1 ECR
+""",
+	"jumps": """ldi 5 r0
+ldi 0 r1
+back:
+dec r0
+inc r1
+jeq r0 done
+jmp back
+done:
+mul r1 r1
+ldi 3 r5
+div r5 r1
+sub r5 r1
+ldi 1 ECR
+""",
+	"control": """mov PC r0
+mov SP r1
+dec r1
+mov r1 SP
+ldi 9 r2
+add PC r2
+mov ECR r3
+ldi 1 ECR
+""",
+}
+
+def get_program_machine(name):
+	proc, rom, ram, flash = get_machine()
+	rom.program(Assembler(proc, io.StringIO(programs[name])).assemble())
+	return proc, rom, ram
+
+def state(proc):
+	registers = [proc.register_interface.read(i) for i in range(len(proc.register_interface.registers_by_index))]
+	words = [proc.memory_bus.read_word(i) for i in range(proc.memory_bus.current_max_offset)]
+	return registers, words, proc.cycles
+
+def run_uncached(proc):
+	while(not proc.register_interface.read(1) & 1):
+		proc.flush_decode_cache()
+		proc.do_cycle()
+
+
+def test_cached_instructions_match_decoding():
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		run_uncached(proc)
+		expected = state(proc)
+
+		proc, rom, ram = get_program_machine(name)
+		proc.run()
+		assert state(proc) == expected, name
+
+def test_code_written_to_the_ram():
+	proc, rom, ram = get_program_machine("sum")
+	rom.program(Assembler(proc, io.StringIO("ldi 50 PC\n")).assemble())
+	for address, word in enumerate(Assembler(proc, io.StringIO("ldi 1 r0\nldi 1 ECR\n")).assemble()):
+		proc.memory_bus.write_word(50 + address, word)
+	proc.run()
+	assert proc.register_interface.read("r0") == 1
+
+	# the program changes the cached instruction "ldi 1 r0"
+	rom.program(Assembler(proc, io.StringIO("ldi 7 r2\nst r2 51\nldi 50 PC\n")).assemble())
+	proc.reset()
+	proc.run()
+	assert proc.register_interface.read("r0") == 7
+
+	rom.program(Assembler(proc, io.StringIO("ldi 50 PC\n")).assemble())
+	for address, word in enumerate(Assembler(proc, io.StringIO("inc r0\ninc r0\nldi 1 ECR\n")).assemble()):
+		proc.memory_bus.write_word(50 + address, word)
+	proc.reset()
+	proc.run()
+	assert proc.register_interface.read("r0") == 7 + 1 + 1
+
+
+class PlainRAM(object):
+	"""
+	A device without write hooks.
+	"""
+	def __init__(self, size):
+		self.size = size
+		self.words = [0] * size
+	def read(self, offset):
+		return self.words[offset]
+	def write(self, offset, word):
+		self.words[offset] = word
+
+def test_code_in_devices_without_write_hooks():
+	proc = processor.Processor()
+	rom = memory.ROM(10)
+	plain = PlainRAM(20)
+	proc.register_memory_device(rom)
+	proc.register_memory_device(plain)
+	proc.add_register(register.Register("r0"))
+	for command in basic_commands:
+		proc.register_command(command)
+	proc.setup_done()
+
+	rom.program(Assembler(proc, io.StringIO("ldi 10 PC\n")).assemble())
+	plain.words[:6] = Assembler(proc, io.StringIO("ldi 1 r0\nldi 1 ECR\n")).assemble()
+	proc.run()
+	assert proc.register_interface.read("r0") == 1
+
+	# changed behind the back of the Processor
+	plain.words[1] = 5
+	proc.reset()
+	proc.run()
+	assert proc.register_interface.read("r0") == 5
+
+def test_run_loops_match():
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		run_uncached(proc)
+		expected = state(proc)
+
+		proc, rom, ram = get_program_machine(name)
+		calls = []
+		# selects the do_cycle loop
+		proc.register_on_cycle_callback(lambda: calls.append(1))
+		assert proc.run() == (expected[2], True)
+		assert state(proc) == expected, name
+		assert len(calls) == expected[2]
+
+def test_run_max_cycles():
+	proc, rom, ram = get_program_machine("sum")
+	proc.run()
+	expected = state(proc)
+
+	proc, rom, ram = get_program_machine("sum")
+	assert proc.run(0) == (0, False)
+	assert proc.run(10) == (10, False)
+	assert proc.cycles == 10
+	results = []
+	while(not results or not results[-1][1]):
+		results.append(proc.run(17))
+	assert set(results[:-1]) == {(17, False)}
+	assert 10 + sum(cycles for cycles, halted in results) == expected[2]
+	assert state(proc) == expected
+
+def test_control_registers():
+	proc = processor.Processor(width = 8)
+	proc.register_memory_device(memory.ROM(10, width = 8))
+	proc.setup_done()
+	interface = proc.register_interface
+	for name, index in (("pc", 0), ("ecr", 1), ("sp", 2)):
+		setattr(proc, name, 5)
+		assert interface.read(index) == 5
+		interface.write(index, 7)
+		assert getattr(proc, name) == 7
+		setattr(proc, name, 256 + 3)
+		assert getattr(proc, name) == interface.read(index) == 3
+
+def test_programs_read_the_control_registers():
+	proc, rom, ram = get_program_machine("control")
+	proc.run()
+	assert proc.register_interface.read("r0") == 3
+	assert proc.register_interface.read("r1") == proc.sp == 248
+	assert proc.register_interface.read("r2") == 9 + 17
+	assert proc.register_interface.read("r3") == 0
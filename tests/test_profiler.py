@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+import io
+
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+from py_register_machine2.tools.sourcemap import SourceMap
+from py_register_machine2.engine_tools.profiler import Profiler
+
+from test_processor import programs, get_program_machine, state
+
+
+def count_pcs(proc):
+	counts = [0] * proc.memory_bus.current_max_offset
+	while(not proc.register_interface.read(1) & 1):
+		counts[proc.register_interface.read(0)] += 1
+		proc.do_cycle()
+	return counts
+
+def test_profiled_run_matches_do_cycle():
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		counts = count_pcs(proc)
+		expected = state(proc)
+
+		proc, rom, ram = get_program_machine(name)
+		proc.profiler = Profiler(proc)
+		assert proc.run() == (expected[2], True)
+		assert state(proc) == expected, name
+		assert proc.profiler.counts == counts, name
+		for start, end, count, time in proc.profiler.basic_blocks(100):
+			assert set(counts[pc] for pc in range(start, end)) <= {0, count}, name
+
+def test_profiled_run_max_cycles():
+	proc, rom, ram = get_program_machine("sum")
+	proc.profiler = Profiler(proc)
+	assert proc.run(10) == (10, False)
+	assert sum(proc.profiler.counts) == 10
+	cycles = 10
+	while(True):
+		done, halted = proc.run(17)
+		cycles += done
+		if(halted):
+			break
+	assert sum(proc.profiler.counts) == cycles == proc.cycles
+
+def test_source_map():
+	for name, code in programs.items():
+		proc, rom, ram, flash = get_machine()
+		assembler = Assembler(proc, io.StringIO(code))
+		words = assembler.assemble()
+		source_map = assembler.source_map
+
+		lines = code.splitlines()
+		pc = 0
+		while(pc < len(words)):
+			line = source_map.lookup(pc)
+			mnemonic = lines[line - 1].split()[0]
+			assert proc.commands_by_opcode[words[pc]].mnemonic() == mnemonic, (name, pc)
+			pc += 1 + proc.commands_by_opcode[words[pc]].numargs()
+		assert source_map.lookup(len(words)) == None
+
+		stream = Assembler(proc, io.StringIO(code))
+		stream.assemble_stream()
+		assert list(stream.source_map) == list(source_map), name
+
+		dumped = io.StringIO()
+		source_map.dump(dumped)
+		dumped.seek(0)
+		assert list(SourceMap.load(dumped)) == list(source_map)
+
+def test_hottest_lines():
+	proc, rom, ram, flash = get_machine()
+	assembler = Assembler(proc, io.StringIO(programs["sum"]))
+	rom.program(assembler.assemble())
+	proc.profiler = Profiler(proc, assembler.source_map)
+	cycles, halted = proc.run()
+	lines = proc.profiler.hottest_lines(100)
+	assert sum(count for filename, line, count, time in lines) == cycles
+	assert {line: count for filename, line, count, time in lines} == {1: 1, 2: 1, 4: 100, 5: 100, 6: 100, 7: 1}
+	assert "== lines ==" in proc.profiler.report()
@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+
+import io
+
+import pytest
+
+from py_register_machine2.core import parts, register
+from py_register_machine2.core.processor import RegisterInterface
+
+
+values = [0, 1, -1, 127, 128, -128, -129, 255, 256, 2 ** 31, 2 ** 63 - 1, 2 ** 63, -(2 ** 63) - 1, 2 ** 70 + 5]
+
+
+def test_plain_registers_truncate_like_integers():
+	registers = [register.Register("r{}".format(width), width = width) for width in (8, 16, 64, 100)]
+	interface = RegisterInterface(registers)
+	for index, r in enumerate(registers):
+		for value in values:
+			expected = parts.Integer(value, r.width)
+			interface.write(index, value)
+			assert interface.read(index) == interface.read(r.name) == r.read() == expected.getvalue(), (r.width, value)
+			# the slot keeps the truncated value only
+			assert r.repr_.getuvalue() == parts.Integer(expected.getvalue(), r.width).getuvalue(), (r.width, value)
+
+			r.write(value)
+			assert interface.values[index] == expected.getvalue(), (r.width, value)
+
+def test_registers_with_hooks():
+	stream = io.StringIO()
+	output = register.OutputRegister("out0", stream)
+	interface = RegisterInterface([register.Register("r0"), output])
+	assert interface.hooks == [None, output]
+	interface.write("out0", ord("a"))
+	interface.write(1, ord("b"))
+	assert stream.getvalue() == "ab"
+	assert interface.read("out0") == ord("b")
+
+def test_unknown_registers():
+	interface = RegisterInterface([register.Register("r0")])
+	with pytest.raises(NameError):
+		interface.read("r1")
+	with pytest.raises(NameError):
+		interface.write(1, 0)
+	with pytest.raises(AttributeError):
+		interface.read(1.0)
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+
+import io, pytest
+
+from py_register_machine2.core import processor
+from py_register_machine2.machines.small import get_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+
+from test_processor import programs, get_program_machine, state
+
+
+def test_restore_continues_the_run():
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		proc.run(5)
+		snapshot = proc.snapshot()
+		proc.run()
+		expected = state(proc)
+
+		proc.restore(snapshot)
+		assert proc.cycles == 5
+		proc.run()
+		assert state(proc) == expected, name
+
+		proc, rom, ram = get_program_machine(name)
+		proc.restore(processor.Snapshot.from_bytes(snapshot.to_bytes()))
+		proc.run()
+		assert state(proc) == expected, name
+
+		proc, rom, ram = get_program_machine(name)
+		proc.restore(snapshot.to_bytes())
+		proc.run()
+		assert state(proc) == expected, name
+
+def test_to_bytes_round_trip():
+	proc, rom, ram = get_program_machine("memory")
+	proc.run(37)
+	proc.interrupt_enable = True
+	snapshot = proc.snapshot()
+	loaded = processor.Snapshot.from_bytes(snapshot.to_bytes())
+	for attribute in ("device_widths", "devices", "register_widths", "registers",
+			"cycles", "interrupt_enable", "interrupts"):
+		assert getattr(loaded, attribute) == getattr(snapshot, attribute), attribute
+	assert loaded.to_bytes() == snapshot.to_bytes()
+
+	with pytest.raises(ValueError):
+		processor.Snapshot.from_bytes(b"PRM2SNIP" + snapshot.to_bytes()[8:])
+
+def test_restore_invalidates_the_decoded_instructions():
+	proc, rom, ram = get_program_machine("sum")
+	rom.program(Assembler(proc, io.StringIO("ldi 50 PC\n")).assemble())
+	def load(code):
+		for address, word in enumerate(Assembler(proc, io.StringIO(code)).assemble()):
+			proc.memory_bus.write_word(50 + address, word)
+	load("ldi 1 r0\nldi 1 ECR\n")
+	snapshot = proc.snapshot()
+	proc.run()
+	assert proc.register_interface.read("r0") == 1
+
+	load("ldi 5 r0\nldi 1 ECR\n")
+	proc.register_interface.write("PC", 0)
+	proc.register_interface.write("ECR", 0)
+	proc.run()
+	assert proc.register_interface.read("r0") == 5
+
+	proc.restore(snapshot)
+	proc.run()
+	assert proc.register_interface.read("r0") == 1
+
+def test_restore_checks_the_layout():
+	proc, rom, ram = get_program_machine("sum")
+	snapshot = proc.snapshot()
+	snapshot.devices[1] = snapshot.devices[1][:-1]
+	with pytest.raises(processor.SetupError):
+		proc.restore(snapshot)
+
+def test_counter_state():
+	from test_compiler import get_counter_machine, counter_state
+	for overflow in (7, 333):
+		proc, counter = get_counter_machine(overflow)
+		proc.run(500)
+		snapshot = proc.snapshot()
+		proc.run()
+		expected = counter_state(proc, counter)
+
+		proc.restore(snapshot)
+		assert proc.cycles == 500
+		proc.run()
+		assert counter_state(proc, counter) == expected, overflow
+
+		proc, counter = get_counter_machine(overflow)
+		counter.enable = False
+		proc.restore(snapshot.to_bytes())
+		assert counter.enable
+		proc.run()
+		assert counter_state(proc, counter) == expected, overflow
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+
+import io, multiprocessing, pytest
+
+from py_register_machine2.core import processor, memory
+from py_register_machine2.core.system import System
+from py_register_machine2.commands import atomic
+from py_register_machine2.machines.small import small_register_machine
+from py_register_machine2.tools.assembler.assembler import Assembler
+from py_register_machine2.engine_tools.compiler import BlockCompiler
+
+from test_processor import programs, get_program_machine, state
+
+
+def test_results_match_single_runs():
+	expected = []
+	for name in programs:
+		proc, rom, ram = get_program_machine(name)
+		result = proc.run()
+		expected.append((result, state(proc)))
+
+	system = System([get_program_machine(name)[0] for name in programs], quantum = 13)
+	assert system.run() == [result for result, end in expected]
+	assert [state(proc) for proc in system.processors] == [end for result, end in expected]
+	assert system.halted() == [True] * len(programs)
+
+	# halted Processors are not run
+	assert system.run() == [(0, True)] * len(programs)
+
+def test_processors_run_in_quanta():
+	system = System([get_program_machine(name)[0] for name in programs], quantum = 10)
+	calls = []
+	for index, proc in enumerate(system.processors):
+		def run(max_cycles, index = index, run = proc.run):
+			cycles, halted = run(max_cycles)
+			calls.append((index, max_cycles, cycles))
+			return cycles, halted
+		proc.run = run
+	results = system.run(max_cycles = 55)
+
+	rounds = []
+	for call in calls:
+		if(not rounds or call[0] <= rounds[-1][-1][0]):
+			rounds.append([])
+		rounds[-1].append(call)
+	assert len(rounds) == system.rounds
+	assert [index for index, max_cycles, cycles in rounds[0]] == list(range(len(programs)))
+
+	executed = [0] * len(programs)
+	for round_ in rounds:
+		for index, max_cycles, cycles in round_:
+			assert max_cycles == min(10, 55 - executed[index])
+			executed[index] += cycles
+		# the Processors that are still running are at most one quantum apart
+		running = [executed[index] for index, max_cycles, cycles in round_ if(cycles == max_cycles)]
+		assert max(running) - min(running) <= 10
+	assert [cycles for cycles, halted in results] == executed == [proc.cycles for proc in system.processors]
+	assert all(halted or cycles == 55 for cycles, halted in results)
+
+def test_shared_device():
+	shared = memory.RAM(10)
+	system = System(quantum = 10)
+	for code in ("wait:\nld 250 r0\njeq r0 wait\nldi 1 ECR\n", "ldi 42 r0\nst r0 250\nldi 1 ECR\n"):
+		proc, rom, ram, flash = small_register_machine()
+		proc.register_memory_device(shared)
+		proc.setup_done()
+		rom.program(Assembler(proc, io.StringIO(code)).assemble())
+		system.add_processor(proc)
+
+	(consumer_cycles, consumer_halted), (producer_cycles, producer_halted) = system.run()
+	assert consumer_halted and producer_halted
+	assert producer_cycles == 3
+	assert consumer_cycles > 10
+	assert system.processors[0].register_interface.read("r0") == 42
+
+def test_setup():
+	with pytest.raises(ValueError):
+		System(quantum = 0)
+	with pytest.raises(processor.SetupError):
+		System([processor.Processor(clock_barrier = object())])
+	assert processor.Processor(f_cpu = 1000).f_cpu == 1000
+
+
+spin_lock = """ldi 250 r0
+ldi 1 r2
+ldi 200 r5
+acquire:
+ldi 0 r1
+cas r0 r1 r2
+jne r1 acquire
+ld 251 r3
+inc r3
+st r3 251
+ldi 0 r1
+pst r1 r0
+dec r5
+jgt r5 acquire
+ldi 1 ECR
+"""
+
+def get_shared_machine(shared, code):
+	proc, rom, ram, flash = small_register_machine()
+	for command in atomic.atomic_commands:
+		proc.register_command(command)
+	proc.register_memory_device(shared)
+	proc.setup_done()
+	rom.program(Assembler(proc, io.StringIO(code)).assemble())
+	return proc
+
+def run_spin_lock(run):
+	shared = memory.SharedRAM(2)
+	try:
+		system = System([get_shared_machine(shared, spin_lock) for i in range(2)], quantum = 7)
+		results = run(system)
+		assert [halted for cycles, halted in results] == [True, True]
+		assert shared.read(0) == 0
+		assert shared.read(1) == 400
+		assert [proc.register_interface.read("r5") for proc in system.processors] == [0, 0]
+	finally:
+		shared.close()
+		shared.unlink()
+
+def test_spin_lock():
+	run_spin_lock(lambda system: system.run())
+
+def test_spin_lock_in_processes():
+	try:
+		multiprocessing.get_context("fork")
+	except ValueError:
+		pytest.skip("the fork start method is not available")
+	run_spin_lock(lambda system: system.run_processes())
+
+def test_code_in_a_shared_ram_written_by_another_process():
+	shared = memory.SharedRAM(10)
+	other = memory.SharedRAM(10, name = shared.name, lock = shared.lock)
+	try:
+		proc = get_shared_machine(shared, "ldi 250 PC\n")
+		for run in (proc.run, BlockCompiler(proc).run):
+			for value in (1, 2, 3):
+				other.store(Assembler(proc, io.StringIO("ldi {} r0\nldi 1 ECR\n".format(value))).assemble())
+				proc.reset()
+				run()
+				assert proc.register_interface.read("r0") == value
+	finally:
+		other.close()
+		shared.close()
+		shared.unlink()
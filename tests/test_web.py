@@ -0,0 +1,14 @@
+#!/usr/bin/python3
+
+import pytest
+
+pytest.importorskip("cherrypy")
+
+from py_register_machine2.app.web.front import isset
+
+
+def test_isset():
+	for value in ("1", "true", "True", "on", "yes", True):
+		assert isset(value)
+	for value in ("0", "false", "off", "", "no", False, None):
+		assert not isset(value)